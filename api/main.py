@@ -235,7 +235,7 @@ async def process_query(request: QueryRequest):
             logger.info(f"   📚 Usando contexto: {len(messages)} mensajes previos")
         
         # ✅ PROCESAR CON CONTEXTO
-        result = orchestrator_v5.process_query(
+        result = await orchestrator_v5.aprocess_query(
             query=request.query,
             thread_id=thread_id,
             messages=messages  # ✅ Pasar historial
@@ -772,7 +772,7 @@ async def create_thread_run(thread_id: str, request_data: dict):
         
         # Procesar
         messages = get_thread_messages(thread_id)
-        result = orchestrator_v5.process_query(
+        result = await orchestrator_v5.aprocess_query(
             query=user_input,
             thread_id=thread_id,
             messages=messages
@@ -870,7 +870,7 @@ async def create_run(request_data: dict):
         
         # Procesar
         messages = get_thread_messages(thread_id)
-        result = orchestrator_v5.process_query(
+        result = await orchestrator_v5.aprocess_query(
             query=user_input,
             thread_id=thread_id,
             messages=messages
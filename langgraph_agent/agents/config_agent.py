@@ -3,14 +3,17 @@ Agente de Configuración
 Responsabilidad: Responder preguntas sobre configuración técnica de campañas
 """
 
+import asyncio
+import functools
 import os
+import traceback
 from datetime import datetime
 from typing import TypedDict, Annotated, List
 
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.runnables import RunnableLambda
 
 from ..tools.config.config_tools import (
     ListarCampanasInput,
@@ -22,8 +25,12 @@ from ..tools.config.config_tools import (
     buscar_campana_por_nombre_func,
     obtener_detalles_campana_func,
     obtener_presupuesto_func,
-    obtener_estrategia_puja_func
+    obtener_estrategia_puja_func,
+    obtener_presupuesto_func_async,
+    obtener_estrategia_puja_func_async,
 )
+from ..utils.helpers import dumps_json, unpack_tool_call
+from ..utils.llm import get_chat_model
 
 
 # ========== ESTADO ==========
@@ -114,6 +121,12 @@ Fecha actual: {datetime.now().strftime('%Y-%m-%d')}
 
 # ========== NODOS ==========
 
+@functools.lru_cache(maxsize=1)
+def _llm_with_tools():
+    """Modelo compartido (ver utils/llm.py) con las herramientas de configuración"""
+    return get_chat_model().bind_tools(CONFIG_TOOLS)
+
+
 def call_config_llm(state: ConfigAgentState):
     """Nodo que llama al LLM con herramientas de configuración"""
     messages = state["messages"]
@@ -123,28 +136,58 @@ def call_config_llm(state: ConfigAgentState):
     if not has_system:
         messages = [SystemMessage(content=CONFIG_AGENT_INSTRUCTION)] + messages
     
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.0,
-        google_api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    )
-    
-    llm_with_tools = llm.bind_tools(CONFIG_TOOLS)
-    response = llm_with_tools.invoke(messages)
+    response = _llm_with_tools().invoke(messages)
     
     return {"messages": [response]}
 
 
+TOOL_MAP = {
+    "ListarCampanasInput": (listar_campanas_func, ListarCampanasInput),
+    "BuscarCampanaPorNombreInput": (buscar_campana_por_nombre_func, BuscarCampanaPorNombreInput),
+    "ObtenerDetallesCampanaInput": (obtener_detalles_campana_func, ObtenerDetallesCampanaInput),
+    "ObtenerPresupuestoInput": (obtener_presupuesto_func, ObtenerPresupuestoInput),
+    "ObtenerEstrategiaPujaInput": (obtener_estrategia_puja_func, ObtenerEstrategiaPujaInput),
+}
+
+# Herramientas con versión async nativa (HTTP sin bloquear el loop); el resto va a un thread
+ASYNC_TOOL_MAP = {
+    "ObtenerPresupuestoInput": obtener_presupuesto_func_async,
+    "ObtenerEstrategiaPujaInput": obtener_estrategia_puja_func_async,
+}
+
+
+def _tool_content(result) -> str:
+    """Extrae el contenido según tipo de output"""
+    if hasattr(result, 'campanas_json'):
+        return result.campanas_json
+    if hasattr(result, 'datos_json'):
+        return result.datos_json
+    if hasattr(result, 'id_campana'):
+        return dumps_json({
+            "id_campana": result.id_campana,
+            "nombre_encontrado": result.nombre_encontrado
+        })
+    return str(result)
+
+
+def _tool_error(tool_name: str, tool_id: str, e: BaseException) -> ToolMessage:
+    # El traceback completo solo en modo debug (son tokens que se envían al LLM)
+    detail = "".join(traceback.format_exception(e)) if os.environ.get("AGENT_DEBUG") else ""
+    return ToolMessage(
+        content=f"Error ejecutando {tool_name}: {e}{(' | ' + detail) if detail else ''}",
+        tool_call_id=tool_id
+    )
+
+
+def _not_found(tool_name: str, tool_id: str) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: Herramienta {tool_name} no encontrada en ConfigAgent",
+        tool_call_id=tool_id
+    )
+
+
 def execute_config_tools(state: ConfigAgentState):
     """Ejecuta herramientas de configuración"""
-    tool_map = {
-        "ListarCampanasInput": (listar_campanas_func, ListarCampanasInput),
-        "BuscarCampanaPorNombreInput": (buscar_campana_por_nombre_func, BuscarCampanaPorNombreInput),
-        "ObtenerDetallesCampanaInput": (obtener_detalles_campana_func, ObtenerDetallesCampanaInput),
-        "ObtenerPresupuestoInput": (obtener_presupuesto_func, ObtenerPresupuestoInput),
-        "ObtenerEstrategiaPujaInput": (obtener_estrategia_puja_func, ObtenerEstrategiaPujaInput),
-    }
-    
     last_message = state["messages"][-1]
     results = []
     
@@ -152,49 +195,55 @@ def execute_config_tools(state: ConfigAgentState):
         return {"messages": []}
     
     for tool_call in last_message.tool_calls:
-        tool_name = tool_call.name if hasattr(tool_call, 'name') else tool_call.get('name')
-        tool_args = tool_call.args if hasattr(tool_call, 'args') else tool_call.get('args', {})
-        tool_id = tool_call.id if hasattr(tool_call, 'id') else tool_call.get('id', 'unknown')
-        
-        tool_info = tool_map.get(tool_name)
+        tool_name, tool_args, tool_id = unpack_tool_call(tool_call)
+        tool_info = TOOL_MAP.get(tool_name)
         
         if not tool_info:
-            results.append(ToolMessage(
-                content=f"Error: Herramienta {tool_name} no encontrada en ConfigAgent",
-                tool_call_id=tool_id
-            ))
+            results.append(_not_found(tool_name, tool_id))
             continue
         
         tool_func, tool_input_class = tool_info
         
+        try:
+            result = tool_func(tool_input_class(**tool_args))
+            results.append(ToolMessage(content=_tool_content(result), tool_call_id=tool_id))
+        except Exception as e:
+            results.append(_tool_error(tool_name, tool_id, e))
+    
+    return {"messages": results}
+
+
+async def aexecute_config_tools(state: ConfigAgentState):
+    """
+    Versión async de execute_config_tools: todas las herramientas del turno
+    a la vez (asyncio.gather), latencia max(tᵢ) en vez de Σtᵢ.
+    """
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None)
+    
+    if not tool_calls:
+        return {"messages": []}
+    
+    async def run_one(tool_call) -> ToolMessage:
+        tool_name, tool_args, tool_id = unpack_tool_call(tool_call)
+        tool_info = TOOL_MAP.get(tool_name)
+        
+        if not tool_info:
+            return _not_found(tool_name, tool_id)
+        
+        tool_func, tool_input_class = tool_info
+        
         try:
             tool_input = tool_input_class(**tool_args)
-            result = tool_func(tool_input)
-            
-            # Extraer contenido según tipo de output
-            if hasattr(result, 'campanas_json'):
-                content = result.campanas_json
-            elif hasattr(result, 'datos_json'):
-                content = result.datos_json
-            elif hasattr(result, 'id_campana'):
-                import json
-                content = json.dumps({
-                    "id_campana": result.id_campana,
-                    "nombre_encontrado": result.nombre_encontrado
-                })
+            async_func = ASYNC_TOOL_MAP.get(tool_name)
+            if async_func is not None:
+                result = await async_func(tool_input)
             else:
-                content = str(result)
-            
-            results.append(ToolMessage(content=content, tool_call_id=tool_id))
-        
+                result = await asyncio.to_thread(tool_func, tool_input)
+            return ToolMessage(content=_tool_content(result), tool_call_id=tool_id)
         except Exception as e:
-            import traceback
-            results.append(ToolMessage(
-                content=f"Error ejecutando {tool_name}: {str(e)}\n{traceback.format_exc()}",
-                tool_call_id=tool_id
-            ))
+            return _tool_error(tool_name, tool_id, e)
     
-    return {"messages": results}
+    return {"messages": list(await asyncio.gather(*(run_one(tc) for tc in tool_calls)))}
 
 
 def should_continue_config(state: ConfigAgentState) -> str:
@@ -214,7 +263,10 @@ def create_config_agent():
     workflow = StateGraph(ConfigAgentState)
     
     workflow.add_node("call_llm", call_config_llm)
-    workflow.add_node("execute_tools", execute_config_tools)
+    workflow.add_node(
+        "execute_tools",
+        RunnableLambda(execute_config_tools, afunc=aexecute_config_tools)
+    )
     
     workflow.set_entry_point("call_llm")
     workflow.add_conditional_edges(
@@ -3,12 +3,12 @@ Coordinador de Agentes
 Responsabilidad: Decidir qué agente especializado debe responder
 """
 
-import os
 from typing import Literal
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
+from ..utils.llm import get_chat_model
+
 
 # ========== SCHEMA ==========
 
@@ -115,11 +115,8 @@ class CoordinatorAgent:
     """Coordinador que decide qué agente usar"""
     
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.0,
-            google_api_key=os.getenv("GEMINI_API_KEY")
-        )
+        # Modelo compartido (utils/llm.py): mismo cliente HTTP que el resto de agentes
+        self.llm = get_chat_model()
         
         self.structured_llm = self.llm.with_structured_output(RouteDecision)
         self.prompt = ChatPromptTemplate.from_template(COORDINATOR_PROMPT)
@@ -142,6 +139,14 @@ class CoordinatorAgent:
         
         return decision
     
+    async def aroute(self, query: str) -> RouteDecision:
+        """Versión async de route (no bloquea el event loop)"""
+        decision = await self.chain.ainvoke({"query": query})
+        
+        self._print_decision(query, decision)
+        
+        return decision
+    
     def _print_decision(self, query: str, decision: RouteDecision):
         """Imprime la decisión con formato visual"""
         emoji_map = {
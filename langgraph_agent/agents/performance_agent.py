@@ -3,18 +3,23 @@ Agente de Rendimiento
 Responsabilidad: Responder preguntas sobre métricas, gasto, conversiones y comparaciones
 """
 
-import os
+import functools
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import TypedDict, Annotated, List
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
 import json
 
+from ..config.settings import destinos_en_texto
+from ..utils.cache import TTLCache
+from ..utils.checkpointers import ShardedSaver
+from ..utils.helpers import unpack_tool_call
+from ..utils.llm import get_chat_model
 from ..tools.config.config_tools import (
     BuscarCampanaPorNombreInput,
     buscar_campana_por_nombre_func
@@ -47,14 +52,45 @@ from ..tools.performance.performance_tools import (
     obtener_funnel_conversiones_func,
     ObtenerRankingCampanasInput,
     obtener_ranking_campanas_func,
+    ObtenerMetricasCampanasBatchInput,
+    obtener_metricas_campanas_batch_func,
 )
 
 
 # ========== ESTADO ==========
 
+# Historial máximo que se guarda en el checkpoint antes de recortar
+MAX_HISTORY_MESSAGES = 24
+KEEP_RECENT_MESSAGES = 20
+
+
+def _append_and_trim(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Reducer de mensajes: concatena y, si el historial supera MAX_HISTORY_MESSAGES,
+    conserva solo los últimos KEEP_RECENT_MESSAGES.
+
+    El corte siempre empieza en un HumanMessage para no separar una llamada
+    a herramienta (AIMessage) de su ToolMessage, que Gemini rechaza.
+    """
+    merged = left + right
+    if len(merged) <= MAX_HISTORY_MESSAGES:
+        return merged
+    
+    start = len(merged) - KEEP_RECENT_MESSAGES
+    # Si el tramo reciente no tiene HumanMessage, retroceder hasta el último
+    for i in range(start, len(merged)):
+        if isinstance(merged[i], HumanMessage):
+            return merged[i:]
+    for i in range(start - 1, -1, -1):
+        if isinstance(merged[i], HumanMessage):
+            return merged[i:]
+    
+    return merged
+
+
 class PerformanceAgentState(TypedDict):
     """Estado del agente de rendimiento"""
-    messages: Annotated[List[BaseMessage], lambda x, y: x + y]
+    messages: Annotated[List[BaseMessage], _append_and_trim]
 
 # ========== HERRAMIENTAS ==========
 
@@ -65,6 +101,7 @@ PERFORMANCE_TOOLS = [
     # Métricas de campaña y globales
     ObtenerMetricasCampanaInput,
     ObtenerMetricasGlobalesInput,
+    ObtenerMetricasCampanasBatchInput,
 
     # 🆕 NUEVO: Ranking de campañas
     ObtenerRankingCampanasInput,
@@ -138,6 +175,11 @@ A. **MÉTRICAS BÁSICAS DE CAMPAÑA** → ObtenerMetricasCampanaInput
    - "Métricas de Costa Blanca" ✅
    - **NUEVO**: Ahora incluye automáticamente métricas del funnel (Subscriber/MQL/SQL/Customer)
 
+A2. **MÉTRICAS DE VARIAS CAMPAÑAS CONCRETAS** → ObtenerMetricasCampanasBatchInput
+   - "Gasto y CPA de Baqueira, Ibiza y Andorra" ✅ (busca los IDs y pásalos juntos)
+   - Una sola llamada con `campana_ids=[...]` en lugar de varias ObtenerMetricasCampanaInput
+   - Solo métricas básicas (gasto, clicks, CTR, CPC, CPM, conversiones, CPA), sin funnel
+
 B. 🆕 **RANKING DE TODAS LAS CAMPAÑAS** → ObtenerRankingCampanasInput
    Ejemplos:
    - "¿Qué campañas tienen el mejor CPA de registered?" ✅
@@ -248,24 +290,81 @@ Usuario: "TOP 10 campañas por conversiones totales"
 Fecha actual: {datetime.now().strftime('%Y-%m-%d')}
 """
 
+# ========== PREFETCH ESPECULATIVO ==========
+
+_PREFETCH = ThreadPoolExecutor(max_workers=2, thread_name_prefix="perf_prefetch")
+
+# (tool_name, nombre tal cual en minúsculas) -> Future con el resultado de la búsqueda
+_TOOL_CACHE = TTLCache(maxsize=128, ttl=300)
+
+
+def _buscar_cache_key(nombre_campana: str) -> tuple:
+    """
+    Clave de caché para BuscarCampanaPorNombreInput: el nombre literal sin
+    mayúsculas ("Baqueira Remarketing" y "Baqueira" son búsquedas distintas)
+    """
+    return ("BuscarCampanaPorNombreInput", nombre_campana.strip().casefold())
+
+
+def _busqueda_fallida(future) -> bool:
+    """
+    La búsqueda no encontró campaña o falló. buscar_campana_por_nombre_func no
+    lanza: los errores de Meta y los "no encontrado" llegan con id_campana="None"
+    """
+    if future.cancelled() or future.exception() is not None:
+        return True
+    return future.result().id_campana == "None"
+
+
+def _evict_if_failed(key: tuple):
+    """Callback del Future: solo los aciertos se quedan en caché"""
+    def callback(future):
+        if _busqueda_fallida(future) and _TOOL_CACHE.get(key) is future:
+            _TOOL_CACHE.pop(key)
+    return callback
+
+
+def _prefetch_busquedas(messages: List[BaseMessage]) -> None:
+    """
+    Al empezar un turno del usuario, lanza en background la búsqueda de los
+    destinos mencionados. El flujo casi siempre es "buscar campaña → métricas",
+    así que cuando el LLM pide BuscarCampanaPorNombreInput el resultado ya está listo.
+    """
+    last_message = messages[-1] if messages else None
+    if not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return
+    
+    for destino in dict.fromkeys(destinos_en_texto(last_message.content)):
+        key = _buscar_cache_key(destino)
+        if key in _TOOL_CACHE:
+            continue
+        
+        future = _PREFETCH.submit(
+            buscar_campana_por_nombre_func,
+            BuscarCampanaPorNombreInput(nombre_campana=destino)
+        )
+        _TOOL_CACHE.set(key, future)
+        future.add_done_callback(_evict_if_failed(key))
+
+
 # ========== NODOS ==========
 
+@functools.lru_cache(maxsize=1)
+def _llm_with_tools():
+    """Modelo compartido (ver utils/llm.py) con las herramientas de rendimiento"""
+    return get_chat_model().bind_tools(PERFORMANCE_TOOLS)
+
+
 def call_performance_llm(state: PerformanceAgentState):
     """Nodo que llama al LLM con herramientas de rendimiento"""
     messages = state["messages"]
+    _prefetch_busquedas(messages)
     
     has_system = any(isinstance(msg, SystemMessage) for msg in messages)
     if not has_system:
         messages = [SystemMessage(content=PERFORMANCE_AGENT_INSTRUCTION)] + messages
     
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.0,
-        google_api_key=os.getenv("GEMINI_API_KEY")
-    )
-    
-    llm_with_tools = llm.bind_tools(PERFORMANCE_TOOLS)
-    response = llm_with_tools.invoke(messages)
+    response = _llm_with_tools().invoke(messages)
     
     return {"messages": [response]}
 
@@ -278,6 +377,7 @@ def execute_performance_tools(state: PerformanceAgentState):
         # Métricas de campaña
         "ObtenerMetricasCampanaInput": (obtener_metricas_campana_func, ObtenerMetricasCampanaInput),
         "ObtenerMetricasGlobalesInput": (obtener_metricas_globales_func, ObtenerMetricasGlobalesInput),
+        "ObtenerMetricasCampanasBatchInput": (obtener_metricas_campanas_batch_func, ObtenerMetricasCampanasBatchInput),
         
         # 🆕 NUEVO: Ranking de campañas
         "ObtenerRankingCampanasInput": (obtener_ranking_campanas_func, ObtenerRankingCampanasInput),
@@ -310,9 +410,7 @@ def execute_performance_tools(state: PerformanceAgentState):
         return {"messages": []}
     
     for tool_call in last_message.tool_calls:
-        tool_name = tool_call.name if hasattr(tool_call, 'name') else tool_call.get('name')
-        tool_args = tool_call.args if hasattr(tool_call, 'args') else tool_call.get('args', {})
-        tool_id = tool_call.id if hasattr(tool_call, 'id') else tool_call.get('id', 'unknown')
+        tool_name, tool_args, tool_id = unpack_tool_call(tool_call)
         
         tool_info = tool_map.get(tool_name)
         
@@ -327,20 +425,27 @@ def execute_performance_tools(state: PerformanceAgentState):
         
         try:
             tool_input = tool_input_class(**tool_args)
-            result = tool_func(tool_input)
             
             if tool_name == "BuscarCampanaPorNombreInput":
+                key = _buscar_cache_key(tool_input.nombre_campana)
+                prefetched = _TOOL_CACHE.get(key)
+                # _busqueda_fallida espera a que termine el prefetch
+                if prefetched is not None and _busqueda_fallida(prefetched):
+                    # El prefetch falló o no encontró nada: se repite en este turno
+                    _TOOL_CACHE.pop(key)
+                    prefetched = None
+                result = prefetched.result() if prefetched is not None else tool_func(tool_input)
                 content = json.dumps({
                     "id_campana": result.id_campana,
                     "nombre_encontrado": result.nombre_encontrado
                 })
             else:
+                result = tool_func(tool_input)
                 content = result.datos_json if hasattr(result, 'datos_json') else str(result)
             
             results.append(ToolMessage(content=content, tool_call_id=tool_id))
         
         except Exception as e:
-            import traceback
             results.append(ToolMessage(
                 content=f"Error ejecutando {tool_name}: {str(e)}\n{traceback.format_exc()}",
                 tool_call_id=tool_id
@@ -375,7 +480,8 @@ def create_performance_agent():
     )
     workflow.add_edge("execute_tools", "call_llm")
     
-    checkpointer = MemorySaver()
+    # Memoria repartida en shards por thread_id (menos contención entre usuarios)
+    checkpointer = ShardedSaver(shards=8)
     app = workflow.compile(checkpointer=checkpointer)
     
     return app
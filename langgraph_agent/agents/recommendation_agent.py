@@ -4,15 +4,33 @@ Responsabilidad: Analizar configuración y sugerir optimizaciones
 """
 
 import os
-from datetime import datetime
-from typing import TypedDict, Annotated, List
+import re
+import asyncio
+import functools
+import hashlib
+import logging
+import sqlite3
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import TypedDict, Annotated, List, Optional
 
 import json
+import operator
+from functools import reduce
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    message_chunk_to_message,
+)
+from langchain_core.runnables import RunnableLambda
 
 from ..tools.recommendations.recommendation_tools import (
     ObtenerRecomendacionesInput,
@@ -25,6 +43,16 @@ from ..tools.config.config_tools import (
     BuscarCampanaPorNombreInput,
     buscar_campana_por_nombre_func
 )
+from ..config.settings import settings, destinos_en_texto
+from ..utils.answer_cache import AnswerCache
+from ..utils.cache import TTLCache
+from ..utils.checkpointers import LRUMemorySaver
+from ..utils.helpers import (
+    dumps_json, normalize_query, query_tokens, jaccard_similarity, unpack_tool_call
+)
+from ..utils.llm import get_chat_model
+
+logger = logging.getLogger(__name__)
 
 # ========== ESTADO ==========
 
@@ -41,10 +69,41 @@ RECOMMENDATION_TOOLS = [
     BuscarCampanaPorNombreInput,
 ]
 
+# nombre de la herramienta → (función, clase de input)
+TOOL_MAP = {
+    "BuscarCampanaPorNombreInput": (buscar_campana_por_nombre_func, BuscarCampanaPorNombreInput),
+    "ObtenerRecomendacionesInput": (obtener_recomendaciones_func, ObtenerRecomendacionesInput),
+    "AnalizarOpportunidadInput": (analizar_oportunidad_func, AnalizarOpportunidadInput),
+}
+
+
+# nombre literal normalizado → (id_campana, nombre_encontrado)
+_NAME_CACHE = TTLCache(maxsize=256, ttl=600)
+
+
+def _name_cache_key(nombre_campana: str) -> str:
+    """
+    Sin mayúsculas, tildes ni puntuación, pero sin colapsar al destino:
+    "Baqueira Remarketing" y "Baqueira Prospecting" son campañas distintas
+    """
+    return normalize_query(nombre_campana)
+
+
+# blake2b(nombre + args canónicos) → contenido del ToolMessage
+_TOOL_CACHE = TTLCache(maxsize=256, ttl=300)
+
+
+def _tool_cache_key(name: str, args: dict) -> bytes:
+    """Clave determinista: mismo dict en otro orden → misma clave"""
+    return hashlib.blake2b(
+        name.encode("utf-8") + dumps_json(args, sort_keys=True).encode("utf-8"),
+        digest_size=16
+    ).digest()
+
 
 # ========== SYSTEM INSTRUCTION ==========
 
-RECOMMENDATION_AGENT_INSTRUCTION = f"""
+RECOMMENDATION_AGENT_INSTRUCTION = """
 Eres un agente especializado en RECOMENDACIONES DE OPTIMIZACIÓN para Meta Ads.
 
 🎯 TU RESPONSABILIDAD:
@@ -100,10 +159,121 @@ Para cada recomendación:
 - **Montaña**: Baqueira, Andorra, Pirineos
 - **Islas**: Ibiza, Mallorca, Menorca, Canarias
 - **Costas**: Cantabria, Costa de la Luz, Costa Blanca, Costa del Sol
-
-Fecha actual: {datetime.now().strftime('%Y-%m-%d')}
 """
 
+# Prefijo estático: mismos bytes en todas las llamadas (cacheable por Gemini)
+_SYS_MSG = SystemMessage(content=RECOMMENDATION_AGENT_INSTRUCTION)
+
+
+@functools.lru_cache(maxsize=1)
+def _fecha_message(today: date) -> SystemMessage:
+    """Sufijo dinámico: la fecha va en un mensaje aparte, después del prefijo estático"""
+    return SystemMessage(content=f"Fecha actual: {today.isoformat()}")
+
+
+# ========== CACHÉ DE RESPUESTAS DEL LLM ==========
+
+LLM_MODEL = "gemini-2.5-flash"
+LLM_TEMPERATURE = 0.0
+
+# Mismo historial + mismas herramientas → misma respuesta (temperature=0)
+_LLM_CACHE = TTLCache(maxsize=512)
+
+
+def _llm_cache_key(messages: List[BaseMessage]) -> str:
+    """SHA-256 de (modelo, temperatura, mensajes, herramientas)"""
+    payload = {
+        "model": LLM_MODEL,
+        "temp": LLM_TEMPERATURE,
+        "msgs": [
+            (
+                m.type,
+                m.content,
+                [(tc["name"], tc["args"]) for tc in getattr(m, "tool_calls", None) or []],
+            )
+            for m in messages
+        ],
+        "tools": [t.__name__ for t in RECOMMENDATION_TOOLS],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ========== CACHÉ SEMÁNTICA (L2) ==========
+
+# Umbral de similitud entre consultas parafraseadas. Alto a propósito: con
+# 0.75 "Baqueira Remarketing" y "Baqueira Prospecting" ya se consideraban iguales
+SEMANTIC_CACHE_THRESHOLD = 0.9
+
+# (tokens, destinos, respuesta) de las primeras llamadas de cada turno. Solo
+# respuestas finales: una tool_call lleva argumentos e ids propios de su consulta
+_SEMANTIC_CACHE = deque(maxlen=256)
+_SEMANTIC_LOCK = threading.Lock()
+
+
+def _destinos_en(text: str) -> frozenset:
+    """Destinos canónicos mencionados en el texto ("costa del sol" → "costasol")"""
+    return frozenset(destinos_en_texto(text))
+
+
+def _consulta_inicial(messages: List[BaseMessage]):
+    """
+    Texto del usuario si es la primera llamada al LLM de una conversación.
+    Solo esa llamada depende únicamente de la pregunta; las siguientes dependen
+    de los resultados de herramientas y las cubre la caché exacta.
+    """
+    conversation = [m for m in messages if not isinstance(m, SystemMessage)]
+    if len(conversation) == 1 and isinstance(conversation[0], HumanMessage):
+        content = conversation[0].content
+        return content if isinstance(content, str) else None
+    return None
+
+
+def _semantic_lookup(query: str):
+    """Respuesta cacheada para una consulta equivalente (mismos destinos, tokens similares)"""
+    tokens = query_tokens(query)
+    destinos = _destinos_en(query)
+    
+    best_score, best_response = 0.0, None
+    with _SEMANTIC_LOCK:
+        for cached_tokens, cached_destinos, response in _SEMANTIC_CACHE:
+            if cached_destinos != destinos:
+                continue
+            score = jaccard_similarity(tokens, cached_tokens)
+            if score > best_score:
+                best_score, best_response = score, response
+    
+    return best_response if best_score >= SEMANTIC_CACHE_THRESHOLD else None
+
+
+def _semantic_store(query: str, response) -> None:
+    if getattr(response, "tool_calls", None):
+        return
+    with _SEMANTIC_LOCK:
+        _SEMANTIC_CACHE.append((query_tokens(query), _destinos_en(query), response))
+
+
+# ========== LLM ==========
+
+@functools.lru_cache(maxsize=1)
+def _get_llm():
+    """Modelo Gemini compartido (utils/llm.py) con las herramientas de recomendaciones"""
+    return get_chat_model(LLM_MODEL, LLM_TEMPERATURE).bind_tools(RECOMMENDATION_TOOLS)
+
+
+def _invoke_streaming(llm, messages: List[BaseMessage]) -> AIMessage:
+    """
+    Consume la respuesta de Gemini en streaming hasta el final. Con varias
+    function calls en paralelo cada una puede llegar en un chunk distinto:
+    cortar en el primero perdería las demás.
+    """
+    chunks = list(llm.stream(messages))
+    
+    if not chunks:
+        return AIMessage(content="")
+    
+    return message_chunk_to_message(reduce(operator.add, chunks))
+
 
 # ========== NODOS ==========
 
@@ -111,86 +281,265 @@ def call_recommendation_llm(state: RecommendationAgentState):
     """Nodo que llama al LLM con herramientas de recomendaciones"""
     messages = state["messages"]
     
-    # Agregar system message si no existe
-    has_system = any(isinstance(msg, SystemMessage) for msg in messages)
-    if not has_system:
-        messages = [SystemMessage(content=RECOMMENDATION_AGENT_INSTRUCTION)] + messages
+    # Prefijo estable: instrucción siempre en la posición 0, luego la fecha,
+    # luego la conversación (sin otros SystemMessage intercalados)
+    fecha = _fecha_message(date.today())
+    conversation = [m for m in messages if not isinstance(m, SystemMessage)]
+    messages = [_SYS_MSG, fecha, *conversation]
     
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.0,
-        google_api_key=os.getenv("GEMINI_API_KEY")
-    )
+    # Solo se cachea con temperature=0 (respuesta determinista)
+    cache_key = _llm_cache_key(messages) if LLM_TEMPERATURE == 0.0 else None
+    if cache_key is not None:
+        cached = _LLM_CACHE.get(cache_key)
+        if cached is not None:
+            return {"messages": [cached]}
     
-    llm_with_tools = llm.bind_tools(RECOMMENDATION_TOOLS)
-    response = llm_with_tools.invoke(messages)
+    # L2: consulta parafraseada de una ya respondida
+    consulta = _consulta_inicial(messages) if cache_key is not None else None
+    if consulta is not None:
+        cached = _semantic_lookup(consulta)
+        if cached is not None:
+            return {"messages": [cached]}
+    
+    response = _invoke_streaming(_get_llm(), messages)
+    
+    if cache_key is not None:
+        _LLM_CACHE.set(cache_key, response)
+    if consulta is not None:
+        _semantic_store(consulta, response)
     
     return {"messages": [response]}
 
 
-def execute_recommendation_tools(state: RecommendationAgentState):
-    """Ejecuta herramientas de recomendaciones"""
-    tool_map = {
-        "BuscarCampanaPorNombreInput": (buscar_campana_por_nombre_func, BuscarCampanaPorNombreInput),
-        "ObtenerRecomendacionesInput": (obtener_recomendaciones_func, ObtenerRecomendacionesInput),
-        "AnalizarOpportunidadInput": (analizar_oportunidad_func, AnalizarOpportunidadInput),
-    }
+def _buscar_campana(nombre_campana: str) -> tuple:
+    """(id_campana, nombre_encontrado) usando la memo por nombre normalizado"""
+    name_key = _name_cache_key(nombre_campana)
+    found = _NAME_CACHE.get(name_key)
+    if found is None:
+        result = buscar_campana_por_nombre_func(BuscarCampanaPorNombreInput(nombre_campana=nombre_campana))
+        found = (result.id_campana, result.nombre_encontrado)
+        # Solo se memorizan aciertos: una campaña nueva debe encontrarse
+        if result.id_campana != "None":
+            _NAME_CACHE.set(name_key, found)
+    return found
+
+
+def _run_one(tool_call) -> ToolMessage:
+    """Ejecuta una tool_call y devuelve su ToolMessage (los errores también)"""
+    tool_name, tool_args, tool_id = unpack_tool_call(tool_call)
     
-    last_message = state["messages"][-1]
-    results = []
+    tool_info = TOOL_MAP.get(tool_name)
     
-    if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
-        return {"messages": []}
+    if not tool_info:
+        return ToolMessage(
+            content=f"Error: Herramienta {tool_name} no encontrada en RecommendationAgent",
+            tool_call_id=tool_id
+        )
     
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call.name if hasattr(tool_call, 'name') else tool_call.get('name')
-        tool_args = tool_call.args if hasattr(tool_call, 'args') else tool_call.get('args', {})
-        tool_id = tool_call.id if hasattr(tool_call, 'id') else tool_call.get('id', 'unknown')
-        
-        tool_info = tool_map.get(tool_name)
-        
-        if not tool_info:
-            results.append(ToolMessage(
-                content=f"Error: Herramienta {tool_name} no encontrada en RecommendationAgent",
-                tool_call_id=tool_id
-            ))
-            continue
-        
-        tool_func, tool_input_class = tool_info
+    tool_func, tool_input_class = tool_info
+    
+    try:
+        tool_input = tool_input_class(**tool_args)
         
-        try:
-            tool_input = tool_input_class(**tool_args)
-            result = tool_func(tool_input)
-            
-            # ✅ Manejo específico para BuscarCampanaPorNombreInput
-            if tool_name == "BuscarCampanaPorNombreInput":
-                content = json.dumps({
-                    "id_campana": result.id_campana,
-                    "nombre_encontrado": result.nombre_encontrado
-                })
-            else:
+        # ✅ Manejo específico para BuscarCampanaPorNombreInput (memoizado por nombre)
+        if tool_name == "BuscarCampanaPorNombreInput":
+            found = _buscar_campana(tool_input.nombre_campana)
+            content = dumps_json({
+                "id_campana": found[0],
+                "nombre_encontrado": found[1]
+            })
+        else:
+            # model_dump() rellena los defaults: args parciales y completos comparten clave
+            cache_key = _tool_cache_key(tool_name, tool_input.model_dump())
+            content = _TOOL_CACHE.get(cache_key)
+            if content is None:
+                result = tool_func(tool_input)
                 content = result.datos_json if hasattr(result, 'datos_json') else str(result)
-            
-            results.append(ToolMessage(content=content, tool_call_id=tool_id))
+                # Los errores de Meta API ({"error": ...}) no se cachean
+                if not content.startswith('{"error"'):
+                    _TOOL_CACHE.set(cache_key, content)
         
-        except Exception as e:
-            import traceback
-            results.append(ToolMessage(
-                content=f"Error ejecutando {tool_name}: {str(e)}\n{traceback.format_exc()}",
-                tool_call_id=tool_id
-            ))
+        return ToolMessage(content=content, tool_call_id=tool_id)
+    
+    except Exception as e:
+        # El traceback completo solo en modo debug (son tokens que se envían a Gemini)
+        detail = traceback.format_exc() if os.environ.get("AGENT_DEBUG") else ""
+        return ToolMessage(
+            content=f"Error ejecutando {tool_name}: {e}{(' | ' + detail) if detail else ''}",
+            tool_call_id=tool_id
+        )
+
+
+def execute_recommendation_tools(state: RecommendationAgentState):
+    """Ejecuta herramientas de recomendaciones (en paralelo si hay varias)"""
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None)
+    
+    if not tool_calls:
+        return {"messages": []}
+    
+    if len(tool_calls) == 1:
+        return {"messages": [_run_one(tool_calls[0])]}
+    
+    # Cada herramienta es una llamada HTTP a Meta: latencia max(tᵢ) en vez de Σtᵢ
+    with ThreadPoolExecutor(max_workers=len(tool_calls)) as pool:
+        results = list(pool.map(_run_one, tool_calls))
     
     return {"messages": results}
 
 
+async def aexecute_recommendation_tools(state: RecommendationAgentState):
+    """Versión async de execute_recommendation_tools (asyncio.gather)"""
+    tool_calls = getattr(state["messages"][-1], "tool_calls", None)
+    
+    if not tool_calls:
+        return {"messages": []}
+    
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_run_one, tc) for tc in tool_calls),
+        return_exceptions=True
+    )
+    
+    messages = []
+    for tool_call, result in zip(tool_calls, results):
+        if isinstance(result, BaseException):
+            tool_name, _, tool_id = unpack_tool_call(tool_call)
+            result = ToolMessage(content=f"Error ejecutando {tool_name}: {result}", tool_call_id=tool_id)
+        messages.append(result)
+    
+    return {"messages": messages}
+
+
 def should_continue_recommendation(state: RecommendationAgentState) -> str:
     """Decide si continuar o terminar"""
+    return "execute_tools" if getattr(state["messages"][-1], "tool_calls", None) else "end"
+
+
+# ========== CACHÉ DE RESPUESTAS FINALES ==========
+
+# Se abre en el primer uso (importar el agente no crea ficheros); None si SQLite
+# no está disponible (p.ej. sistema de ficheros de solo lectura): sin caché
+_ANSWER_CACHE = None
+_ANSWER_CACHE_DISABLED = False
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+_CAMPANA_ID_RE = re.compile(r'"(?:id_campana|campana_id|campaign_id)"\s*:\s*"(\d+)"')
+
+
+def _get_answer_cache() -> Optional[AnswerCache]:
+    global _ANSWER_CACHE, _ANSWER_CACHE_DISABLED
+    if _ANSWER_CACHE is not None or _ANSWER_CACHE_DISABLED:
+        return _ANSWER_CACHE
+    
+    with _ANSWER_CACHE_LOCK:
+        if _ANSWER_CACHE is None and not _ANSWER_CACHE_DISABLED:
+            try:
+                _ANSWER_CACHE = AnswerCache(settings.ANSWER_CACHE_PATH, ttl=settings.ANSWER_CACHE_TTL)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"⚠️ answer_cache desactivada: {e}")
+                _ANSWER_CACHE_DISABLED = True
+    return _ANSWER_CACHE
+
+
+# Dos claves, ambas a partir del texto normalizado de la pregunta:
+#   q|día|pregunta          → id de la campaña de la respuesta (consulta barata, sin Meta)
+#   campaña|día|pregunta    → respuesta final
+def _question_key(text: str) -> str:
+    return f"q|{date.today().isoformat()}|{normalize_query(text)}"
+
+
+def _answer_key(campana_id: str, text: str) -> str:
+    return f"{campana_id}|{date.today().isoformat()}|{normalize_query(text)}"
+
+
+def _campana_de_pregunta(text: str) -> Optional[str]:
+    """Campaña del único destino mencionado en la pregunta (None si no hay uno solo)"""
+    destinos = set(destinos_en_texto(text))
+    if len(destinos) != 1:
+        return None
+    campana_id, _ = _buscar_campana(destinos.pop())
+    return None if campana_id == "None" else campana_id
+
+
+def _ultimo_turno(messages: List[BaseMessage]):
+    """(pregunta del usuario, mensajes posteriores) del turno en curso"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i], messages[i + 1:]
+    return None, []
+
+
+def cache_lookup(state: RecommendationAgentState):
+    """
+    Antes de llamar al LLM: si hoy ya se respondió la misma pregunta (texto
+    normalizado) y su destino sigue resolviendo a la misma campaña, se reutiliza.
+    La campaña solo se resuelve tras un acierto de la clave de texto.
+    """
     last_message = state["messages"][-1]
+    if not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return {"messages": []}
+    
+    cache = _get_answer_cache()
+    if cache is None:
+        return {"messages": []}
+    
+    try:
+        campana_guardada = cache.get(_question_key(last_message.content))
+        if campana_guardada is None:
+            return {"messages": []}
+        
+        if _campana_de_pregunta(last_message.content) != campana_guardada:
+            return {"messages": []}
+        
+        cached = cache.get(_answer_key(campana_guardada, last_message.content))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Error leyendo answer_cache: {e}")
+        return {"messages": []}
     
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        return "execute_tools"
+    if cached is None:
+        return {"messages": []}
     
-    return "end"
+    logger.info(f"⚡ Respuesta reutilizada de answer_cache (campaña {campana_guardada})")
+    return {"messages": [AIMessage(content=cached)]}
+
+
+def cache_answer(state: RecommendationAgentState):
+    """
+    Tras la respuesta final: la guarda si la pregunta menciona un solo destino
+    y las herramientas del turno trabajaron sobre esa misma campaña.
+    """
+    pregunta, turno = _ultimo_turno(state["messages"])
+    final = state["messages"][-1]
+    
+    if pregunta is None or not isinstance(pregunta.content, str):
+        return {"messages": []}
+    if not isinstance(final, AIMessage) or not isinstance(final.content, str) or not final.content:
+        return {"messages": []}
+    
+    cache = _get_answer_cache()
+    if cache is None:
+        return {"messages": []}
+    
+    campana_ids = {
+        campana_id
+        for msg in turno if isinstance(msg, ToolMessage) and isinstance(msg.content, str)
+        for campana_id in _CAMPANA_ID_RE.findall(msg.content)
+    }
+    if len(campana_ids) != 1:
+        return {"messages": []}
+    
+    # Misma resolución que cache_lookup: si no coinciden, no se guarda
+    campana_id = _campana_de_pregunta(pregunta.content)
+    if campana_id is None or campana_id not in campana_ids:
+        return {"messages": []}
+    
+    cache.set(_answer_key(campana_id, pregunta.content), final.content)
+    cache.set(_question_key(pregunta.content), campana_id)
+    return {"messages": []}
+
+
+def route_after_lookup(state: RecommendationAgentState) -> str:
+    """Si cache_lookup respondió, se termina; si no, se llama al LLM"""
+    return "end" if isinstance(state["messages"][-1], AIMessage) else "call_llm"
 
 
 # ========== CONSTRUCCIÓN DEL GRAFO ==========
@@ -199,19 +548,31 @@ def create_recommendation_agent():
     """Crea y compila el agente de recomendaciones"""
     workflow = StateGraph(RecommendationAgentState)
     
+    workflow.add_node("cache_lookup", cache_lookup)
     workflow.add_node("call_llm", call_recommendation_llm)
-    workflow.add_node("execute_tools", execute_recommendation_tools)
+    workflow.add_node("cache_answer", cache_answer)
+    # Nodo con versión sync (invoke) y async (ainvoke)
+    workflow.add_node(
+        "execute_tools",
+        RunnableLambda(execute_recommendation_tools, afunc=aexecute_recommendation_tools)
+    )
     
-    workflow.set_entry_point("call_llm")
+    workflow.set_entry_point("cache_lookup")
+    workflow.add_conditional_edges(
+        "cache_lookup",
+        route_after_lookup,
+        {"call_llm": "call_llm", "end": END}
+    )
     workflow.add_conditional_edges(
         "call_llm",
         should_continue_recommendation,
-        {"execute_tools": "execute_tools", "end": END}
+        {"execute_tools": "execute_tools", "end": "cache_answer"}
     )
     workflow.add_edge("execute_tools", "call_llm")
+    workflow.add_edge("cache_answer", END)
     
-    # Compilar con memoria
-    checkpointer = MemorySaver()
+    # Compilar con memoria (acotada: se descartan los threads menos recientes)
+    checkpointer = LRUMemorySaver(maxsize=1024)
     app = workflow.compile(checkpointer=checkpointer)
     
     return app
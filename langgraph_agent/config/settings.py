@@ -4,10 +4,48 @@ Variables de configuración y mapeos
 """
 
 import os
-from typing import Dict
+import re
+import sys
+import unicodedata
+from types import SimpleNamespace
+from typing import Dict, Final
 from pydantic_settings import BaseSettings
 
 
+# ========== MAPEOS ==========
+
+# Mapeo de estrategias de puja (código técnico → legible)
+BID_STRATEGY_MAP: Final[Dict[str, str]] = {
+    "LOWEST_COST_WITHOUT_CAP": "Costo más bajo (sin límite)",
+    "LOWEST_COST_WITH_BID_CAP": "Costo más bajo (con límite de puja)",
+    "COST_CAP": "Límite de costo",
+    "LOWEST_COST_WITH_MIN_ROAS": "Costo más bajo (con ROAS mínimo)",
+}
+
+# Mapeo de destinos (nombre corto → nombre completo)
+# Usado en buscar_campana_por_nombre_func() para normalizar nombres
+DESTINO_MAPPING: Final[Dict[str, str]] = {
+    # Montaña
+    "baqueira": "baqueira",
+    "andorra": "andorra",
+    "pirineos": "pirineos",
+    
+    # Islas
+    "ibiza": "ibiza",
+    "mallorca": "mallorca",
+    "menorca": "menorca",
+    "canarias": "canarias",
+    
+    # Costas
+    "cantabria": "cantabria",
+    "costa luz": "costaluz",
+    "costa de la luz": "costaluz",
+    "costa blanca": "costablanca",
+    "costa del sol": "costasol",
+    "costa sol": "costasol",
+}
+
+
 class Settings(BaseSettings):
     """Configuración global de la aplicación"""
     
@@ -31,37 +69,8 @@ class Settings(BaseSettings):
     HOST: str = os.getenv("HOST", "0.0.0.0")
     
     # ========== MAPEOS ==========
-    
-    # Mapeo de estrategias de puja (código técnico → legible)
-    BID_STRATEGY_MAP: Dict[str, str] = {
-        "LOWEST_COST_WITHOUT_CAP": "Costo más bajo (sin límite)",
-        "LOWEST_COST_WITH_BID_CAP": "Costo más bajo (con límite de puja)",
-        "COST_CAP": "Límite de costo",
-        "LOWEST_COST_WITH_MIN_ROAS": "Costo más bajo (con ROAS mínimo)",
-    }
-    
-    # Mapeo de destinos (nombre corto → nombre completo)
-    # Usado en buscar_campana_por_nombre_func() para normalizar nombres
-    DESTINO_MAPPING: Dict[str, str] = {
-        # Montaña
-        "baqueira": "baqueira",
-        "andorra": "andorra",
-        "pirineos": "pirineos",
-        
-        # Islas
-        "ibiza": "ibiza",
-        "mallorca": "mallorca",
-        "menorca": "menorca",
-        "canarias": "canarias",
-        
-        # Costas
-        "cantabria": "cantabria",
-        "costa luz": "costaluz",
-        "costa de la luz": "costaluz",
-        "costa blanca": "costablanca",
-        "costa del sol": "costasol",
-        "costa sol": "costasol",
-    }
+    BID_STRATEGY_MAP: Dict[str, str] = BID_STRATEGY_MAP
+    DESTINO_MAPPING: Dict[str, str] = DESTINO_MAPPING
     
     # Tipos de conversiones consideradas como válidas
     CONVERSION_ACTION_TYPES: list = [
@@ -80,6 +89,10 @@ class Settings(BaseSettings):
     META_API_TIMEOUT: int = 30  # segundos
     LLM_TIMEOUT: int = 60  # segundos
     
+    # Caché de respuestas finales (SQLite)
+    ANSWER_CACHE_PATH: str = os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3")
+    ANSWER_CACHE_TTL: int = 86400  # segundos
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -87,7 +100,48 @@ class Settings(BaseSettings):
 
 # ========== INSTANCIA GLOBAL ==========
 
-settings = Settings()
+# Pydantic solo valida una vez al arrancar; el resto del código lee
+# atributos planos de un SimpleNamespace.
+settings = SimpleNamespace(**Settings().model_dump())
+
+
+# ========== MAPEOS COMO CONSTANTES ==========
+
+# Copia plana del mapeo de destinos para el camino caliente de las herramientas
+DESTINO_MAP: Dict[str, str] = {
+    sys.intern(k): sys.intern(v) for k, v in settings.DESTINO_MAPPING.items()
+}
+
+# Los nombres canónicos también son alias de sí mismos ("costasol 2025" → costasol)
+for _canonico in set(DESTINO_MAP.values()):
+    DESTINO_MAP.setdefault(_canonico, _canonico)
+
+
+# Una sola expresión con todos los alias (los más largos primero): una pasada
+# sobre el texto en lugar de un `alias in texto` por cada destino
+DESTINO_PATTERN = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, sorted(DESTINO_MAP, key=len, reverse=True))) + r")\b"
+)
+
+
+def _sin_tildes(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode().lower()
+
+
+def destinos_en_texto(texto: str) -> list:
+    """Destinos canónicos mencionados en un texto libre, en orden de aparición"""
+    return [DESTINO_MAP[m.group()] for m in DESTINO_PATTERN.finditer(_sin_tildes(texto))]
+
+
+def normalizar_destino(nombre: str) -> str:
+    """
+    Nombre canónico de un destino ("Costa de la Luz" → "costaluz").
+    Ignora mayúsculas y tildes; si no es exactamente un destino conocido
+    devuelve el nombre normalizado tal cual ("Ibiza Lookalike" → "ibiza lookalike").
+    Para detectar destinos dentro de un texto libre: destinos_en_texto.
+    """
+    clave = _sin_tildes(nombre).strip()
+    return DESTINO_MAP.get(clave, clave)
 
 
 # ========== VALIDACIÓN AL IMPORTAR ==========
@@ -3,6 +3,7 @@ Schemas de Pydantic para todas las herramientas
 Centraliza definiciones para evitar imports circulares
 """
 
+from dataclasses import dataclass
 from pydantic import BaseModel as PydanticBaseModel, Field as PydanticField
 from typing import Optional
 
@@ -12,6 +13,9 @@ from typing import Optional
 BaseModel = PydanticBaseModel
 Field = PydanticField
 
+# Los *Input siguen siendo Pydantic (LangChain genera el schema de la herramienta
+# a partir de ellos). Los *Output son contenedores simples: dataclasses con slots.
+
 
 # ========== CONFIG SCHEMAS ==========
 
@@ -24,7 +28,8 @@ class ListarCampanasInput(BaseModel):
     limite: int = Field(default=50, description="Máximo de campañas a listar")
 
 
-class ListarCampanasOutput(BaseModel):
+@dataclass(slots=True)
+class ListarCampanasOutput:
     """Salida con lista de campañas"""
     campanas_json: str
 
@@ -34,7 +39,8 @@ class BuscarCampanaPorNombreInput(BaseModel):
     nombre_campana: str = Field(description="Nombre o parte del nombre de la campaña")
 
 
-class BuscarCampanaPorNombreOutput(BaseModel):
+@dataclass(slots=True)
+class BuscarCampanaPorNombreOutput:
     """Salida con ID y nombre de campaña encontrada"""
     id_campana: str
     nombre_encontrado: str
@@ -46,7 +52,8 @@ class ObtenerDetallesCampanaInput(BaseModel):
     incluir_adsets: bool = Field(default=True, description="Incluir detalles de adsets")
 
 
-class ObtenerDetallesCampanaOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerDetallesCampanaOutput:
     """Salida con configuración completa"""
     datos_json: str
 
@@ -56,7 +63,8 @@ class ObtenerPresupuestoInput(BaseModel):
     campana_id: str = Field(description="ID de la campaña")
 
 
-class ObtenerPresupuestoOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerPresupuestoOutput:
     """Salida con presupuestos"""
     datos_json: str
 
@@ -66,7 +74,8 @@ class ObtenerEstrategiaPujaInput(BaseModel):
     campana_id: str = Field(description="ID de la campaña")
 
 
-class ObtenerEstrategiaPujaOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerEstrategiaPujaOutput:
     """Salida con estrategia de puja"""
     datos_json: str
 
@@ -81,7 +90,8 @@ class ObtenerMetricasCampanaInput(BaseModel):
     date_end: Optional[str] = Field(default=None, description="Fecha fin personalizada (YYYY-MM-DD)")
 
 
-class ObtenerMetricasCampanaOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasCampanaOutput:
     """Salida con métricas completas"""
     datos_json: str
 
@@ -95,7 +105,8 @@ class ObtenerAnunciosPorRendimientoInput(BaseModel):
     limite: int = Field(default=3, description="TOP N anuncios")
 
 
-class ObtenerAnunciosPorRendimientoOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerAnunciosPorRendimientoOutput:
     """Salida con TOP anuncios"""
     datos_json: str
 
@@ -111,7 +122,8 @@ class CompararPeriodosInput(BaseModel):
     fecha_fin_2: Optional[str] = Field(default=None, description="Si periodo_2='custom': YYYY-MM-DD")
 
 
-class CompararPeriodosOutput(BaseModel):
+@dataclass(slots=True)
+class CompararPeriodosOutput:
     """Salida con comparación de períodos"""
     datos_json: str
 
@@ -121,7 +133,8 @@ class ObtenerMetricasGlobalesInput(BaseModel):
     date_preset: str = Field(default="last_7d", description="Período")
 
 
-class ObtenerMetricasGlobalesOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasGlobalesOutput:
     """Salida con métricas globales"""
     datos_json: str
 
@@ -137,7 +150,8 @@ class GetCampaignRecommendationsInput(BaseModel):
     )
 
 
-class GetCampaignRecommendationsOutput(BaseModel):
+@dataclass(slots=True)
+class GetCampaignRecommendationsOutput:
     """Salida con recomendaciones"""
     datos_json: str
 
@@ -148,6 +162,7 @@ class GetCampaignDetailsInput(BaseModel):
     include_adsets: bool = Field(default=True, description="Incluir adsets")
 
 
-class GetCampaignDetailsOutput(BaseModel):
+@dataclass(slots=True)
+class GetCampaignDetailsOutput:
     """Salida con detalles de campaña"""
     datos_json: str
\ No newline at end of file
@@ -3,18 +3,207 @@ Orchestrator V5 - Multi-Agente con Recomendaciones
 Agrega RecommendationAgent al sistema
 """
 
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Optional
-from langchain_core.messages import HumanMessage, BaseMessage
+from array import array
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple
+from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 from typing import List
 
-from .router_v4 import router_v4
+from .router_v4 import get_router_v4
 from ..agents.coordinator_agent import coordinator
 from ..agents.config_agent import config_agent
 from ..agents.performance_agent import performance_agent
 from ..agents.recommendation_agent import recommendation_agent  # ✨ NUEVO
 from ..workflows.base import WorkflowResult, FastPathWorkflow
+from ..utils.cache import TTLCache
+from ..utils.helpers import normalize_query, query_tokens, serialize_messages
+
+logger = logging.getLogger(__name__)
+
+# Palabras clave para elegir agentes (multi-agente y especulación)
+CONFIG_KEYWORDS = frozenset({"presupuesto", "estrategia", "puja", "objetivo", "targeting"})
+PERFORMANCE_KEYWORDS = frozenset({"gasto", "clicks", "conversiones", "rendimiento", "ctr", "cpm", "cpa"})
+RECOMMENDATION_KEYWORDS = frozenset({"recomienda", "optimiza", "mejora", "sugerencia", "debería", "completo", "análisis"})
+
+
+# Tabla palabra clave → agente (añadir palabras aquí basta)
+KEYWORD_TAGS = {
+    **dict.fromkeys(CONFIG_KEYWORDS, "config"),
+    **dict.fromkeys(PERFORMANCE_KEYWORDS, "performance"),
+    **dict.fromkeys(RECOMMENDATION_KEYWORDS, "recommendation"),
+}
+
+
+def _trie_pattern(words) -> str:
+    """
+    Alternativa regex factorizada por prefijos (trie): en cada posición de la
+    query se decide carácter a carácter en vez de probar palabra por palabra,
+    así el coste apenas crece con el número de palabras clave.
+    
+    Example:
+        >>> _trie_pattern(["cpa", "cpm", "ctr"])
+        'c(?:p(?:a|m)|tr)'
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = None  # fin de palabra
+    
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        optional = "" in node
+        body = alts[0] if len(alts) == 1 and not optional else "(?:" + "|".join(alts) + ")"
+        return body + "?" if optional else body
+    
+    return build(trie)
+
+
+# Un solo autómata para todas las palabras clave: una pasada sobre la query.
+# Sin \b a propósito: se mantiene la semántica de subcadena ("cpa" en "cpas")
+_TRIAGE_RE = re.compile(_trie_pattern(KEYWORD_TAGS))
+
+
+def _keyword_groups(query_lower: str) -> set:
+    """Agentes cuyas palabras clave aparecen en la query"""
+    return {KEYWORD_TAGS[match.group()] for match in _TRIAGE_RE.finditer(query_lower)}
+
+
+# Listados que el FastPath resuelve sin LLM, sobre la query normalizada
+# (sin tildes ni puntuación). Solo consultas completas: "lista campañas de
+# Baqueira con gasto" no encaja y pasa por el Router.
+_FASTPATH_RE = re.compile(
+    r"(?:(?:lista|listar)\s+(?:todas\s+)?(?:las\s+|mis\s+)?campanas"
+    r"|(?:(?:muestra|muestrame|dame|enumera)\s+)?(?:todas\s+las|mis)\s+campanas)"
+    r"(?:\s+activas)?$"
+)
+
+
+# Tiempo máximo por agente en modo multi-agente (segundos)
+AGENT_TIMEOUT = 30
+
+
+# ========== FORMATO MULTI-AGENTE ==========
+
+# workflow_type agentic → nombre del agente (metadata de WorkflowResult)
+_AGENT_NAME = {
+    "agentic_config": "config",
+    "agentic_performance": "performance",
+    "agentic_recommendation": "recommendation",
+}
+
+# Plantillas de sección (orden = orden de presentación)
+_SECTION_TEMPLATES = {
+    "config": "## 📋 Configuración Técnica\n{}",
+    "performance": "## 📈 Rendimiento\n{}",
+    "recommendation": "## 💡 Recomendaciones\n{}",
+}
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+
+def _multi_header(n_agents: int) -> str:
+    return f"# ⚙️ ANÁLISIS COMPLETO ({n_agents} agentes)\n\n"
+
+
+def _format_section(name: str, content: str) -> str:
+    return _SECTION_TEMPLATES[name].format(content)
+
+
+# Workflows con métricas (orden = índice en los arrays de métricas)
+WORKFLOW_TYPES = (
+    "simple",
+    "agentic_config",
+    "agentic_performance",
+    "agentic_recommendation",  # ✨
+    "multi_agent",
+)
+_BUCKET = {workflow_type: i for i, workflow_type in enumerate(WORKFLOW_TYPES)}
+
+
+def _summarize(counts: array, totals: array) -> list:
+    """Tiempo medio por bucket (0 si no hubo consultas), redondeado a 2 decimales"""
+    return [round(total / count, 2) if count > 0 else 0 for count, total in zip(counts, totals)]
+
+
+# Respuestas completas reutilizables durante unos minutos (datos de Meta cambian)
+RESULT_CACHE_TTL = 300  # segundos
+
+
+def _result_key(
+    query: str,
+    force_workflow: Optional[str],
+    messages: Optional[List[BaseMessage]]
+) -> str:
+    """
+    Huella de la consulta en su contexto: conjunto de palabras significativas
+    (sin tildes ni stopwords) + historial previo (turnos usuario/asistente).
+    "gasto de Ibiza esta semana" y "gasto Ibiza semana" comparten clave con el
+    mismo historial; con otro historial la misma frase puede significar otra
+    cosa y la clave cambia.
+    """
+    signature = " ".join(sorted(query_tokens(query)))
+    payload = f"{serialize_messages(messages)}\x00{signature}"
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{force_workflow or ''}|{digest}"
+
+
+# Event loop propio (en un hilo daemon) para servir process_query() síncrono.
+# Un único loop persistente: los clientes async de los LLM quedan ligados a él
+# en vez de a un loop nuevo por llamada (asyncio.run).
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    if _sync_loop is None:
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="orch_loop", daemon=True).start()
+                _sync_loop = loop
+    return _sync_loop
+
+
+class _CircuitBreaker:
+    """
+    Breaker por agente: tras `threshold` fallos seguidos dentro de `window`
+    segundos, el agente se omite durante `cooldown` segundos.
+    """
+    
+    def __init__(self, threshold: int = 3, window: float = 300.0, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self._failures: deque = deque()
+        self._open_until = 0.0
+    
+    def allow(self) -> bool:
+        return time.monotonic() >= self._open_until
+    
+    def record_success(self) -> None:
+        self._failures.clear()
+    
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window:
+            self._failures.popleft()
+        
+        if len(self._failures) >= self.threshold:
+            self._open_until = now + self.cooldown
+            self._failures.clear()
+            logger.warning(f"🔌 Circuit breaker abierto durante {self.cooldown:.0f}s")
 
 
 class OrchestratorV5:
@@ -32,29 +221,56 @@ class OrchestratorV5:
     4. Si multi_agent → Ejecuta los agentes necesarios y combina respuestas
     """
     
+    # Reloj monotónico de alta resolución (prebind: sin lookup de atributo)
+    _perf = staticmethod(time.perf_counter)
+    
     def __init__(self, enable_logging: bool = True):
-        print("🚀 Inicializando Orchestrator V5 (con Recommendations)...")
+        # enable_logging=False deja solo warnings/errores de esta instancia
+        # (el logger del módulo es compartido: no se toca su nivel)
+        self.enable_logging = enable_logging
+        
+        self._info("🚀 Inicializando Orchestrator V5 (con Recommendations)...")
         
-        self.router = router_v4
+        self.router = get_router_v4()
         self.coordinator = coordinator
         self.config_agent = config_agent
         self.performance_agent = performance_agent
         self.recommendation_agent = recommendation_agent  # ✨
         self.fast_path = FastPathWorkflow()
         
-        self.enable_logging = enable_logging
-        
-        # Métricas
-        self.metrics = {
-            "simple": {"count": 0, "total_time": 0},
-            "agentic_config": {"count": 0, "total_time": 0},
-            "agentic_performance": {"count": 0, "total_time": 0},
-            "agentic_recommendation": {"count": 0, "total_time": 0},  # ✨
-            "multi_agent": {"count": 0, "total_time": 0},
+        self._agents = {
+            "config": self.config_agent,
+            "performance": self.performance_agent,
+            "recommendation": self.recommendation_agent,
         }
         
-        print("✅ Orchestrator V5 listo (4 agentes)")
-        print()
+        # Multi-agente: límite por agente + breaker para backends caídos
+        self.timeout_per_agent = AGENT_TIMEOUT
+        self._breakers = {name: _CircuitBreaker() for name in self._agents}
+        
+        # Decisiones del Coordinator por query normalizada (LRU)
+        self._coord_cache = TTLCache(maxsize=1024)
+        
+        # Respuestas completas por huella semántica de la query + historial
+        self._result_cache = TTLCache(maxsize=256, ttl=RESULT_CACHE_TTL)
+        self.result_cache_hits = 0
+        
+        # Métricas en arrays contiguos (count / total_time), índice por workflow
+        self._counts = array("q", [0] * len(WORKFLOW_TYPES))
+        self._totals = array("d", [0.0] * len(WORKFLOW_TYPES))
+        self.speculation_stats = {"hits": 0, "misses": 0}
+        # Consultas enviadas a FastPath sin pasar por el Router (auditar falsos positivos)
+        self.router_skipped = 0
+        
+        self._info("✅ Orchestrator V5 listo (4 agentes)")
+    
+    def _info_enabled(self) -> bool:
+        return self.enable_logging and logger.isEnabledFor(logging.INFO)
+    
+    def _info(self, msg: str) -> None:
+        """logger.info solo si esta instancia tiene el logging activado"""
+        if self._info_enabled():
+            logger.info(msg)
     
     def process_query(
         self,
@@ -62,6 +278,26 @@ class OrchestratorV5:
         thread_id: Optional[str] = None,
         force_workflow: Optional[str] = None,
         messages: Optional[List[BaseMessage]] = None
+    ) -> WorkflowResult:
+        """
+        Versión síncrona de aprocess_query (compatibilidad).
+        
+        La corrutina se ejecuta en el loop de fondo del módulo, así que funciona
+        igual desde scripts que desde endpoints async de FastAPI (donde ya hay
+        un loop corriendo y asyncio.run fallaría).
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.aprocess_query(query, thread_id, force_workflow, messages),
+            _get_sync_loop()
+        )
+        return future.result()
+    
+    async def aprocess_query(
+        self,
+        query: str,
+        thread_id: Optional[str] = None,
+        force_workflow: Optional[str] = None,
+        messages: Optional[List[BaseMessage]] = None
     ) -> WorkflowResult:
         """
         Procesa una consulta con arquitectura multi-agente (4 agentes).
@@ -70,68 +306,66 @@ class OrchestratorV5:
             query: Consulta del usuario
             thread_id: ID del thread para memoria (opcional)
             force_workflow: Forzar workflow específico (opcional)
+            messages: Historial del thread, contexto para el Router (opcional)
             
         Returns:
             WorkflowResult con la respuesta
         """
-        start_time = datetime.now()
+        start_time = self._perf()
+        
+        result_key = _result_key(query, force_workflow, messages)
         
         if not thread_id:
             thread_id = f"thread_{uuid.uuid4().hex[:8]}"
         
-        print("\n" + "="*70)
-        print(f"🔥 NUEVA CONSULTA (V5 - 4 Agentes)")
-        print(f"   Query: '{query}' | Thread: {thread_id}")
-        print("="*70)
+        if self._info_enabled():
+            logger.info(f"🔥 NUEVA CONSULTA (V5 - 4 Agentes) | Query: '{query}' | Thread: {thread_id}")
+        
+        # PASO 0: Respuesta reciente a una consulta equivalente con el mismo historial
+        cached = self._result_cache.get(result_key)
+        if cached is not None:
+            self.result_cache_hits += 1
+            self._info(f"⚡ Respuesta desde caché semántica ({cached.workflow_type})")
+            # El grafo no se ejecuta: el turno se registra a mano en la memoria
+            # de los agentes para que el siguiente mensaje del thread tenga contexto
+            await self._record_turn(cached, query, thread_id)
+            return cached.model_copy(update={"metadata": {**cached.metadata, "cached": True}})
         
         try:
             # PASO 1: Clasificar con Router V4
             if force_workflow:
                 category = force_workflow
-                print(f"   ⚙️ Forzando workflow: {category}")
+                self._info(f"⚙️ Forzando workflow: {category}")
+            elif _FASTPATH_RE.match(normalize_query(query)):
+                # Listado trivial: no hace falta preguntar al Router
+                category = "simple"
+                self.router_skipped += 1
+                self._info("⚡ FastPath directo (Router omitido)")
             else:
-                route_result = self.router.classify(query)
+                # El Router cachea sus decisiones (query + contexto)
+                route_result = await self.router.aclassify(query, messages)
                 category = route_result.category
             
-            config = {"configurable": {"thread_id": thread_id}}
-            
             # PASO 2: Ejecutar según categoría
             if category == "simple":
-                # FastPath sin agente
-                result = self.fast_path.execute(query)
+                # FastPath sin agente (no necesita config ni mensajes)
+                result = await self.fast_path.aexecute(query)
                 workflow_type = "simple"
             
-            elif category == "agentic":
-                # Usar Coordinator para decidir agente
-                coord_decision = self.coordinator.route(query)
-                
-                if coord_decision.agent == "config":
-                    result = self._execute_single_agent(
-                        self.config_agent, query, config, "agentic_config"
-                    )
-                    workflow_type = "agentic_config"
-                
-                elif coord_decision.agent == "performance":
-                    result = self._execute_single_agent(
-                        self.performance_agent, query, config, "agentic_performance"
-                    )
-                    workflow_type = "agentic_performance"
-                
-                elif coord_decision.agent == "recommendation":  # ✨ NUEVO
-                    result = self._execute_single_agent(
-                        self.recommendation_agent, query, config, "agentic_recommendation"
-                    )
-                    workflow_type = "agentic_recommendation"
+            elif category in ("agentic", "multi_agent"):
+                # Input y config se construyen una vez y se comparten entre
+                # agentes (LangGraph no muta el input)
+                config = {"configurable": {"thread_id": thread_id}}
+                payload = {"messages": [HumanMessage(content=query)]}
                 
-                else:  # multi
-                    result = self._execute_multi_agent(query, config)
+                if category == "agentic":
+                    # Coordinator + agente especulativo en paralelo
+                    result, workflow_type = await self._execute_agentic(query, payload, config)
+                else:
+                    # Ejecutar varios agentes directamente
+                    result = await self._execute_multi_agent(query, payload, config)
                     workflow_type = "multi_agent"
             
-            elif category == "multi_agent":
-                # Ejecutar varios agentes directamente
-                result = self._execute_multi_agent(query, config)
-                workflow_type = "multi_agent"
-            
             else:
                 result = WorkflowResult(
                     content=f"❌ Categoría desconocida: {category}",
@@ -141,21 +375,22 @@ class OrchestratorV5:
                 workflow_type = "error"
             
             # Actualizar métricas
-            elapsed_time = (datetime.now() - start_time).total_seconds()
-            if workflow_type in self.metrics:
-                self.metrics[workflow_type]["count"] += 1
-                self.metrics[workflow_type]["total_time"] += elapsed_time
+            elapsed_time = self._perf() - start_time
+            i = _BUCKET.get(workflow_type)
+            if i is not None:
+                self._counts[i] += 1
+                self._totals[i] += elapsed_time
+            
+            if self._info_enabled():
+                logger.info(f"✅ Respuesta generada en {elapsed_time:.2f}s | Workflow: {workflow_type}")
             
-            print(f"\n✅ Respuesta generada en {elapsed_time:.2f}s")
-            print(f"   Workflow: {workflow_type}")
-            print("="*70)
+            if workflow_type != "error" and "error" not in result.metadata:
+                self._result_cache.set(result_key, result)
             
             return result
         
         except Exception as e:
-            print(f"\n❌ ERROR EN ORCHESTRATOR: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ ERROR EN ORCHESTRATOR: {e}")
             
             return WorkflowResult(
                 content=f"❌ Error inesperado: {str(e)}",
@@ -163,87 +398,233 @@ class OrchestratorV5:
                 metadata={"error": str(e)}
             )
     
-    def _execute_single_agent(
-        self, 
-        agent, 
-        query: str, 
-        config: dict, 
-        workflow_type: str
-    ) -> WorkflowResult:
-        """Ejecuta un solo agente"""
-        agent_result = agent.invoke(
-            {"messages": [HumanMessage(content=query)]},
-            config=config
+    async def _execute_agentic(self, query: str, payload: dict, config: dict) -> tuple:
+        """
+        Camino agentic con especulación.
+        
+        Mientras el Coordinator decide (una llamada LLM), se lanza ya el agente
+        que sugieren las palabras clave. Si el Coordinator coincide se usa ese
+        resultado; si no, se cancela y se ejecuta el agente correcto.
+        
+        La especulación corre en un thread desechable (con el historial del
+        thread real como entrada): cancelarla no deja turnos a medias en la
+        memoria del agente. Solo si acierta se copia el turno al thread real.
+        
+        Returns:
+            (WorkflowResult, workflow_type)
+        """
+        coord_key = normalize_query(query)
+        coord_decision = self._coord_cache.get(coord_key)
+        
+        # Con la decisión ya en caché no hay nada que especular
+        guess = None
+        spec_task = None
+        if coord_decision is None:
+            guess = self._heuristic_guess_agent(query)
+            if guess is not None:
+                spec_task = asyncio.create_task(self._speculate(guess, payload, config))
+            
+            try:
+                coord_decision = await self.coordinator.aroute(query)
+            except BaseException:
+                if spec_task is not None:
+                    spec_task.cancel()
+                raise
+            self._coord_cache.set(coord_key, coord_decision)
+        else:
+            self._info(f"⚡ Decisión del Coordinator desde caché: {coord_decision.agent}")
+        
+        agent_name = coord_decision.agent
+        
+        if spec_task is not None:
+            if agent_name == guess:
+                self.speculation_stats["hits"] += 1
+                self._info(f"🎯 Especulación acertada: {guess}")
+            else:
+                self.speculation_stats["misses"] += 1
+                spec_task.cancel()
+                self._info(f"🔄 Especulación descartada: {guess} → {agent_name}")
+        
+        if agent_name not in self._agents:  # multi
+            return await self._execute_multi_agent(query, payload, config), "multi_agent"
+        
+        workflow_type = f"agentic_{agent_name}"
+        agent = self._agents[agent_name]
+        agent_result = None
+        if agent_name == guess:
+            try:
+                agent_result, new_messages = await spec_task
+                await agent.aupdate_state(config, {"messages": new_messages}, as_node="call_llm")
+            except Exception as e:
+                logger.warning(f"⚠️ Especulación fallida ({agent_name}), se ejecuta de nuevo: {e}")
+                agent_result = None
+        if agent_result is None:
+            agent_result = await agent.ainvoke(payload, config=config)
+        return self._single_agent_result(agent_result, workflow_type), workflow_type
+    
+    async def _speculate(self, name: str, payload: dict, config: dict) -> tuple:
+        """
+        Ejecuta el agente name en un thread desechable que parte del historial
+        del thread real.
+        
+        Returns:
+            (estado final, mensajes nuevos del turno para copiar al thread real)
+        """
+        agent = self._agents[name]
+        snapshot = await agent.aget_state(config)
+        history = list((snapshot.values or {}).get("messages", [])) if snapshot else []
+        
+        # Los mensajes de entrada llevan id: el turno nuevo se localiza por id y
+        # no por posición (el reducer del PerformanceAgent recorta el historial)
+        inputs = [
+            msg if msg.id else msg.model_copy(update={"id": uuid.uuid4().hex})
+            for msg in payload["messages"]
+        ]
+        
+        spec_thread = f"spec_{uuid.uuid4().hex[:12]}"
+        try:
+            agent_result = await agent.ainvoke(
+                {"messages": history + inputs},
+                config={"configurable": {"thread_id": spec_thread}}
+            )
+        finally:
+            try:
+                await agent.checkpointer.adelete_thread(spec_thread)
+            except Exception as e:
+                logger.debug(f"No se pudo borrar el thread especulativo {spec_thread}: {e}")
+        
+        messages = agent_result["messages"]
+        last_input_id = inputs[-1].id
+        start = next(
+            (i + 1 for i in range(len(messages) - 1, -1, -1) if messages[i].id == last_input_id),
+            len(messages) - 1
+        )
+        return agent_result, inputs + messages[start:]
+    
+    async def _record_turn(self, result: WorkflowResult, query: str, thread_id: str) -> None:
+        """
+        Escribe el par Human/AI en el checkpoint del thread de los agentes que
+        produjeron result (FastPath no tiene memoria: nada que escribir).
+        """
+        agent_names = result.metadata.get("agents_used") or (
+            [result.metadata["agent"]] if "agent" in result.metadata else []
         )
+        config = {"configurable": {"thread_id": thread_id}}
+        turn = {"messages": [HumanMessage(content=query), AIMessage(content=result.content)]}
+        
+        for name in agent_names:
+            agent = self._agents.get(name)
+            if agent is None:
+                continue
+            try:
+                await agent.aupdate_state(config, turn, as_node="call_llm")
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo registrar el turno en la memoria de {name}: {e}")
+    
+    def _heuristic_guess_agent(self, query: str) -> Optional[str]:
+        """Agente probable según palabras clave; None si es ambiguo"""
+        groups = _keyword_groups(query.lower())
+        return next(iter(groups)) if len(groups) == 1 else None
+    
+    def _single_agent_result(self, agent_result: dict, workflow_type: str) -> WorkflowResult:
+        """Convierte el estado final de un agente en WorkflowResult"""
         final_message = agent_result["messages"][-1]
         content = final_message.content if isinstance(final_message.content, str) else str(final_message.content)
         
         return WorkflowResult(
             content=content,
             workflow_type=workflow_type,
-            metadata={"agent": workflow_type.split("_")[1]}
+            metadata={"agent": _AGENT_NAME[workflow_type]}
         )
     
-    def _execute_multi_agent(self, query: str, config: dict) -> WorkflowResult:
+    def _select_agents(self, query: str) -> list:
         """
-        Ejecuta múltiples agentes y combina respuestas.
-        
         Decide inteligentemente qué agentes usar:
         - Si menciona "recomendaciones" → Config + Recommendation
         - Si pide "análisis completo" → Config + Performance + Recommendation
         - Si ambiguo → Config + Performance
-        """
-        print("\n⚙️ MULTI-AGENT MODE: Analizando qué agentes usar...")
         
-        query_lower = query.lower()
+        Returns:
+            Lista de (nombre, agente) en el orden de presentación
+        """
+        groups = _keyword_groups(query.lower())
         
         # Detectar qué agentes necesitamos
         needs_config = True  # Casi siempre necesitamos config
-        needs_performance = any(kw in query_lower for kw in [
-            "gasto", "clicks", "conversiones", "rendimiento", "ctr", "cpm", "cpa"
-        ])
-        needs_recommendation = any(kw in query_lower for kw in [
-            "recomienda", "optimiza", "mejora", "sugerencia", "debería", "completo", "análisis"
-        ])
+        needs_performance = "performance" in groups
+        needs_recommendation = "recommendation" in groups
         
         # Si no detectamos nada específico, usar config + performance por defecto
         if not needs_performance and not needs_recommendation:
             needs_performance = True
         
-        agents_used = []
-        responses = {}
-        
-        # Ejecutar Config
+        selected = []
         if needs_config:
-            print("   📋 Llamando a ConfigAgent...")
-            config_result = self.config_agent.invoke(
-                {"messages": [HumanMessage(content=query)]},
-                config=config
-            )
-            responses["config"] = config_result["messages"][-1].content
-            agents_used.append("config")
-        
-        # Ejecutar Performance
+            selected.append(("config", self.config_agent))
         if needs_performance:
-            print("   📈 Llamando a PerformanceAgent...")
-            perf_result = self.performance_agent.invoke(
-                {"messages": [HumanMessage(content=query)]},
-                config=config
-            )
-            responses["performance"] = perf_result["messages"][-1].content
-            agents_used.append("performance")
-        
-        # Ejecutar Recommendation ✨
-        if needs_recommendation:
-            print("   💡 Llamando a RecommendationAgent...")
-            rec_result = self.recommendation_agent.invoke(
-                {"messages": [HumanMessage(content=query)]},
-                config=config
+            selected.append(("performance", self.performance_agent))
+        if needs_recommendation:  # ✨
+            selected.append(("recommendation", self.recommendation_agent))
+        return selected
+    
+    async def _guarded_invoke(self, name: str, payload: dict, config: dict) -> Tuple[str, bool]:
+        """
+        Invoca un agente con timeout y circuit breaker.
+        
+        Nunca lanza: un agente lento, caído o con el breaker abierto devuelve
+        un texto que ocupa su sección (fail_fast = False).
+        
+        Returns:
+            (contenido, ok)
+        """
+        breaker = self._breakers[name]
+        if not breaker.allow():
+            logger.warning(f"⏭️ {name} omitido: circuit breaker abierto")
+            return "⏭️ (omitido por timeout)", False
+        
+        try:
+            agent_result = await asyncio.wait_for(
+                self._agents[name].ainvoke(payload, config=config),
+                timeout=self.timeout_per_agent
             )
-            responses["recommendation"] = rec_result["messages"][-1].content
-            agents_used.append("recommendation")
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            logger.warning(f"⏱️ {name} sin respuesta en {self.timeout_per_agent}s")
+            return f"⏱️ Sin respuesta en {self.timeout_per_agent}s (omitido por timeout)", False
+        except Exception as e:
+            breaker.record_failure()
+            logger.error(f"❌ Error en agente {name}: {e}")
+            return f"❌ Error: {e}", False
+        
+        breaker.record_success()
+        return agent_result["messages"][-1].content, True
+    
+    async def _execute_multi_agent(self, query: str, payload: dict, config: dict) -> WorkflowResult:
+        """
+        Ejecuta múltiples agentes y combina respuestas.
         
-        # Combinar respuestas
+        Los agentes son independientes: se lanzan a la vez y cada uno está
+        acotado por timeout_per_agent, así la latencia total no supera ese
+        límite aunque un backend se cuelgue.
+        """
+        agents_used = [name for name, _ in self._select_agents(query)]
+        self._info(f"⚙️ MULTI-AGENT MODE: lanzando en paralelo {', '.join(agents_used)}")
+        
+        outcomes = await asyncio.gather(
+            *(self._guarded_invoke(name, payload, config) for name in agents_used)
+        )
+        result = self._build_multi_result(
+            {name: content for name, (content, _) in zip(agents_used, outcomes)}, agents_used
+        )
+        
+        # Respuesta incompleta: se marca para que no entre en la caché de resultados
+        failed = [name for name, (_, ok) in zip(agents_used, outcomes) if not ok]
+        if failed:
+            result.metadata["error"] = f"agentes sin respuesta: {', '.join(failed)}"
+        return result
+    
+    def _build_multi_result(self, responses: dict, agents_used: list) -> WorkflowResult:
+        """Combina respuestas y construye el WorkflowResult del modo multi-agente"""
         combined_content = self._combine_responses(responses, agents_used)
         
         return WorkflowResult(
@@ -254,39 +635,75 @@ class OrchestratorV5:
     
     def _combine_responses(self, responses: dict, agents_used: list) -> str:
         """Combina respuestas de múltiples agentes en formato bonito"""
-        sections = []
-        
-        if "config" in responses:
-            sections.append(f"""## 📋 Configuración Técnica
-{responses["config"]}""")
+        sections = [
+            _format_section(name, responses[name])
+            for name in _SECTION_TEMPLATES if name in responses
+        ]
         
-        if "performance" in responses:
-            sections.append(f"""## 📈 Rendimiento
-{responses["performance"]}""")
+        return _multi_header(len(agents_used)) + SECTION_SEPARATOR.join(sections)
+    
+    async def astream_multi_agent(
+        self,
+        query: str,
+        config: dict
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Lanza los agentes del modo multi-agente y devuelve (agente, contenido)
+        según van terminando, sin esperar al más lento.
+        """
+        agents_used = tuple(name for name, _ in self._select_agents(query))
+        self._info(f"⚙️ MULTI-AGENT STREAM: lanzando en paralelo {', '.join(agents_used)}")
+        payload = {"messages": [HumanMessage(content=query)]}
         
-        if "recommendation" in responses:
-            sections.append(f"""## 💡 Recomendaciones
-{responses["recommendation"]}""")
+        async def run(name: str) -> Tuple[str, str]:
+            content, _ = await self._guarded_invoke(name, payload, config)
+            return name, content
         
-        header = f"# ⚙️ ANÁLISIS COMPLETO ({len(agents_used)} agentes)\n\n"
+        tasks = [asyncio.create_task(run(name)) for name in agents_used]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Si el consumidor deja de iterar, no dejar agentes huérfanos
+            for task in tasks:
+                task.cancel()
+    
+    async def astream_multi_agent_text(self, query: str, config: dict) -> AsyncIterator[str]:
+        """
+        Versión incremental de _combine_responses: primero la cabecera y luego
+        cada sección en cuanto su agente responde (orden de llegada).
+        """
+        agents_used = self._select_agents(query)
+        yield _multi_header(len(agents_used))
         
-        return header + "\n\n---\n\n".join(sections)
+        first = True
+        async for name, content in self.astream_multi_agent(query, config):
+            yield ("" if first else SECTION_SEPARATOR) + _format_section(name, content)
+            first = False
     
     def get_metrics(self) -> dict:
         """Retorna métricas agregadas"""
-        metrics_summary = {}
+        avg_times = _summarize(self._counts, self._totals)
         
-        for workflow_type, data in self.metrics.items():
-            count = data["count"]
-            total_time = data["total_time"]
-            
-            metrics_summary[workflow_type] = {
+        return {
+            workflow_type: {
                 "total_queries": count,
                 "total_time": round(total_time, 2),
-                "avg_time": round(total_time / count, 2) if count > 0 else 0
+                "avg_time": avg_time
             }
-        
-        return metrics_summary
+            for workflow_type, count, total_time, avg_time
+            in zip(WORKFLOW_TYPES, self._counts, self._totals, avg_times)
+        }
+    
+    def get_speculation_stats(self) -> dict:
+        """Aciertos de la especulación en el camino agentic"""
+        hits = self.speculation_stats["hits"]
+        total = hits + self.speculation_stats["misses"]
+        
+        return {
+            **self.speculation_stats,
+            "speculation_hit_rate": round(hits / total, 2) if total > 0 else 0
+        }
     
     def print_metrics(self):
         """Imprime métricas de rendimiento"""
@@ -306,12 +723,46 @@ class OrchestratorV5:
                 print(f"   Tiempo promedio: {data['avg_time']:.2f}s")
                 print()
         
+        if self.result_cache_hits:
+            print(f"⚡ Respuestas desde caché semántica: {self.result_cache_hits}")
+            print()
+        
+        if self.router_skipped:
+            print(f"⚡ Router omitido (FastPath directo): {self.router_skipped} consultas")
+            print()
+        
+        spec = self.get_speculation_stats()
+        if spec["hits"] + spec["misses"] > 0:
+            print(f"🎯 Especulación: {spec['hits']} aciertos / {spec['misses']} fallos "
+                  f"(hit rate {spec['speculation_hit_rate']:.0%})")
+            print()
+        
         print("="*70)
 
 
 # ========== EXPORTAR ==========
 
-orchestrator_v5 = OrchestratorV5()
+# Singleton perezoso: importar el módulo (p.ej. api/main.py solo necesita la
+# clase) ya no construye el orchestrator; se crea en el primer acceso.
+_orchestrator_v5: Optional[OrchestratorV5] = None
+_orchestrator_lock = threading.Lock()
+
+
+def get_orchestrator_v5() -> OrchestratorV5:
+    """Devuelve la instancia compartida, creándola la primera vez"""
+    global _orchestrator_v5
+    if _orchestrator_v5 is None:
+        with _orchestrator_lock:
+            if _orchestrator_v5 is None:
+                _orchestrator_v5 = OrchestratorV5()
+    return _orchestrator_v5
+
+
+def __getattr__(name: str):
+    # PEP 562: `from ...orchestrator_v5 import orchestrator_v5` sigue funcionando
+    if name == "orchestrator_v5":
+        return get_orchestrator_v5()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ========== TESTING ==========
@@ -319,6 +770,8 @@ orchestrator_v5 = OrchestratorV5()
 if __name__ == "__main__":
     print("\n🧪 Testing Orchestrator V5...\n")
     
+    orchestrator_v5 = get_orchestrator_v5()
+    
     test_queries = [
         ("lista todas las campañas", "simple"),
         ("¿qué presupuesto tiene Baqueira?", "agentic_config"),
@@ -3,13 +3,32 @@ Router V4 - SIMPLIFICADO (3 categorías) + CONTEXTO CONVERSACIONAL
 Reduce complejidad y mejora precisión
 """
 
+import asyncio
+import functools
+import hashlib
+import heapq
+import logging
+import math
 import os
-from typing import Literal, Optional, List
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import Literal, Optional, List, Tuple
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from pydantic import BaseModel, Field
 
+from ..utils.cache import TTLCache
+from ..utils.helpers import jaccard_similarity, normalize_query, query_tokens, serialize_messages
+from ..utils.llm import get_chat_model
+
+logger = logging.getLogger(__name__)
+
 
 # ========== SCHEMA ==========
 
@@ -36,131 +55,279 @@ class RouteQueryV4(BaseModel):
     )
 
 
+# RouteQueryV4 solo es el esquema de salida para Gemini. Internamente (cachés,
+# reglas locales, KNN) y hacia fuera se usa esta versión ligera e inmutable:
+# sin validación por instancia y compartible sin copias.
+@dataclass(slots=True, frozen=True)
+class RouteQueryV4Fast:
+    """Decisión del Router (mismos campos que RouteQueryV4)"""
+    
+    category: str
+    confidence: float
+    reasoning: str
+    detected_intent: Optional[str] = None
+    
+    @classmethod
+    def from_schema(cls, result: RouteQueryV4) -> "RouteQueryV4Fast":
+        return cls(result.category, result.confidence, result.reasoning, result.detected_intent)
+
+
+def _as_fast(result):
+    """Convierte la salida del LLM; excepciones y decisiones ya ligeras pasan tal cual"""
+    if isinstance(result, (BaseException, RouteQueryV4Fast)) or result is None:
+        return result
+    return RouteQueryV4Fast.from_schema(result)
+
+
 # ========== PROMPT ==========
 
-ROUTER_V4_PROMPT = """
-Eres un clasificador experto de consultas para un sistema de Meta Ads.
+# Reglas estáticas primero (system) y solo lo variable al final (user):
+# el prefijo idéntico entre llamadas aprovecha la caché implícita de Gemini.
+SYSTEM_RULES = """Clasifica consultas de un sistema de Meta Ads en UNA categoría.
+
+SIMPLE: listar campañas sin métricas ni recomendaciones (intent list).
+- "lista todas las campañas", "¿cuántas campañas activas tengo?"
+AGENTIC: un agente sobre una campaña: métricas/comparaciones/TOP (metrics, compare), configuración (config), recomendaciones (recommendation), anuncios (ad_analysis), respuesta a una pregunta del asistente (continuation).
+- "¿qué presupuesto tiene Baqueira?", "gasto de Ibiza esta semana", "¿cómo mejorar el CPA de Ibiza?", "¿qué anuncio ha empeorado?"
+MULTI_AGENT: análisis o reporte completo, "¿cómo está X?" (intent report).
+- "analiza la campaña de Baqueira", "dame un reporte completo de Ibiza"
+
+Prioridad: 1) anuncio/ad → AGENTIC; 2) si el asistente preguntó algo ("¿de qué campaña?", "¿cuál?") la respuesta es AGENTIC continuation, sobre todo si tiene ≤4 palabras; 3) listar sin métricas → SIMPLE; 4) métricas, config o recomendaciones → AGENTIC; 5) análisis completo → MULTI_AGENT.
+reasoning: una sola frase breve.
+Palabras AGENTIC: gasto, conversiones, clicks, CTR, CPM, CPC, CPA, presupuesto, estrategia, puja, objetivo, compara, vs, TOP, mejores, peores, recomienda, optimiza, mejora, sugerencia, debería, anuncio, empeorado, explica."""
 
-**📄 CONTEXTO CONVERSACIONAL:**
+USER_TEMPLATE = """Contexto:
 {conversation_context}
 
-**🔍 CONSULTA ACTUAL:**
-{query}
-
-Clasifica la consulta en UNA de estas 3 categorías:
-
-┌────────────────────────────────────────────────────────────────┐
-
-⚡ **SIMPLE** (Fast Path - Sin agente):
-   Características:
-   - Listados básicos SIN análisis
-   - Consultas directas con respuesta obvia
-   - NO requiere razonamiento del LLM
-   - Respuesta directa desde herramienta
-   - NO menciona métricas de rendimiento NI recomendaciones
-   
-   Ejemplos:
-   ✅ "lista todas las campañas"
-   ✅ "¿cuántas campañas activas tengo?"
-   ✅ "muéstrame las campañas"
-   ❌ "gasto de las campañas" → AGENTIC (métrica)
-   ❌ "recomienda mejoras" → AGENTIC (recomendación)
-
-├────────────────────────────────────────────────────────────────┤
-
-🤖 **AGENTIC** (Con agente especializado):
-   Características:
-   - Requiere llamar a ConfigAgent, PerformanceAgent o RecommendationAgent
-   - Necesita búsqueda de campaña por nombre
-   - Métricas o configuración de UNA campaña
-   - Comparaciones de períodos
-   - TOP N anuncios
-   - 🆕 **ANÁLISIS DE ANUNCIOS INDIVIDUALES** 🔥
-   - 🆕 **COMPARACIONES DE ANUNCIOS** (identificar cuál empeoró) 🔥
-   - 🆕 **"¿Qué anuncio explica X?"** → SIEMPRE PerformanceAgent 🔥
-   - Recomendaciones específicas de UNA campaña
-   - **CONTINUACIONES de conversaciones previas** 📄
-   
-   Ejemplos:
-   ✅ "¿qué presupuesto tiene Baqueira?" → ConfigAgent
-   ✅ "gasto de Ibiza esta semana" → PerformanceAgent
-   ✅ "TOP 3 de anuncios de Costa Blanca" → PerformanceAgent
-   ✅ "compara esta semana con la anterior" → PerformanceAgent
-   ✅ "estrategia de puja de Menorca" → ConfigAgent
-   ✅ "dame recomendaciones para Baqueira" → RecommendationAgent
-   ✅ "¿cómo mejorar el CPA de Ibiza?" → RecommendationAgent
-   ✅ 🔥 "¿qué anuncio ha empeorado?" → PerformanceAgent
-   ✅ 🔥 "¿qué anuncio explica el cambio en el CPA?" → PerformanceAgent
-   ✅ 🔥 "dame todos los anuncios de Baqueira" → PerformanceAgent
-   ✅ 🔥 "¿hay algún anuncio que ha empeorado?" → PerformanceAgent
-   
-   **CONTINUACIONES (CRÍTICO):** 📄
-   Si el asistente preguntó algo en el contexto, la respuesta del usuario es AGENTIC:
-   ✅ Contexto: "¿De qué campaña?" → Usuario: "campaña de baqueira" → AGENTIC
-   ✅ Contexto: "¿Cuál campaña?" → Usuario: "baqueira" → AGENTIC
-   ✅ Contexto: "necesito el ID" → Usuario: "de la de ibiza" → AGENTIC
-   ✅ Contexto: pregunta del bot → Usuario: "todas" → AGENTIC
-
-├────────────────────────────────────────────────────────────────┤
-
-🔀 **MULTI_AGENT** (Requiere varios agentes):
-   Características:
-   - Análisis completo (config + rendimiento + recomendaciones)
-   - "¿Cómo está X?" sin especificar
-   - Reportes completos con sugerencias
-   - Necesita información de múltiples agentes
-   
-   Ejemplos:
-   ✅ "analiza la campaña de Baqueira"
-   ✅ "¿cómo está Costa del Sol?"
-   ✅ "dame un reporte completo de Ibiza"
-   ✅ "qué me puedes decir de Menorca"
-   ✅ "análisis completo con recomendaciones de Baqueira"
-
-└────────────────────────────────────────────────────────────────┘
-
-🎯 REGLAS CRÍTICAS:
-
-1. **MÁXIMA PRIORIDAD - Detección de continuaciones:** 📄
-   - Si hay contexto conversacional Y el asistente hizo una pregunta → la respuesta es AGENTIC
-   - Indicadores: "¿de qué campaña?", "¿cuál?", "necesito", "proporciona", "especifica"
-   - Si la query es ≤4 palabras Y hay contexto → probablemente AGENTIC (continuation)
-
-2. **🔥 NUEVA REGLA: Queries sobre ANUNCIOS → SIEMPRE AGENTIC (PerformanceAgent)**
-   - Si menciona "anuncio", "anuncios", "ad", "ads" → AGENTIC
-   - "¿qué anuncio...?" → AGENTIC (detected_intent: ad_analysis)
-   - "¿hay algún anuncio que...?" → AGENTIC (detected_intent: ad_analysis)
-   - "dame todos los anuncios" → AGENTIC (detected_intent: ad_analysis)
-   - "¿cuál anuncio explica...?" → AGENTIC (detected_intent: ad_analysis)
-   
-3. **Prioridad de clasificación:**
-   1. Queries sobre anuncios → AGENTIC (detected_intent: ad_analysis) 🔥
-   2. Continuación de conversación → AGENTIC (detected_intent: continuation)
-   3. Solo listar SIN métricas → SIMPLE
-   4. Campaña + métricas → AGENTIC (PerformanceAgent)
-   5. Campaña + config → AGENTIC (ConfigAgent)
-   6. Campaña + recomendaciones → AGENTIC (RecommendationAgent)
-   7. "Análisis completo" → MULTI_AGENT
-
-4. **Palabras clave AGENTIC:**
-   - Métricas: gasto, conversiones, clicks, CTR, CPM, CPC, CPA
-   - Config: presupuesto, estrategia, puja, objetivo
-   - Comparaciones: "compara", "vs", "versus"
-   - TOP: "TOP 3", "mejores", "peores"
-   - Recomendaciones: "recomienda", "optimiza", "mejora", "sugerencia", "debería"
-   - 🔥 Anuncios: "anuncio", "anuncios", "ad", "ads", "empeorado", "explica"
-
-5. **Detected Intent:**
-   - 'ad_analysis' → análisis de anuncios (AGENTIC/PerformanceAgent) 🔥
-   - 'continuation' → respuesta a pregunta del asistente (AGENTIC) 📄
-   - 'list' → solo listar (SIMPLE)
-   - 'metrics' → métricas (AGENTIC/PerformanceAgent)
-   - 'config' → configuración (AGENTIC/ConfigAgent)
-   - 'recommendation' → recomendaciones (AGENTIC/RecommendationAgent)
-   - 'report' → reporte completo (MULTI_AGENT)
-
-Clasifica la consulta actual considerando TODO el contexto conversacional.
-"""
+Consulta: {query}"""
+
+# Formato de salida compacto: una línea en vez del JSON de structured output
+# (menos tokens de salida y sin decodificación restringida por esquema)
+LINE_FORMAT = """
+Responde EXACTAMENTE en una línea: CATEGORY|CONFIDENCE|INTENT|REASON
+(CATEGORY: simple, agentic o multi_agent; CONFIDENCE entre 0 y 1; INTENT vacío si no aplica)"""
+
+# Plantillas parseadas una sola vez y compartidas por todas las instancias
+_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_RULES),
+    ("user", USER_TEMPLATE),
+])
+_LINE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_RULES + LINE_FORMAT),
+    ("user", USER_TEMPLATE),
+])
+
+_CATEGORIES = frozenset({"simple", "agentic", "multi_agent"})
+_NO_INTENT = frozenset({"", "none", "null", "-"})
+
+
+def _parse_line(message) -> "RouteQueryV4Fast":
+    """
+    Parsea 'CATEGORY|CONFIDENCE|INTENT|REASON'.
+    
+    Lanza ValueError si la línea no cumple el formato: la cadena cae
+    entonces al structured output (with_fallbacks).
+    
+    Example:
+        >>> _parse_line(AIMessage(content="agentic|0.9|metrics|Pide el gasto")).category
+        'agentic'
+    """
+    text = message.text if isinstance(message, BaseMessage) else str(message)
+    line = text.strip().split("\n", 1)[0]
+    
+    category, confidence, intent, reason = line.split("|", 3)
+    category = category.strip().lower()
+    if category not in _CATEGORIES:
+        raise ValueError(f"Categoría desconocida en la respuesta del Router: {category!r}")
+    
+    intent = intent.strip()
+    return RouteQueryV4Fast(
+        category=category,
+        confidence=min(max(float(confidence), 0.0), 1.0),
+        reasoning=reason.strip(),
+        detected_intent=None if intent.lower() in _NO_INTENT else intent
+    )
+
+
+# ========== CLASIFICADOR LOCAL ==========
+
+# Reglas deterministas del prompt, precompiladas. Solo se usan sin historial:
+# con contexto la query puede ser una continuación y decide el LLM.
+FAST_CONFIDENCE = 0.9
+
+# Solo palabras de nivel anuncio: "ads" suelto aparece en "Meta Ads", "Facebook Ads"...
+_ADS_RE = re.compile(r"\b(?:anuncios?|creatividad(?:es)?)\b")
+_MULTI_RE = re.compile(
+    r"\b(?:analiza|c[oó]mo est[aá]|reporte completo|an[aá]lisis completo|qu[eé] me puedes decir)\b"
+)
+_SIMPLE_RE = re.compile(r"^(?:lista|listar|mu[eé]strame|muestra|cu[aá]ntas)\b.*\bcampa")
+_AGENTIC_RES = (
+    ("compare", re.compile(r"\b(?:compara|vs|versus)\b")),
+    ("metrics", re.compile(
+        r"\b(?:gasto|gastado|conversiones|clicks|impresiones|cpa|ctr|cpm|cpc|top\s*\d+)\b"
+    )),
+    ("config", re.compile(r"\b(?:presupuesto|puja|estrategia|objetivo)\b")),
+    ("recommendation", re.compile(
+        r"\b(?:recomienda|recomendaciones|optimiza|optimizar|mejora|mejorar|sugerencias?|deber[ií]a)\b"
+    )),
+)
+
+
+def _fast_classify(query: str) -> Optional[RouteQueryV4Fast]:
+    """
+    Clasificación sin LLM para consultas obvias; None si hay duda.
+    
+    Orden de prioridad del prompt: anuncios → análisis completo → una sola
+    intención agentic → listado simple.
+    """
+    text = query.strip().lower().lstrip("¿¡ ")
+    
+    if _ADS_RE.search(text):
+        return RouteQueryV4Fast(
+            category="agentic", confidence=0.95,
+            reasoning="Regla local: consulta sobre anuncios", detected_intent="ad_analysis"
+        )
+    
+    intents = [intent for intent, pattern in _AGENTIC_RES if pattern.search(text)]
+    
+    if _MULTI_RE.search(text) and set(intents) <= {"recommendation"}:
+        return RouteQueryV4Fast(
+            category="multi_agent", confidence=0.92,
+            reasoning="Regla local: análisis/reporte completo", detected_intent="report"
+        )
+    
+    if len(intents) == 1:
+        return RouteQueryV4Fast(
+            category="agentic", confidence=0.92,
+            reasoning=f"Regla local: palabras clave de {intents[0]}", detected_intent=intents[0]
+        )
+    
+    if not intents and _SIMPLE_RE.search(text):
+        return RouteQueryV4Fast(
+            category="simple", confidence=0.95,
+            reasoning="Regla local: listado sin métricas", detected_intent="list"
+        )
+    
+    return None
+
+
+# ========== KNN SOBRE EMBEDDINGS ==========
+
+# Ejemplos canónicos (los del prompt original). Una consulta sin historial se
+# clasifica por sus vecinos más cercanos: una llamada de embedding y un producto
+# escalar en lugar de un chat completion. Si el vecino más cercano no se parece
+# lo suficiente, decide el LLM.
+EMBEDDING_MODEL = "models/text-embedding-004"
+KNN_K = 5
+KNN_MIN_SCORE = 0.8
+
+# El KNN solo compensa si acierta a menudo: un fallo cuesta un round trip de
+# embeddings antes del LLM. Si el embedding falla, o en las últimas KNN_WINDOW
+# consultas acierta menos de KNN_MIN_HIT_RATE, se deja de consultar durante
+# KNN_RETRY_AFTER segundos
+KNN_WINDOW = 20
+KNN_MIN_HIT_RATE = 0.3
+KNN_RETRY_AFTER = 300
+
+EXAMPLES: Tuple[Tuple[str, str, str], ...] = (
+    ("lista todas las campañas", "simple", "list"),
+    ("¿cuántas campañas activas tengo?", "simple", "list"),
+    ("muéstrame las campañas", "simple", "list"),
+    ("¿qué presupuesto tiene Baqueira?", "agentic", "config"),
+    ("estrategia de puja de Menorca", "agentic", "config"),
+    ("gasto de Ibiza esta semana", "agentic", "metrics"),
+    ("compara esta semana con la anterior", "agentic", "compare"),
+    ("dame recomendaciones para Baqueira", "agentic", "recommendation"),
+    ("¿cómo mejorar el CPA de Ibiza?", "agentic", "recommendation"),
+    ("TOP 3 de anuncios de Costa Blanca", "agentic", "ad_analysis"),
+    ("¿qué anuncio ha empeorado?", "agentic", "ad_analysis"),
+    ("¿qué anuncio explica el cambio en el CPA?", "agentic", "ad_analysis"),
+    ("dame todos los anuncios de Baqueira", "agentic", "ad_analysis"),
+    ("¿hay algún anuncio que ha empeorado?", "agentic", "ad_analysis"),
+    ("analiza la campaña de Baqueira", "multi_agent", "report"),
+    ("¿cómo está Costa del Sol?", "multi_agent", "report"),
+    ("dame un reporte completo de Ibiza", "multi_agent", "report"),
+    ("qué me puedes decir de Menorca", "multi_agent", "report"),
+    ("análisis completo con recomendaciones de Baqueira", "multi_agent", "report"),
+)
+
+
+def _unit(vector: List[float]) -> Tuple[float, ...]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return tuple(x / norm for x in vector)
+
+
+def _knn_vote(
+    vector: List[float],
+    index: List[Tuple[Tuple[float, ...], str, str]]
+) -> Optional[RouteQueryV4Fast]:
+    """Voto ponderado por similitud coseno de los KNN_K ejemplos más cercanos"""
+    query = _unit(vector)
+    nearest = heapq.nlargest(
+        KNN_K,
+        ((sum(a * b for a, b in zip(query, example)), category, intent)
+         for example, category, intent in index)
+    )
+    if not nearest or nearest[0][0] < KNN_MIN_SCORE:
+        return None
+    
+    votes = {}
+    for score, category, _ in nearest:
+        votes[category] = votes.get(category, 0.0) + max(score, 0.0)
+    category = max(votes, key=votes.get)
+    score, _, intent = next(item for item in nearest if item[1] == category)
+    
+    return RouteQueryV4Fast(
+        category=category,
+        confidence=min(score, 1.0),
+        reasoning=f"KNN: {votes[category] / sum(votes.values()):.0%} del voto de los {len(nearest)} ejemplos más cercanos",
+        detected_intent=intent
+    )
+
+
+# ========== CACHÉ ==========
+
+# Mensajes del historial que ve el Router
+CONTEXT_MESSAGES = 6
+NO_CONTEXT = "Sin historial previo (primera consulta del thread)"
+
+
+def _cache_key(query: str, messages: Optional[List[BaseMessage]]) -> str:
+    """Query normalizada + huella del contexto reciente"""
+    key = normalize_query(query)
+    if messages:
+        context = serialize_messages(messages[-CONTEXT_MESSAGES:])
+        key += "|" + hashlib.blake2b(context.encode("utf-8"), digest_size=8).hexdigest()
+    return key
+
+
+# Caché semántica: consultas parecidas (Jaccard sobre palabras significativas)
+# reutilizan la decisión. Solo categorías de bajo riesgo: un falso positivo
+# SIMPLE/MULTI_AGENT se nota poco; uno AGENTIC mandaría al agente equivocado.
+SEMANTIC_THRESHOLD = 0.8
+SEMANTIC_CATEGORIES = frozenset({"simple", "multi_agent"})
+
+
+# Cascada: primero el modelo ligero; solo si duda se escala al completo
+ROUTER_CHEAP_MODEL = "gemini-2.5-flash-lite"
+ROUTER_MODEL = "gemini-2.5-flash"
+ESCALATE_BELOW = 0.75
+
+# La salida es una línea corta (o un JSON corto en el fallback estructurado):
+# se acota la generación y se desactiva el thinking para no pagar decodificación
+ROUTER_MAX_OUTPUT_TOKENS = 128
+ROUTER_THINKING_BUDGET = 0
+
+# Micro-batching de llamadas a Gemini (aclassify / classify_many)
+BATCH_WINDOW = 0.02
+BATCH_MAX_SIZE = 32
+BATCH_MAX_CONCURRENCY = 16
+
+
+# Log de decisiones: emoji por índice de categoría (el último es el desconocido)
+_CAT_IDX = {"simple": 0, "agentic": 1, "multi_agent": 2}
+_CAT_EMOJI = ("⚡", "🤖", "🔀", "❓")
+_DECISION_TEMPLATE = "🔀 Router V4: %s %s (%.2f%s) intent=%s | '%s' | %s"
 
 
 # ========== ROUTER ==========
@@ -169,17 +336,82 @@ class QueryRouterV4:
     """Router simplificado con 3 categorías + contexto conversacional"""
     
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.0,
+        # Decisiones por (query normalizada, contexto reciente), LRU
+        self._cache = TTLCache(maxsize=1024)
+        
+        # (tokens, decisión) de consultas sin historial, para la caché semántica
+        self._semantic = deque(maxlen=1024)
+        self._semantic_lock = threading.Lock()
+        
+        # Contexto ya formateado por historial: (id, len) -> (último mensaje, texto)
+        self._ctx_cache = TTLCache(maxsize=256)
+        
+        # Embeddings normalizados de EXAMPLES, calculados en el primer uso
+        self._examples: Optional[List[Tuple[Tuple[float, ...], str, str]]] = None
+        self._examples_lock = threading.Lock()
+        
+        # Aciertos/consultas del KNN en la ventana actual y pausa tras fallos
+        self._knn_stats = {"hits": 0, "total": 0, "retry_after": 0.0}
+        self._knn_lock = threading.Lock()
+        
+        # Una cola de micro-batching por event loop (API y orquestador usan loops distintos)
+        self._batch_queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Queue]" = (
+            weakref.WeakKeyDictionary()
+        )
+    
+    # Cliente y pipeline se construyen en el primer uso: las consultas que
+    # resuelven la caché o el clasificador local nunca los necesitan.
+    # Los modelos salen de la fábrica compartida (utils/llm.py): mismo cliente
+    # y pool de conexiones que el resto de agentes.
+    
+    @functools.cached_property
+    def llm(self) -> ChatGoogleGenerativeAI:
+        return get_chat_model(
+            ROUTER_MODEL, 0.0,
+            max_output_tokens=ROUTER_MAX_OUTPUT_TOKENS,
+            thinking_budget=ROUTER_THINKING_BUDGET
+        )
+    
+    @functools.cached_property
+    def cheap_llm(self) -> ChatGoogleGenerativeAI:
+        return get_chat_model(
+            ROUTER_CHEAP_MODEL, 0.0,
+            max_output_tokens=ROUTER_MAX_OUTPUT_TOKENS,
+            thinking_budget=ROUTER_THINKING_BUDGET
+        )
+    
+    @functools.cached_property
+    def embeddings(self) -> GoogleGenerativeAIEmbeddings:
+        return GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
             google_api_key=os.getenv("GEMINI_API_KEY")
         )
-        
-        self.structured_llm = self.llm.with_structured_output(RouteQueryV4)
-        self.prompt = ChatPromptTemplate.from_template(ROUTER_V4_PROMPT)
-        self.chain = self.prompt | self.structured_llm
     
-    def classify(self, query: str, messages: Optional[List[BaseMessage]] = None) -> RouteQueryV4:
+    @functools.cached_property
+    def structured_llm(self):
+        return self.llm.with_structured_output(RouteQueryV4)
+    
+    @functools.cached_property
+    def prompt(self) -> ChatPromptTemplate:
+        return _PROMPT
+    
+    @functools.cached_property
+    def chain(self):
+        return self._line_then_structured(self.llm, self.structured_llm)
+    
+    @functools.cached_property
+    def cheap_chain(self):
+        return self._line_then_structured(
+            self.cheap_llm, self.cheap_llm.with_structured_output(RouteQueryV4)
+        )
+    
+    def _line_then_structured(self, llm, structured_llm):
+        """Respuesta en una línea; si no se puede parsear, reintento con structured output"""
+        return (_LINE_PROMPT | llm | RunnableLambda(_parse_line)).with_fallbacks(
+            [self.prompt | structured_llm]
+        )
+    
+    def classify(self, query: str, messages: Optional[List[BaseMessage]] = None) -> RouteQueryV4Fast:
         """
         Clasifica una consulta en 3 categorías considerando el contexto.
         
@@ -188,71 +420,468 @@ class QueryRouterV4:
             messages: Historial de mensajes para contexto (opcional)
             
         Returns:
-            RouteQueryV4 con category, confidence, reasoning, etc.
+            RouteQueryV4Fast con category, confidence, reasoning, etc.
         """
-        # Preparar contexto conversacional
-        conversation_context = self._prepare_context(messages)
+        key = _cache_key(query, messages)
+        known = self._resolve_locally(key, query, messages)
+        if known is not None:
+            return known
         
-        result = self.chain.invoke({
-            "query": query,
-            "conversation_context": conversation_context
-        })
+        result = None if messages else self._knn_classify([query])[0]
+        if result is None:
+            result = self._invoke_cascade(self._chain_input(query, messages))
+        self._remember(key, query, messages, result)
+        
+        return result
+    
+    async def aclassify(self, query: str, messages: Optional[List[BaseMessage]] = None) -> RouteQueryV4Fast:
+        """
+        Versión async de classify (no bloquea el event loop).
+        
+        Las llamadas a Gemini concurrentes se agrupan en micro-lotes
+        (ventana de BATCH_WINDOW segundos) y salen en un solo chain.abatch.
+        """
+        key = _cache_key(query, messages)
+        known = self._resolve_locally(key, query, messages)
+        if known is not None:
+            return known
+        
+        result = None if messages else (await self._aknn_classify([query]))[0]
+        if result is None:
+            result = await self._enqueue(self._chain_input(query, messages))
+        self._remember(key, query, messages, result)
+        
+        return result
+    
+    def classify_many(
+        self,
+        requests: List[Tuple[str, Optional[List[BaseMessage]]]]
+    ) -> List[RouteQueryV4Fast]:
+        """
+        Clasifica varias consultas (query, messages) de una vez.
+        
+        Las resueltas por caché o reglas locales no van a Gemini; el resto
+        sale en un único chain.batch con concurrencia acotada. Si la llamada
+        de una consulta falla, su posición trae la excepción (no se cachea)
+        y el resto del lote se devuelve igual.
+        """
+        results: List[Optional[RouteQueryV4Fast]] = [None] * len(requests)
+        pending = []
+        
+        for i, (query, messages) in enumerate(requests):
+            key = _cache_key(query, messages)
+            results[i] = self._resolve_locally(key, query, messages)
+            if results[i] is None:
+                pending.append((i, key, query, messages))
+        
+        # KNN en una sola llamada de embeddings para las que no tienen historial
+        standalone = [item for item in pending if not item[3]]
+        if standalone:
+            for (i, key, query, messages), result in zip(
+                standalone, self._knn_classify([item[2] for item in standalone])
+            ):
+                if result is not None:
+                    self._remember(key, query, messages, result)
+                    results[i] = result
+            pending = [item for item in pending if results[item[0]] is None]
+        
+        if pending:
+            batch = self._batch_cascade(
+                [self._chain_input(query, messages) for _, _, query, messages in pending]
+            )
+            for (i, key, query, messages), result in zip(pending, batch):
+                if isinstance(result, BaseException):
+                    logger.warning(f"⚠️ Router V4: no se pudo clasificar '{query[:50]}': {result}")
+                else:
+                    self._remember(key, query, messages, result)
+                results[i] = result
+        
+        return results
+    
+    def _resolve_locally(
+        self,
+        key: str,
+        query: str,
+        messages: Optional[List[BaseMessage]]
+    ) -> Optional[RouteQueryV4Fast]:
+        """Caché exacta → reglas locales → caché semántica (sin llamar a Gemini)"""
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        
+        fast = self._try_fast(query, messages)
+        if fast is not None:
+            return fast
         
-        # Log visual
+        return self._semantic_lookup(query, messages)
+    
+    def _chain_input(self, query: str, messages: Optional[List[BaseMessage]]) -> dict:
+        return {
+            "query": query,
+            "conversation_context": self._prepare_context(messages)
+        }
+    
+    def _remember(
+        self,
+        key: str,
+        query: str,
+        messages: Optional[List[BaseMessage]],
+        result: RouteQueryV4Fast
+    ) -> None:
+        """Guarda la decisión de Gemini en las cachés y la muestra"""
+        self._cache.set(key, result)
+        self._semantic_store(query, messages, result)
         self._print_decision(query, result, has_context=bool(messages))
+    
+    # ---------- KNN ----------
+    
+    def _example_index(self) -> List[Tuple[Tuple[float, ...], str, str]]:
+        if self._examples is None:
+            with self._examples_lock:
+                if self._examples is None:
+                    vectors = self.embeddings.embed_documents([text for text, _, _ in EXAMPLES])
+                    self._examples = [
+                        (_unit(vector), category, intent)
+                        for vector, (_, category, intent) in zip(vectors, EXAMPLES)
+                    ]
+        return self._examples
+    
+    def _knn_available(self) -> bool:
+        return time.monotonic() >= self._knn_stats["retry_after"]
+    
+    def _knn_pause(self, reason: str) -> None:
+        """Deja de consultar el KNN durante KNN_RETRY_AFTER segundos"""
+        with self._knn_lock:
+            self._knn_stats.update(hits=0, total=0, retry_after=time.monotonic() + KNN_RETRY_AFTER)
+        logger.warning(f"⚠️ Router V4: KNN en pausa {KNN_RETRY_AFTER}s ({reason}), se usa el LLM")
+    
+    def _knn_record(self, results: List[Optional[RouteQueryV4Fast]]) -> None:
+        """Cuenta aciertos; con una tasa baja en la ventana el KNN se pausa"""
+        with self._knn_lock:
+            stats = self._knn_stats
+            stats["hits"] += sum(result is not None for result in results)
+            stats["total"] += len(results)
+            if stats["total"] < KNN_WINDOW:
+                return
+            hit_rate = stats["hits"] / stats["total"]
+            stats.update(hits=0, total=0)
+        if hit_rate < KNN_MIN_HIT_RATE:
+            self._knn_pause(f"tasa de acierto {hit_rate:.0%}")
+    
+    def _knn_classify(self, queries: List[str]) -> List[Optional[RouteQueryV4Fast]]:
+        """Decisión KNN por query (None si no hay vecino claro, falla el embedding o está en pausa)"""
+        if not self._knn_available():
+            return [None] * len(queries)
+        try:
+            index = self._example_index()
+            vectors = self.embeddings.embed_documents(queries)
+        except Exception as e:
+            self._knn_pause(str(e))
+            return [None] * len(queries)
+        results = [_knn_vote(vector, index) for vector in vectors]
+        self._knn_record(results)
+        return results
+    
+    async def _aknn_classify(self, queries: List[str]) -> List[Optional[RouteQueryV4Fast]]:
+        if not self._knn_available():
+            return [None] * len(queries)
+        try:
+            index = self._examples or await asyncio.to_thread(self._example_index)
+            vectors = await self.embeddings.aembed_documents(queries)
+        except Exception as e:
+            self._knn_pause(str(e))
+            return [None] * len(queries)
+        results = [_knn_vote(vector, index) for vector in vectors]
+        self._knn_record(results)
+        return results
+    
+    # ---------- Cascada ligero → completo ----------
+    
+    @staticmethod
+    def _needs_escalation(result) -> bool:
+        return isinstance(result, BaseException) or result is None or result.confidence < ESCALATE_BELOW
+    
+    def _invoke_cascade(self, chain_input: dict) -> RouteQueryV4Fast:
+        try:
+            result = self.cheap_chain.invoke(chain_input)
+        except Exception as e:
+            result = e
+        if self._needs_escalation(result):
+            result = self.chain.invoke(chain_input)
+        return _as_fast(result)
+    
+    def _batch_cascade(self, inputs: List[dict]) -> list:
+        """Cascada en lote; los errores vuelven en la lista (un fallo no tumba el lote)"""
+        config = {"max_concurrency": BATCH_MAX_CONCURRENCY}
+        results = self.cheap_chain.batch(inputs, config=config, return_exceptions=True)
+        
+        escalate = [i for i, result in enumerate(results) if self._needs_escalation(result)]
+        if escalate:
+            full = self.chain.batch(
+                [inputs[i] for i in escalate], config=config, return_exceptions=True
+            )
+            for i, result in zip(escalate, full):
+                results[i] = result
+        return [_as_fast(result) for result in results]
+    
+    async def _abatch_cascade(self, inputs: List[dict]) -> list:
+        """Como _batch_cascade pero async; los errores vuelven en la lista (un fallo no tumba el lote)"""
+        config = {"max_concurrency": BATCH_MAX_CONCURRENCY}
+        results = await self.cheap_chain.abatch(inputs, config=config, return_exceptions=True)
         
+        escalate = [i for i, result in enumerate(results) if self._needs_escalation(result)]
+        if escalate:
+            full = await self.chain.abatch(
+                [inputs[i] for i in escalate], config=config, return_exceptions=True
+            )
+            for i, result in zip(escalate, full):
+                results[i] = result
+        return [_as_fast(result) for result in results]
+    
+    # ---------- Micro-batching ----------
+    
+    async def _enqueue(self, chain_input: dict) -> RouteQueryV4Fast:
+        """Encola la petición en el lote del event loop actual y espera su resultado"""
+        loop = asyncio.get_running_loop()
+        queue = self._batch_queues.get(loop)
+        if queue is None:
+            queue = self._batch_queues[loop] = asyncio.Queue()
+            loop.create_task(self._batch_worker(queue))
+        
+        future = loop.create_future()
+        await queue.put((chain_input, future))
+        return await future
+    
+    async def _batch_worker(self, queue: "asyncio.Queue") -> None:
+        """Junta lo que llegue durante BATCH_WINDOW tras la primera petición y lo envía en un abatch"""
+        while True:
+            items = [await queue.get()]
+            await asyncio.sleep(BATCH_WINDOW)
+            while not queue.empty() and len(items) < BATCH_MAX_SIZE:
+                items.append(queue.get_nowait())
+            
+            inputs = [chain_input for chain_input, _ in items]
+            try:
+                results = await self._abatch_cascade(inputs)
+            except Exception as e:
+                results = [e] * len(items)
+            
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+    
+    def _cached(self, key: str) -> Optional[RouteQueryV4Fast]:
+        """Decisión cacheada (inmutable: se comparte sin copiar)"""
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        logger.debug(f"⚡ Router V4: decisión desde caché ({cached.category})")
+        return cached
+    
+    def cache_clear(self) -> None:
+        """Vacía las cachés de decisiones (exacta y semántica)"""
+        self._cache.clear()
+        with self._semantic_lock:
+            self._semantic.clear()
+    
+    def _semantic_lookup(self, query: str, messages: Optional[List[BaseMessage]]) -> Optional[RouteQueryV4Fast]:
+        """Decisión de una consulta casi idéntica ya clasificada (solo sin historial)"""
+        if messages:
+            return None
+        
+        tokens = query_tokens(query)
+        if not tokens:
+            return None
+        
+        best_score, best_result = 0.0, None
+        with self._semantic_lock:
+            for cached_tokens, result in self._semantic:
+                score = jaccard_similarity(tokens, cached_tokens)
+                if score > best_score:
+                    best_score, best_result = score, result
+        
+        if best_score < SEMANTIC_THRESHOLD:
+            return None
+        
+        logger.debug(f"⚡ Router V4: decisión desde caché semántica ({best_result.category}, {best_score:.2f})")
+        return best_result
+    
+    def _semantic_store(self, query: str, messages: Optional[List[BaseMessage]], result: RouteQueryV4Fast) -> None:
+        if messages or result.category not in SEMANTIC_CATEGORIES:
+            return
+        tokens = query_tokens(query)
+        if tokens:
+            with self._semantic_lock:
+                self._semantic.append((tokens, result))
+    
+    def _try_fast(self, query: str, messages: Optional[List[BaseMessage]]) -> Optional[RouteQueryV4Fast]:
+        """Atajo local (sin Gemini) si no hay historial y la regla es clara"""
+        if messages:
+            return None
+        
+        result = _fast_classify(query)
+        if result is None or result.confidence < FAST_CONFIDENCE:
+            return None
+        
+        self._print_decision(query, result)
         return result
     
     def _prepare_context(self, messages: Optional[List[BaseMessage]]) -> str:
-        """Prepara el contexto conversacional para el prompt"""
-        if not messages or len(messages) == 0:
-            return "Sin historial previo (primera consulta del thread)"
-        
-        # Tomar últimos 6 mensajes para no saturar
-        recent_messages = messages[-6:] if len(messages) > 6 else messages
-        
-        context_lines = []
-        for msg in recent_messages:
-            if isinstance(msg, HumanMessage):
-                # Truncar mensajes muy largos
-                content = msg.content[:200] if len(msg.content) > 200 else msg.content
-                context_lines.append(f"👤 Usuario: {content}")
-            elif isinstance(msg, AIMessage):
-                # Solo primeros 150 chars para no saturar
-                content = msg.content[:150] + "..." if len(msg.content) > 150 else msg.content
-                context_lines.append(f"🤖 Asistente: {content}")
-        
-        if not context_lines:
-            return "Sin historial previo (primera consulta del thread)"
-        
-        return "\n".join(context_lines)
-    
-    def _print_decision(self, query: str, result: RouteQueryV4, has_context: bool = False):
-        """Imprime la decisión con formato visual"""
-        emoji_map = {
-            "simple": "⚡",
-            "agentic": "🤖",
-            "multi_agent": "🔀"
-        }
+        """
+        Prepara el contexto conversacional para el prompt.
+        
+        Memoizado por (id, len) del historial: el mismo estado de LangGraph se
+        clasifica varias veces por turno. Se guarda también el último mensaje
+        para detectar la reutilización de un id por otra lista.
+        """
+        if not messages:
+            return NO_CONTEXT
         
-        emoji = emoji_map.get(result.category, "❓")
-        context_indicator = "🔄" if has_context else ""
+        memo_key = (id(messages), len(messages))
+        memo = self._ctx_cache.get(memo_key)
+        if memo is not None and memo[0] is messages[-1]:
+            return memo[1]
         
-        print(f"\n{'='*60}")
-        print(f"🔀 ROUTER V4 DECISION {context_indicator}")
-        print(f"{'='*60}")
-        print(f"   Query: '{query}'")
-        print(f"   {emoji} Category: {result.category.upper()}")
-        print(f"   📊 Confidence: {result.confidence:.2f}")
-        print(f"   💡 Reasoning: {result.reasoning}")
+        # Tomar últimos mensajes para no saturar (truncando los muy largos)
+        context_lines = [
+            f"👤 Usuario: {msg.content[:200]}" if isinstance(msg, HumanMessage)
+            else f"🤖 Asistente: {msg.content[:150]}{'...' if len(msg.content) > 150 else ''}"
+            for msg in messages[-CONTEXT_MESSAGES:]
+            if isinstance(msg, (HumanMessage, AIMessage))
+        ]
         
-        if result.detected_intent:
-            intent_emoji = "🔄" if result.detected_intent == "continuation" else "🎯"
-            print(f"   {intent_emoji} Intent: {result.detected_intent}")
+        context = "\n".join(context_lines) if context_lines else NO_CONTEXT
+        self._ctx_cache.set(memo_key, (messages[-1], context))
+        return context
+    
+    def _print_decision(self, query: str, result: RouteQueryV4Fast, has_context: bool = False):
+        """Registra la decisión (DEBUG); con el nivel de producción no cuesta nada"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         
-        print(f"{'='*60}\n")
+        logger.debug(
+            _DECISION_TEMPLATE,
+            _CAT_EMOJI[_CAT_IDX.get(result.category, -1)],
+            result.category.upper(),
+            result.confidence,
+            ", con contexto" if has_context else "",
+            result.detected_intent,
+            query,
+            result.reasoning,
+            extra={
+                "query": query,
+                "category": result.category,
+                "confidence": result.confidence,
+                "intent": result.detected_intent,
+            }
+        )
 
 
 # ========== EXPORTAR ==========
 
-router_v4 = QueryRouterV4()
\ No newline at end of file
+# Único módulo del Router V4 (versión con contexto conversacional)
+__all__ = [
+    "RouteQueryV4",
+    "RouteQueryV4Fast",
+    "QueryRouterV4",
+    "get_router_v4",
+    "router_v4",
+]
+
+_router: Optional[QueryRouterV4] = None
+_router_lock = threading.Lock()
+
+
+def get_router_v4() -> QueryRouterV4:
+    """Devuelve la instancia compartida, creándola la primera vez"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = QueryRouterV4()
+    return _router
+
+
+def __getattr__(name: str):
+    # PEP 562: `from ...router_v4 import router_v4` sigue funcionando
+    if name == "router_v4":
+        return get_router_v4()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ========== TESTING ==========
+
+if __name__ == "__main__":
+    import sys
+    
+    # --cached: solo reglas locales, sin llamar a Gemini (regresión instantánea)
+    cached_only = "--cached" in sys.argv
+    print(f"\n🧪 Testing Router V4{' (solo reglas locales)' if cached_only else ''}...\n")
+    
+    test_cases = [
+        # Simple
+        ("lista todas las campañas", "simple", None),
+        ("¿cuántas campañas activas tengo?", "simple", None),
+        
+        # Agentic
+        ("¿qué presupuesto tiene Baqueira?", "agentic", None),
+        ("gasto de Ibiza esta semana", "agentic", None),
+        ("TOP 3 de anuncios de Costa Blanca", "agentic", None),
+        ("¿cómo mejorar el CPA de Ibiza?", "agentic", None),
+        ("¿qué anuncio ha empeorado?", "agentic", None),
+        ("baqueira", "agentic", [HumanMessage(content="dame el gasto"), AIMessage(content="¿De qué campaña?")]),
+        
+        # Multi-agent
+        ("analiza la campaña de Baqueira", "multi_agent", None),
+        ("¿cómo está Costa del Sol?", "multi_agent", None),
+        ("dame un reporte completo de Ibiza", "multi_agent", None),
+    ]
+    
+    async def main():
+        if cached_only:
+            return [None if messages else _fast_classify(query) for query, _, messages in test_cases]
+        # Todas a la vez: el micro-batching las agrupa en pocas llamadas
+        router = get_router_v4()
+        return await asyncio.gather(*(
+            router.aclassify(query, messages) for query, _, messages in test_cases
+        ))
+    
+    results = asyncio.run(main())
+    
+    correct = skipped = 0
+    total = len(test_cases)
+    
+    print("\n📋 RESULTADOS:\n")
+    
+    for (query, expected, _), result in zip(test_cases, results):
+        if result is None:
+            skipped += 1
+            print(f"⏭️ Query: '{query[:50]}' (sin decisión local)\n")
+            continue
+        
+        is_correct = result.category == expected
+        status = "✅" if is_correct else "❌"
+        print(f"{status} Query: '{query[:50]}'")
+        print(f"   Expected: {expected}, Got: {result.category} ({result.confidence:.2f})")
+        
+        if is_correct:
+            correct += 1
+        else:
+            print(f"   ⚠️ Reasoning: {result.reasoning}")
+        
+        print()
+    
+    evaluated = total - skipped
+    print("="*60)
+    print(f"📊 Accuracy: {correct}/{evaluated} ({correct/max(evaluated, 1)*100:.1f}%)"
+          + (f" | {skipped} sin decisión local" if skipped else ""))
+    print("="*60)
+    
+    if correct == evaluated:
+        print("\n🎉 ¡TODOS LOS TESTS PASARON!")
+    else:
+        print(f"\n⚠️ {evaluated - correct} tests fallaron.")
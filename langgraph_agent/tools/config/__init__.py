@@ -1,27 +1,12 @@
 """
 Config Tools Package
 Exports para herramientas de configuración
+
+Los símbolos se cargan bajo demanda (PEP 562): importar el paquete no
+arrastra config_tools (SDK de Meta, schemas) hasta que se usa alguno.
 """
 
-from .config_tools import (
-    # Schemas
-    ListarCampanasInput,
-    ListarCampanasOutput,
-    BuscarCampanaPorNombreInput,
-    BuscarCampanaPorNombreOutput,
-    ObtenerDetallesCampanaInput,
-    ObtenerDetallesCampanaOutput,
-    ObtenerPresupuestoInput,
-    ObtenerPresupuestoOutput,
-    ObtenerEstrategiaPujaInput,
-    ObtenerEstrategiaPujaOutput,
-    # Functions
-    listar_campanas_func,
-    buscar_campana_por_nombre_func,
-    obtener_detalles_campana_func,
-    obtener_presupuesto_func,
-    obtener_estrategia_puja_func,
-)
+import importlib
 
 __all__ = [
     # Schemas
@@ -41,4 +26,18 @@ __all__ = [
     "obtener_detalles_campana_func",
     "obtener_presupuesto_func",
     "obtener_estrategia_puja_func",
-]
\ No newline at end of file
+    "obtener_presupuesto_func_async",
+    "obtener_estrategia_puja_func_async",
+]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        value = getattr(importlib.import_module(".config_tools", __name__), name)
+        globals()[name] = value  # siguientes accesos sin pasar por aquí
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
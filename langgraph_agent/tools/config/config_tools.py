@@ -3,74 +3,353 @@ Herramientas de Configuración de Campañas
 Responsabilidad: Información técnica, presupuestos, estrategias
 """
 
+import asyncio
+import bisect
 import json
 import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType, SimpleNamespace
+from typing import Iterator, Optional
+
+import httpx
+from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.campaign import Campaign
-from facebook_business.adobjects.adset import AdSet
-
-from ...models.schemas import BaseModel, Field
+from facebook_business.exceptions import FacebookRequestError
+
+# Schemas centralizados: *Input en Pydantic (schema de la herramienta), *Output dataclasses con slots
+from ...models.schemas import (
+    ListarCampanasInput,
+    ListarCampanasOutput,
+    BuscarCampanaPorNombreInput,
+    BuscarCampanaPorNombreOutput,
+    ObtenerDetallesCampanaInput,
+    ObtenerDetallesCampanaOutput,
+    ObtenerPresupuestoInput,
+    ObtenerPresupuestoOutput,
+    ObtenerEstrategiaPujaInput,
+    ObtenerEstrategiaPujaOutput,
+)
+from ...utils.cache import TTLCache
+from ...utils.helpers import dumps_json
 from ...utils.meta_api import get_account
-from ...config.settings import settings
+from ...config.settings import settings, destinos_en_texto, normalizar_destino
 
 logger = logging.getLogger(__name__)
 
 
-# ========== SCHEMAS ==========
+# ========== CAMPOS ==========
 
-class ListarCampanasInput(BaseModel):
-    """Lista todas las campañas"""
-    estado: str = Field(
-        default="ACTIVE,PAUSED",
-        description="Estados a filtrar: ACTIVE, PAUSED, ARCHIVED"
-    )
-    limite: int = Field(default=50, description="Máximo de campañas a listar")
+# Nombres de campo de la Graph API como str planos (lo mismo que valen
+# Campaign.Field.* / AdSet.Field.*, sin recorrer las clases del SDK en cada acceso)
+C = SimpleNamespace(
+    id="id",
+    name="name",
+    status="status",
+    objective="objective",
+    daily_budget="daily_budget",
+    lifetime_budget="lifetime_budget",
+    budget_remaining="budget_remaining",
+    bid_strategy="bid_strategy",
+)
+
+AS = SimpleNamespace(
+    id="id",
+    name="name",
+    status="status",
+    daily_budget="daily_budget",
+    optimization_goal="optimization_goal",
+    bid_strategy="bid_strategy",
+    targeting="targeting",
+)
+
+# Código de puja -> texto legible, congelado al importar (un LOAD_GLOBAL por consulta)
+_BID_MAP = MappingProxyType(dict(settings.BID_STRATEGY_MAP))
+
+
+# ========== ÍNDICE DE NOMBRES ==========
+
+# Las campañas cambian poco: su lista se pide a Meta como mucho cada 10 minutos
+NAME_INDEX_TTL = 600
+_NAME_INDEX = TTLCache(maxsize=1, ttl=NAME_INDEX_TTL)
+
+
+class _CampaignNameIndex:
+    """
+    Nombres de campaña en minúsculas concatenados en un único texto.
+    
+    La búsqueda por subcadena es un solo str.find (en C) sobre todos los
+    nombres y bisect traduce la posición a la campaña; gana la primera
+    campaña en el orden de Meta, igual que el recorrido lineal.
+    
+    Example:
+        >>> index = _CampaignNameIndex([("1", "Baqueira Invierno"), ("2", "Ibiza Verano")])
+        >>> index.find("ibiza")
+        ('2', 'Ibiza Verano')
+    """
+    
+    __slots__ = ("campaigns", "_haystack", "_starts", "_by_destino")
+    
+    def __init__(self, campaigns: list):
+        self.campaigns = campaigns  # [(id, nombre)] en el orden de Meta
+        self._starts = []
+        self._by_destino = {}  # destino canónico -> primera campaña que lo menciona
+        
+        lowered = []
+        position = 0
+        for campaign in campaigns:
+            name = campaign[1].lower()
+            self._starts.append(position)
+            lowered.append(name)
+            position += len(name) + 1
+            
+            # Una pasada de DESTINO_PATTERN por nombre, al construir el índice
+            for destino in destinos_en_texto(name):
+                self._by_destino.setdefault(destino, campaign)
+        
+        # \x00 como separador: ningún patrón puede cruzar de un nombre a otro
+        self._haystack = "\x00".join(lowered)
+    
+    def find(self, patron: str) -> Optional[tuple]:
+        """(id, nombre) de la primera campaña cuyo nombre contiene patron"""
+        if not self.campaigns or "\x00" in patron:
+            return None
+        position = self._haystack.find(patron)
+        if position < 0:
+            return None
+        return self.campaigns[bisect.bisect_right(self._starts, position) - 1]
+    
+    def find_destino(self, destino: str) -> Optional[tuple]:
+        """(id, nombre) de la primera campaña que menciona el destino canónico"""
+        return self._by_destino.get(destino)
+
+
+def _get_name_index() -> _CampaignNameIndex:
+    """Índice de campañas ACTIVE/PAUSED, reconstruido al expirar el TTL"""
+    index = _NAME_INDEX.get("campaigns")
+    if index is None:
+        F_ID, F_NAME = C.id, C.name
+        campaigns = get_account().get_campaigns(
+            fields=[F_NAME, F_ID],
+            params={'effective_status': ['ACTIVE', 'PAUSED'], 'limit': 100}
+        )
+        # Iterar el Cursor sigue paging.next: no se queda en las primeras 100
+        index = _CampaignNameIndex([
+            (camp.get(F_ID), camp.get(F_NAME, ""))
+            for camp in campaigns
+        ])
+        _NAME_INDEX.set("campaigns", index)
+    return index
 
 
-class ListarCampanasOutput(BaseModel):
-    """Salida con lista de campañas"""
-    campanas_json: str
+# ========== CACHÉ DE LECTURAS ==========
 
+# El agente repite a menudo las mismas lecturas en una conversación: se sirven
+# desde memoria durante API_CACHE_TTL (y se ahorra cuota de la Graph API)
+API_CACHE_TTL = 300
+_API_CACHE = TTLCache(maxsize=512, ttl=API_CACHE_TTL)
 
-class BuscarCampanaPorNombreInput(BaseModel):
-    """Busca campaña por nombre o parte del nombre"""
-    nombre_campana: str = Field(description="Nombre o parte del nombre de la campaña")
 
+def _cached_api_get(campana_id: str, fields: list):
+    """Campaign(campana_id).api_get(fields) cacheado por (campaña, campos)"""
+    key = ("campaign", campana_id, frozenset(fields))
+    data = _API_CACHE.get(key)
+    if data is None:
+        data = Campaign(campana_id).api_get(fields=fields)
+        _API_CACHE.set(key, data)
+    return data
 
-class BuscarCampanaPorNombreOutput(BaseModel):
-    """Salida con ID y nombre de campaña encontrada"""
-    id_campana: str
-    nombre_encontrado: str
+
+def invalidar_cache_campana(campana_id: str) -> None:
+    """
+    Descarta todo lo cacheado sobre una campaña (sus lecturas, los listados
+    y el índice de nombres). Cualquier herramienta que modifique una campaña
+    debe llamarla.
+    """
+    _API_CACHE.discard_if(
+        lambda key: key[0] == "listar" or (key[0] == "campaign" and key[1] == campana_id)
+    )
+    _NAME_INDEX.clear()
 
 
-class ObtenerDetallesCampanaInput(BaseModel):
-    """Obtiene detalles técnicos completos de una campaña"""
-    campana_id: str = Field(description="ID de la campaña")
-    incluir_adsets: bool = Field(default=True, description="Incluir detalles de adsets")
+# ========== BATCH API ==========
 
+# Máximo de peticiones por llamada a la Batch API de Meta
+BATCH_SIZE = 50
 
-class ObtenerDetallesCampanaOutput(BaseModel):
-    """Salida con configuración completa"""
-    datos_json: str
+# Los lotes son independientes y limitados por red: varios en paralelo
+_BATCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="meta_batch")
 
 
-class ObtenerPresupuestoInput(BaseModel):
-    """Obtiene información de presupuesto de una campaña"""
-    campana_id: str = Field(description="ID de la campaña")
+# Adsets por página; si una campaña tiene más, se pagina con el Cursor del SDK
+ADSETS_PAGE_LIMIT = 200
+ADSETS_PARAMS = {'effective_status': ['ACTIVE', 'PAUSED'], 'limit': ADSETS_PAGE_LIMIT}
+
+
+# Códigos de Meta por límite de tasa: se reintentan solo esas peticiones del lote
+THROTTLE_CODES = frozenset({4, 17, 32, 613})
+BATCH_RETRIES = 3
+BATCH_BACKOFF = 1.0
+BATCH_BACKOFF_MAX = 30.0
+
+
+def _lote_adsets(campaign_ids: list, nombres: dict) -> list:
+    """
+    Ejecuta un lote de la Batch API y vuelca en nombres los resultados.
+    
+    Returns:
+        IDs de campaña cuya petición falló por límite de tasa
+    """
+    batch = FacebookAdsApi.get_default_api().new_batch()
+    throttled = []
+    incompletas = []
+    A_NAME = AS.name
+    
+    def on_success(campaign_id):
+        def callback(response):
+            body = response.json()
+            data = body.get("data", [])
+            if (body.get("paging") or {}).get("next") or len(data) >= ADSETS_PAGE_LIMIT:
+                incompletas.append(campaign_id)
+                return
+            nombres[campaign_id] = "\x00".join(adset.get(A_NAME, "") for adset in data).lower()
+        return callback
+    
+    def on_failure(campaign_id):
+        def callback(response):
+            error = response.error()
+            if isinstance(error, FacebookRequestError) and error.api_error_code() in THROTTLE_CODES:
+                throttled.append(campaign_id)
+                return
+            logger.warning(f"⚠️ No se pudieron leer los adsets de {campaign_id}: {error}")
+        return callback
+    
+    for campaign_id in campaign_ids:
+        Campaign(campaign_id).get_ad_sets(
+            fields=[AS.name],
+            params=ADSETS_PARAMS,
+            batch=batch,
+            success=on_success(campaign_id),
+            failure=on_failure(campaign_id)
+        )
+    batch.execute()
+    
+    # Campañas con más de una página de adsets: el Cursor del SDK pagina solo
+    for campaign_id in incompletas:
+        nombres[campaign_id] = "\x00".join(
+            adset.get(A_NAME, "")
+            for adset in Campaign(campaign_id).get_ad_sets(fields=[A_NAME], params=ADSETS_PARAMS)
+        ).lower()
+    
+    return throttled
+
 
+def _nombres_adsets_lote(campaign_ids: list) -> dict:
+    """
+    Nombres de los adsets (ACTIVE/PAUSED) de hasta BATCH_SIZE campañas en
+    una sola petición HTTP. Las peticiones limitadas por tasa se reintentan
+    con backoff exponencial; las que fallan por otro motivo quedan fuera.
+    
+    Los nombres de cada campaña se devuelven ya en minúsculas y unidos por
+    \x00 en un único texto: la búsqueda es un solo str.find por campaña.
+    
+    Returns:
+        {campaign_id: "adset a\x00adset b..."}
+    """
+    nombres = {}
+    pendientes = campaign_ids
+    
+    for intento in range(BATCH_RETRIES):
+        pendientes = _lote_adsets(pendientes, nombres)
+        if not pendientes:
+            break
+        if intento == BATCH_RETRIES - 1:
+            logger.warning(f"⚠️ {len(pendientes)} campañas sin adsets: límite de tasa de Meta")
+            break
+        espera = min(BATCH_BACKOFF * 2 ** intento, BATCH_BACKOFF_MAX)
+        logger.info(f"⏳ Límite de tasa en {len(pendientes)} peticiones, reintento en {espera:.0f}s")
+        time.sleep(espera)
+    
+    return nombres
 
-class ObtenerPresupuestoOutput(BaseModel):
-    """Salida con presupuestos"""
-    datos_json: str
 
+def _iter_adsets_por_campana(campaign_ids: list) -> Iterator[tuple]:
+    """
+    (campaign_id, nombres de adsets en minúsculas unidos por \x00) en el
+    orden de campaign_ids.
+    
+    Todos los lotes salen a la vez en _BATCH_POOL; se consumen en orden, así
+    que quien encuentre pronto lo que busca no espera al resto, y al cerrar
+    el generador se cancelan los lotes que aún no han empezado.
+    """
+    futures = [
+        _BATCH_POOL.submit(_nombres_adsets_lote, campaign_ids[start:start + BATCH_SIZE])
+        for start in range(0, len(campaign_ids), BATCH_SIZE)
+    ]
+    try:
+        for start, future in zip(range(0, len(campaign_ids), BATCH_SIZE), futures):
+            try:
+                nombres = future.result()
+            except Exception as e:
+                logger.warning(f"⚠️ Lote de adsets fallido: {e}")
+                continue
+            for campaign_id in campaign_ids[start:start + BATCH_SIZE]:
+                yield campaign_id, nombres.get(campaign_id, "")
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# Solo las claves de targeting que se leen (el blob completo suele pesar varios KB por adset)
+TARGETING_FIELDS = (
+    "targeting{age_min,age_max,genders,geo_locations{countries},advantage_custom_audience}"
+)
+
+# Campos de adset que lee obtener_detalles_campana
+ADSETS_FIELDS = [
+    AS.name,
+    AS.id,
+    AS.status,
+    AS.daily_budget,
+    AS.optimization_goal,
+    AS.bid_strategy,
+    TARGETING_FIELDS,
+]
+
+# Adsets ACTIVE/PAUSED expandidos dentro de la lectura de la campaña
+ADSETS_EXPANSION = (
+    f'adsets.effective_status(["ACTIVE","PAUSED"]).limit({ADSETS_PAGE_LIMIT}){{'
+    + ",".join(ADSETS_FIELDS)
+    + "}"
+)
+
+
+def _adsets_completos(campana_id: str, expansion: Optional[dict]) -> list:
+    """
+    Adsets de la expansión de campo. La expansión solo trae la primera página:
+    si viene llena o con paging.next, se leen todos con el Cursor del SDK.
+    """
+    expansion = expansion or {}
+    data = expansion.get("data", [])
+    if not (expansion.get("paging") or {}).get("next") and len(data) < ADSETS_PAGE_LIMIT:
+        return data
+    
+    logger.info(f"📄 Campaña {campana_id} con más de {ADSETS_PAGE_LIMIT} adsets: paginando")
+    return [
+        adset.export_all_data()
+        for adset in Campaign(campana_id).get_ad_sets(fields=ADSETS_FIELDS, params=ADSETS_PARAMS)
+    ]
 
-class ObtenerEstrategiaPujaInput(BaseModel):
-    """Obtiene estrategia de puja de una campaña"""
-    campana_id: str = Field(description="ID de la campaña")
 
+# ========== CONVERSIONES ==========
 
-class ObtenerEstrategiaPujaOutput(BaseModel):
-    """Salida con estrategia de puja"""
-    datos_json: str
+def _cents_to_eur(value) -> Optional[float]:
+    """Céntimos de Meta (str/int) a euros con 2 decimales; None si no hay presupuesto"""
+    if value in (None, ""):
+        return None
+    euros, cents = divmod(int(value), 100)
+    return euros + cents / 100
 
 
 # ========== FUNCIONES ==========
@@ -82,6 +361,11 @@ def listar_campanas_func(input: ListarCampanasInput) -> ListarCampanasOutput:
     Returns:
         Lista de campañas con ID, nombre y estado
     """
+    cache_key = ("listar", input.estado, input.limite)
+    cached = _API_CACHE.get(cache_key)
+    if cached is not None:
+        return ListarCampanasOutput(campanas_json=cached)
+    
     try:
         account = get_account()
         
@@ -90,10 +374,10 @@ def listar_campanas_func(input: ListarCampanasInput) -> ListarCampanasOutput:
         
         campanas = account.get_campaigns(
             fields=[
-                Campaign.Field.id,
-                Campaign.Field.name,
-                Campaign.Field.status,
-                Campaign.Field.objective,
+                C.id,
+                C.name,
+                C.status,
+                C.objective,
             ],
             params={
                 'effective_status': estados,
@@ -101,21 +385,28 @@ def listar_campanas_func(input: ListarCampanasInput) -> ListarCampanasOutput:
             }
         )
         
-        campanas_data = []
-        for c in campanas:
-            campanas_data.append({
-                "id": c.get(Campaign.Field.id),
-                "nombre": c.get(Campaign.Field.name),
-                "estado": c.get(Campaign.Field.status),
-                "objetivo": c.get(Campaign.Field.objective, 'N/A')
-            })
+        # Nombres de campo en locales: sin resolver atributos en cada iteración
+        F_ID, F_NAME, F_STATUS, F_OBJ = (
+            C.id, C.name, C.status, C.objective
+        )
+        campanas_data = [
+            {
+                "id": c.get(F_ID),
+                "nombre": c.get(F_NAME),
+                "estado": c.get(F_STATUS),
+                "objetivo": c.get(F_OBJ, 'N/A')
+            }
+            for c in campanas
+        ]
         
         logger.info(f"✅ {len(campanas_data)} campañas listadas")
-        return ListarCampanasOutput(campanas_json=json.dumps(campanas_data, ensure_ascii=False))
+        campanas_json = dumps_json(campanas_data)
+        _API_CACHE.set(cache_key, campanas_json)
+        return ListarCampanasOutput(campanas_json=campanas_json)
     
     except Exception as e:
         logger.error(f"❌ Error listando campañas: {e}")
-        return ListarCampanasOutput(campanas_json=json.dumps({"error": str(e)}))
+        return ListarCampanasOutput(campanas_json=dumps_json({"error": str(e)}))
 
 
 def buscar_campana_por_nombre_func(input: BuscarCampanaPorNombreInput) -> BuscarCampanaPorNombreOutput:
@@ -129,44 +420,48 @@ def buscar_campana_por_nombre_func(input: BuscarCampanaPorNombreInput) -> Buscar
     nombre_buscado = input.nombre_campana.lower()
     
     # Aplicar mapeo de destinos
-    nombre_normalizado = settings.DESTINO_MAPPING.get(nombre_buscado, nombre_buscado)
+    nombre_normalizado = normalizar_destino(nombre_buscado)
     
     try:
-        account = get_account()
-        campaigns = account.get_campaigns(
-            fields=[Campaign.Field.name, Campaign.Field.id],
-            params={'effective_status': ['ACTIVE', 'PAUSED'], 'limit': 100}
-        )
+        index = _get_name_index()
+        
+        # 1) Nombres de campaña con el texto tal cual (o su alias exacto de destino)
+        encontrada = index.find(nombre_buscado) or index.find(nombre_normalizado)
+        if encontrada:
+            camp_id, camp_name = encontrada
+            logger.info(f"✅ Campaña encontrada: {camp_name}")
+            return BuscarCampanaPorNombreOutput(
+                id_campana=camp_id,
+                nombre_encontrado=camp_name
+            )
         
-        # Buscar en nombres de campaña
-        for camp in campaigns:
-            camp_name = camp.get(Campaign.Field.name, "").lower()
-            if nombre_normalizado in camp_name or nombre_buscado in camp_name:
-                logger.info(f"✅ Campaña encontrada: {camp.get(Campaign.Field.name)}")
-                return BuscarCampanaPorNombreOutput(
-                    id_campana=camp.get(Campaign.Field.id),
-                    nombre_encontrado=camp.get(Campaign.Field.name)
-                )
+        # 2) Nombres de adsets con el texto tal cual: "Ibiza Lookalike" es un adset
+        # concreto y no debe quedarse con la primera campaña de Ibiza
+        # (lotes de la Batch API en paralelo, recorridos en el orden de las campañas)
+        nombres_campana = dict(index.campaigns)
+        patrones = tuple(dict.fromkeys((nombre_buscado, nombre_normalizado)))
         
-        # Buscar en adsets si no se encuentra en campañas
-        for camp in campaigns:
-            try:
-                campaign_obj = Campaign(camp.get(Campaign.Field.id))
-                adsets = campaign_obj.get_ad_sets(
-                    fields=[AdSet.Field.name, AdSet.Field.id],
-                    params={'effective_status': ['ACTIVE', 'PAUSED']}
-                )
-                
-                for adset in adsets:
-                    adset_name = adset.get(AdSet.Field.name, "").lower()
-                    if nombre_normalizado in adset_name:
-                        logger.info(f"✅ Campaña encontrada vía adset: {camp.get(Campaign.Field.name)}")
-                        return BuscarCampanaPorNombreOutput(
-                            id_campana=camp.get(Campaign.Field.id),
-                            nombre_encontrado=f"{camp.get(Campaign.Field.name)} (via adset: {nombre_buscado})"
-                        )
-            except:
-                continue
+        # Los nombres de adsets llegan ya en minúsculas: nada que bajar en este bucle
+        if not any("\x00" in patron for patron in patrones):
+            for camp_id, adset_names in _iter_adsets_por_campana(list(nombres_campana)):
+                if any(adset_names.find(patron) >= 0 for patron in patrones):
+                    camp_name = nombres_campana[camp_id]
+                    logger.info(f"✅ Campaña encontrada vía adset: {camp_name}")
+                    return BuscarCampanaPorNombreOutput(
+                        id_campana=camp_id,
+                        nombre_encontrado=f"{camp_name} (via adset: {nombre_buscado})"
+                    )
+        
+        # 3) Solo entonces, la primera campaña que menciona el destino canónico
+        # (precalculado en el índice: "costa de la luz" encuentra "Costa Luz Verano")
+        destino = index.find_destino(nombre_normalizado)
+        if destino:
+            camp_id, camp_name = destino
+            logger.info(f"✅ Campaña encontrada por destino: {camp_name}")
+            return BuscarCampanaPorNombreOutput(
+                id_campana=camp_id,
+                nombre_encontrado=camp_name
+            )
         
         logger.warning(f"⚠️ No se encontró campaña con nombre: {nombre_buscado}")
         return BuscarCampanaPorNombreOutput(
@@ -193,66 +488,51 @@ def obtener_detalles_campana_func(input: ObtenerDetallesCampanaInput) -> Obtener
         Configuración completa en JSON
     """
     try:
-        campaign = Campaign(input.campana_id)
+        fields = [
+            C.name,
+            C.status,
+            C.objective,
+            C.daily_budget,
+            C.lifetime_budget,
+            C.budget_remaining,
+            C.bid_strategy,
+        ]
+        if input.incluir_adsets:
+            # Adsets en la misma petición (field expansion): un solo round trip
+            fields.append(ADSETS_EXPANSION)
         
         # Obtener datos de campaña
-        campaign_data = campaign.api_get(
-            fields=[
-                Campaign.Field.name,
-                Campaign.Field.status,
-                Campaign.Field.objective,
-                Campaign.Field.daily_budget,
-                Campaign.Field.lifetime_budget,
-                Campaign.Field.budget_remaining,
-                Campaign.Field.bid_strategy,
-            ]
-        )
-        
-        # Procesar presupuestos (centavos a euros)
-        daily_budget = campaign_data.get(Campaign.Field.daily_budget)
-        lifetime_budget = campaign_data.get(Campaign.Field.lifetime_budget)
-        budget_remaining = campaign_data.get(Campaign.Field.budget_remaining)
-        
-        daily_budget_eur = float(daily_budget) / 100 if daily_budget else None
-        lifetime_budget_eur = float(lifetime_budget) / 100 if lifetime_budget else None
-        budget_remaining_eur = float(budget_remaining) / 100 if budget_remaining else None
+        campaign_data = _cached_api_get(input.campana_id, fields)
         
         # Estrategia de puja
-        bid_strategy = campaign_data.get(Campaign.Field.bid_strategy, 'LOWEST_COST_WITHOUT_CAP')
-        bid_strategy_readable = settings.BID_STRATEGY_MAP.get(bid_strategy, bid_strategy)
+        bid_strategy = campaign_data.get(C.bid_strategy, 'LOWEST_COST_WITHOUT_CAP')
+        bid_strategy_readable = _BID_MAP.get(bid_strategy, bid_strategy)
         
         output = {
             "campaign_id": input.campana_id,
-            "nombre": campaign_data.get(Campaign.Field.name, 'Sin nombre'),
-            "estado": campaign_data.get(Campaign.Field.status, 'UNKNOWN'),
-            "objetivo": campaign_data.get(Campaign.Field.objective, 'N/A'),
+            "nombre": campaign_data.get(C.name, 'Sin nombre'),
+            "estado": campaign_data.get(C.status, 'UNKNOWN'),
+            "objetivo": campaign_data.get(C.objective, 'N/A'),
             "estrategia_puja": bid_strategy_readable,
             "estrategia_puja_code": bid_strategy,
             "presupuesto": {
-                "diario_eur": round(daily_budget_eur, 2) if daily_budget_eur else None,
-                "lifetime_eur": round(lifetime_budget_eur, 2) if lifetime_budget_eur else None,
-                "restante_eur": round(budget_remaining_eur, 2) if budget_remaining_eur else None,
+                "diario_eur": _cents_to_eur(campaign_data.get(C.daily_budget)),
+                "lifetime_eur": _cents_to_eur(campaign_data.get(C.lifetime_budget)),
+                "restante_eur": _cents_to_eur(campaign_data.get(C.budget_remaining)),
             },
             "adsets": []
         }
         
-        # Obtener adsets si se solicita
+        # Adsets si se solicitan (vienen expandidos en campaign_data)
         if input.incluir_adsets:
-            adsets = campaign.get_ad_sets(
-                fields=[
-                    AdSet.Field.name,
-                    AdSet.Field.id,
-                    AdSet.Field.status,
-                    AdSet.Field.daily_budget,
-                    AdSet.Field.optimization_goal,
-                    AdSet.Field.bid_strategy,
-                    AdSet.Field.targeting,
-                ],
-                params={'effective_status': ['ACTIVE', 'PAUSED']}
+            adsets = _adsets_completos(input.campana_id, campaign_data.get("adsets"))
+            A_ID, A_NAME, A_STATUS, A_BUDGET, A_GOAL, A_TARGETING = (
+                AS.id, AS.name, AS.status,
+                AS.daily_budget, AS.optimization_goal, AS.targeting
             )
             
             for adset in adsets:
-                targeting = adset.get(AdSet.Field.targeting, {})
+                targeting = adset.get(A_TARGETING, {})
                 
                 # Extraer configuración de targeting
                 age_min = targeting.get('age_min', 'N/A')
@@ -267,15 +547,12 @@ def obtener_detalles_campana_func(input: ObtenerDetallesCampanaInput) -> Obtener
                 advantage_custom_audience = targeting.get('advantage_custom_audience', 'off')
                 advantage_enabled = advantage_custom_audience != 'off'
                 
-                adset_budget = adset.get(AdSet.Field.daily_budget)
-                adset_budget_eur = float(adset_budget) / 100 if adset_budget else None
-                
                 output["adsets"].append({
-                    "adset_id": adset.get(AdSet.Field.id),
-                    "nombre": adset.get(AdSet.Field.name, 'Sin nombre'),
-                    "estado": adset.get(AdSet.Field.status, 'UNKNOWN'),
-                    "presupuesto_diario_eur": round(adset_budget_eur, 2) if adset_budget_eur else None,
-                    "objetivo_optimizacion": adset.get(AdSet.Field.optimization_goal, 'N/A'),
+                    "adset_id": adset.get(A_ID),
+                    "nombre": adset.get(A_NAME, 'Sin nombre'),
+                    "estado": adset.get(A_STATUS, 'UNKNOWN'),
+                    "presupuesto_diario_eur": _cents_to_eur(adset.get(A_BUDGET)),
+                    "objetivo_optimizacion": adset.get(A_GOAL, 'N/A'),
                     "advantage_plus_activado": advantage_enabled,
                     "targeting": {
                         "rango_edad": f"{age_min}-{age_max}",
@@ -285,11 +562,55 @@ def obtener_detalles_campana_func(input: ObtenerDetallesCampanaInput) -> Obtener
                 })
         
         logger.info(f"✅ Detalles de campaña {input.campana_id}: {len(output['adsets'])} adsets")
-        return ObtenerDetallesCampanaOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerDetallesCampanaOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo detalles: {e}")
-        return ObtenerDetallesCampanaOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerDetallesCampanaOutput(datos_json=dumps_json({"error": str(e)}))
+
+
+PRESUPUESTO_FIELDS = [
+    C.name,
+    C.daily_budget,
+    C.lifetime_budget,
+    C.budget_remaining,
+]
+
+ESTRATEGIA_FIELDS = [
+    C.name,
+    C.bid_strategy,
+]
+
+
+def _presupuesto_output(campana_id: str, campaign_data) -> ObtenerPresupuestoOutput:
+    """Formatea la respuesta de presupuesto (común a la versión sync y async)"""
+    # Convertir a EUR
+    output = {
+        "campaign_id": campana_id,
+        "nombre": campaign_data.get(C.name),
+        "presupuesto_diario_eur": _cents_to_eur(campaign_data.get(C.daily_budget)),
+        "presupuesto_lifetime_eur": _cents_to_eur(campaign_data.get(C.lifetime_budget)),
+        "presupuesto_restante_eur": _cents_to_eur(campaign_data.get(C.budget_remaining)),
+    }
+    
+    logger.info(f"✅ Presupuesto de {output['nombre']}: {output['presupuesto_diario_eur']}€/día")
+    return ObtenerPresupuestoOutput(datos_json=dumps_json(output))
+
+
+def _estrategia_output(campana_id: str, campaign_data) -> ObtenerEstrategiaPujaOutput:
+    """Formatea la respuesta de estrategia de puja (común a la versión sync y async)"""
+    bid_strategy = campaign_data.get(C.bid_strategy, 'LOWEST_COST_WITHOUT_CAP')
+    bid_strategy_readable = _BID_MAP.get(bid_strategy, bid_strategy)
+    
+    output = {
+        "campaign_id": campana_id,
+        "nombre": campaign_data.get(C.name),
+        "estrategia_puja": bid_strategy_readable,
+        "estrategia_puja_code": bid_strategy,
+    }
+    
+    logger.info(f"✅ Estrategia de {output['nombre']}: {bid_strategy_readable}")
+    return ObtenerEstrategiaPujaOutput(datos_json=dumps_json(output))
 
 
 def obtener_presupuesto_func(input: ObtenerPresupuestoInput) -> ObtenerPresupuestoOutput:
@@ -301,36 +622,12 @@ def obtener_presupuesto_func(input: ObtenerPresupuestoInput) -> ObtenerPresupues
         Presupuestos (diario, lifetime, restante) en EUR
     """
     try:
-        campaign = Campaign(input.campana_id)
-        
-        campaign_data = campaign.api_get(
-            fields=[
-                Campaign.Field.name,
-                Campaign.Field.daily_budget,
-                Campaign.Field.lifetime_budget,
-                Campaign.Field.budget_remaining,
-            ]
-        )
-        
-        # Convertir a EUR
-        daily_budget = campaign_data.get(Campaign.Field.daily_budget)
-        lifetime_budget = campaign_data.get(Campaign.Field.lifetime_budget)
-        budget_remaining = campaign_data.get(Campaign.Field.budget_remaining)
-        
-        output = {
-            "campaign_id": input.campana_id,
-            "nombre": campaign_data.get(Campaign.Field.name),
-            "presupuesto_diario_eur": round(float(daily_budget) / 100, 2) if daily_budget else None,
-            "presupuesto_lifetime_eur": round(float(lifetime_budget) / 100, 2) if lifetime_budget else None,
-            "presupuesto_restante_eur": round(float(budget_remaining) / 100, 2) if budget_remaining else None,
-        }
-        
-        logger.info(f"✅ Presupuesto de {output['nombre']}: {output['presupuesto_diario_eur']}€/día")
-        return ObtenerPresupuestoOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        campaign_data = _cached_api_get(input.campana_id, PRESUPUESTO_FIELDS)
+        return _presupuesto_output(input.campana_id, campaign_data)
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo presupuesto: {e}")
-        return ObtenerPresupuestoOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerPresupuestoOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def obtener_estrategia_puja_func(input: ObtenerEstrategiaPujaInput) -> ObtenerEstrategiaPujaOutput:
@@ -342,31 +639,125 @@ def obtener_estrategia_puja_func(input: ObtenerEstrategiaPujaInput) -> ObtenerEs
         Estrategia de puja legible y código técnico
     """
     try:
-        campaign = Campaign(input.campana_id)
-        
-        campaign_data = campaign.api_get(
-            fields=[
-                Campaign.Field.name,
-                Campaign.Field.bid_strategy,
-            ]
+        campaign_data = _cached_api_get(input.campana_id, ESTRATEGIA_FIELDS)
+        return _estrategia_output(input.campana_id, campaign_data)
+    
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo estrategia: {e}")
+        return ObtenerEstrategiaPujaOutput(datos_json=dumps_json({"error": str(e)}))
+
+
+# ========== VERSIONES ASYNC ==========
+
+# Un cliente HTTP por event loop (httpx.AsyncClient no se puede compartir entre loops)
+GRAPH_API_URL = "https://graph.facebook.com"
+GRAPH_API_TIMEOUT = 30.0
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Cliente httpx con keep-alive hacia la Graph API para el loop actual"""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        # El token va en cabecera: httpx registra la URL de cada petición a nivel INFO
+        client = httpx.AsyncClient(
+            base_url=f"{GRAPH_API_URL}/{settings.META_API_VERSION}",
+            headers={"Authorization": f"Bearer {settings.META_ACCESS_TOKEN}"},
+            timeout=GRAPH_API_TIMEOUT
         )
-        
-        bid_strategy = campaign_data.get(Campaign.Field.bid_strategy, 'LOWEST_COST_WITHOUT_CAP')
-        bid_strategy_readable = settings.BID_STRATEGY_MAP.get(bid_strategy, bid_strategy)
-        
-        output = {
-            "campaign_id": input.campana_id,
-            "nombre": campaign_data.get(Campaign.Field.name),
-            "estrategia_puja": bid_strategy_readable,
-            "estrategia_puja_code": bid_strategy,
-        }
-        
-        logger.info(f"✅ Estrategia de {output['nombre']}: {bid_strategy_readable}")
-        return ObtenerEstrategiaPujaOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+async def _graph_get(campana_id: str, fields) -> dict:
+    """GET /{campana_id}?fields=... contra la Graph API"""
+    response = await _get_async_client().get(
+        f"/{campana_id}",
+        params={"fields": ",".join(fields)}
+    )
+    if response.is_error:
+        error = response.json().get("error", {}) if response.content else {}
+        raise RuntimeError(error.get("message") or f"Graph API HTTP {response.status_code}")
+    return response.json()
+
+
+# Lecturas de la misma campaña que llegan dentro de esta ventana comparten petición
+COALESCE_WINDOW = 0.02
+_PENDING_GETS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _flush_get(pending: dict, campana_id: str) -> None:
+    """Cierra la ventana de campana_id y lanza una sola lectura con la unión de campos"""
+    await asyncio.sleep(COALESCE_WINDOW)
+    fields, future, _ = pending.pop(campana_id)
+    try:
+        future.set_result(await _graph_get(campana_id, sorted(fields)))
+    except Exception as e:
+        future.set_exception(e)
+
+
+async def _acoalesced_get(campana_id: str, fields: list) -> dict:
+    """
+    Mini DataLoader: las lecturas concurrentes de una misma campaña (p.ej.
+    presupuesto + estrategia en el mismo turno) se agrupan durante
+    COALESCE_WINDOW en un único api_get con la unión de campos; cada
+    llamante recibe solo los campos que pidió.
+    """
+    loop = asyncio.get_running_loop()
+    pending = _PENDING_GETS.setdefault(loop, {})
+    
+    entry = pending.get(campana_id)
+    if entry is None:
+        # (campos, future, task de flush): la task se guarda para que no la recoja el GC
+        task = loop.create_task(_flush_get(pending, campana_id))
+        entry = pending[campana_id] = (set(fields), loop.create_future(), task)
+    else:
+        entry[0].update(fields)
+    
+    # shield: si un llamante se cancela, los demás siguen esperando el mismo resultado
+    data = await asyncio.shield(entry[1])
+    wanted = set(fields)
+    return {key: value for key, value in data.items() if key in wanted or key == "id"}
+
+
+async def _acached_api_get(campana_id: str, fields: list) -> dict:
+    """
+    Versión async de _cached_api_get: misma caché y misma clave, así que
+    sync y async se sirven mutuamente las lecturas ya hechas.
+    """
+    key = ("campaign", campana_id, frozenset(fields))
+    data = _API_CACHE.get(key)
+    if data is None:
+        data = await _acoalesced_get(campana_id, fields)
+        _API_CACHE.set(key, data)
+    return data
+
+
+async def obtener_presupuesto_func_async(input: ObtenerPresupuestoInput) -> ObtenerPresupuestoOutput:
+    """Versión async de obtener_presupuesto_func (no bloquea el event loop)"""
+    try:
+        campaign_data = await _acached_api_get(input.campana_id, PRESUPUESTO_FIELDS)
+        return _presupuesto_output(input.campana_id, campaign_data)
+    
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo presupuesto: {e}")
+        return ObtenerPresupuestoOutput(datos_json=dumps_json({"error": str(e)}))
+
+
+async def obtener_estrategia_puja_func_async(input: ObtenerEstrategiaPujaInput) -> ObtenerEstrategiaPujaOutput:
+    """Versión async de obtener_estrategia_puja_func (no bloquea el event loop)"""
+    try:
+        campaign_data = await _acached_api_get(input.campana_id, ESTRATEGIA_FIELDS)
+        return _estrategia_output(input.campana_id, campaign_data)
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo estrategia: {e}")
-        return ObtenerEstrategiaPujaOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerEstrategiaPujaOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 # ========== TESTING ==========
@@ -9,18 +9,21 @@ from .performance_tools import (
     ObtenerAnunciosPorRendimientoInput,
     CompararPeriodosInput,
     ObtenerMetricasGlobalesInput,
+    ObtenerMetricasCampanasBatchInput,
     
     # Schemas Output
     ObtenerMetricasCampanaOutput,
     ObtenerAnunciosPorRendimientoOutput,
     CompararPeriodosOutput,
     ObtenerMetricasGlobalesOutput,
+    ObtenerMetricasCampanasBatchOutput,
     
     # Funciones
     obtener_metricas_campana_func,
     obtener_anuncios_por_rendimiento_func,
     comparar_periodos_func,
     obtener_metricas_globales_func,
+    obtener_metricas_campanas_batch_func,
 )
 
 __all__ = [
@@ -29,16 +32,19 @@ __all__ = [
     "ObtenerAnunciosPorRendimientoInput",
     "CompararPeriodosInput",
     "ObtenerMetricasGlobalesInput",
+    "ObtenerMetricasCampanasBatchInput",
     
     # Output Schemas
     "ObtenerMetricasCampanaOutput",
     "ObtenerAnunciosPorRendimientoOutput",
     "CompararPeriodosOutput",
     "ObtenerMetricasGlobalesOutput",
+    "ObtenerMetricasCampanasBatchOutput",
     
     # Funciones
     "obtener_metricas_campana_func",
     "obtener_anuncios_por_rendimiento_func",
     "comparar_periodos_func",
     "obtener_metricas_globales_func",
+    "obtener_metricas_campanas_batch_func",
 ]
\ No newline at end of file
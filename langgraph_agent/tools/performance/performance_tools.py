@@ -3,28 +3,51 @@ Herramientas de Rendimiento de Campañas
 Responsabilidad: Métricas, gasto, conversiones, comparaciones
 """
 
+import heapq
 import json
 import logging
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from operator import itemgetter
+
+import numpy as np
+from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.campaign import Campaign
 from facebook_business.adobjects.adaccount import AdAccount
 from facebook_business.adobjects.adsinsights import AdsInsights
+from facebook_business.adobjects.adreportrun import AdReportRun
 from facebook_business.adobjects.ad import Ad
+from facebook_business.exceptions import FacebookRequestError
 
 from ...models.schemas import BaseModel, Field
+from ...utils.cache import TTLCache
 from ...utils.meta_api import get_account
-from ...utils.helpers import safe_int_from_insight
-from ...config.settings import settings
+from ...utils.helpers import dumps_json, safe_int_from_insight
+from ...utils.insight_aggregator import (
+    CONVERSION_ACTIONS,
+    aggregate,
+    aggregate_columns,
+    to_columns,
+)
+from ...utils.insights_cache import (
+    cached_get_insights,
+    get_cached_insights,
+    insights_ttl,
+    store_insights,
+    ttl_cache,
+)
 
 
 from ...utils.destination_classifier import (
       extract_destination,
       classify_destinations_in_list,
-      aggregate_by_destination,
       get_top_destinations
   )
 
-from typing import List, Dict # Importación de Dict asegurada
+from typing import List, Dict, Optional # Importación de Dict asegurada
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +89,8 @@ CONVERSION_EVENTS = [
 
 # ========== SCHEMAS ==========
 
+# *Input en Pydantic (schema de la herramienta); *Output dataclasses con slots
+
 # Definición CORREGIDA de ObtenerMetricasCampanaInput (se eliminó la duplicación)
 class ObtenerMetricasCampanaInput(BaseModel):
     """Obtiene métricas de rendimiento de una campaña"""
@@ -76,7 +101,8 @@ class ObtenerMetricasCampanaInput(BaseModel):
     incluir_funnel: bool = Field(default=True, description="🆕 Incluir métricas del funnel (Subscriber/MQL/SQL)")
 
 
-class ObtenerMetricasCampanaOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasCampanaOutput:
     """Salida con métricas completas"""
     datos_json: str
 
@@ -94,7 +120,8 @@ class ObtenerAnunciosPorRendimientoInput(BaseModel):
     )
 
 
-class ObtenerAnunciosPorRendimientoOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerAnunciosPorRendimientoOutput:
     """Salida con TOP anuncios"""
     datos_json: str
 
@@ -110,7 +137,8 @@ class CompararPeriodosInput(BaseModel):
     fecha_fin_2: str = Field(default=None, description="Si periodo_2='custom': YYYY-MM-DD")
 
 
-class CompararPeriodosOutput(BaseModel):
+@dataclass(slots=True)
+class CompararPeriodosOutput:
     """Salida con comparación de períodos"""
     datos_json: str
 
@@ -120,7 +148,8 @@ class ObtenerMetricasGlobalesInput(BaseModel):
     date_preset: str = Field(default="last_7d", description="Período")
 
 
-class ObtenerMetricasGlobalesOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasGlobalesOutput:
     """Salida con métricas globales"""
     datos_json: str
 
@@ -133,7 +162,8 @@ class ObtenerMetricasPorDestinoInput(BaseModel):
     destino: str = Field(default=None, description="Filtrar por destino específico")
 
 
-class ObtenerMetricasPorDestinoOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasPorDestinoOutput:
     """Salida con métricas por destino"""
     datos_json: str
 
@@ -143,7 +173,8 @@ class ObtenerCPAGlobalInput(BaseModel):
     date_preset: str = Field(default="last_7d", description="Período")
 
 
-class ObtenerCPAGlobalOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerCPAGlobalOutput:
     """Salida con CPA global"""
     datos_json: str
 
@@ -154,7 +185,8 @@ class ObtenerMetricasAdsetInput(BaseModel):
     date_preset: str = Field(default="last_7d", description="Período")
 
 
-class ObtenerMetricasAdsetOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasAdsetOutput:
     """Salida con métricas de adsets"""
     datos_json: str
 
@@ -165,7 +197,8 @@ class CompararDestinosInput(BaseModel):
     date_preset: str = Field(default="last_7d", description="Período")
 
 
-class CompararDestinosOutput(BaseModel):
+@dataclass(slots=True)
+class CompararDestinosOutput:
     """Salida con comparación de destinos"""
     datos_json: str
 
@@ -179,7 +212,8 @@ class ObtenerMetricasAnuncioInput(BaseModel):
     date_end: str = Field(default=None, description="Fecha fin personalizada (YYYY-MM-DD)")
 
 
-class ObtenerMetricasAnuncioOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerMetricasAnuncioOutput:
     """Salida con métricas de un anuncio"""
     datos_json: str
 
@@ -192,7 +226,8 @@ class CompararAnunciosInput(BaseModel):
     metrica_ordenar: str = Field(default="cpa", description="Métrica para ordenar: cpa, cpc, ctr, conversiones")
 
 
-class CompararAnunciosOutput(BaseModel):
+@dataclass(slots=True)
+class CompararAnunciosOutput:
     """Salida con comparación de anuncios"""
     datos_json: str
 
@@ -203,7 +238,8 @@ class CompararAnunciosGlobalesInput(BaseModel):
     limite_campanas: int = Field(default=10, description="Máximo de campañas a analizar")
 
 
-class CompararAnunciosGlobalesOutput(BaseModel):
+@dataclass(slots=True)
+class CompararAnunciosGlobalesOutput:
     """Salida con comparación global de anuncios"""
     datos_json: str
 
@@ -216,7 +252,8 @@ class ObtenerFunnelConversionesInput(BaseModel):
     date_end: str = Field(default=None, description="Fecha fin")
 
 
-class ObtenerFunnelConversionesOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerFunnelConversionesOutput:
     """Salida con análisis del funnel"""
     datos_json: str
 
@@ -233,10 +270,100 @@ class ObtenerRankingCampanasInput(BaseModel):
     orden: str = Field(default="asc", description="asc (mejor primero) o desc (peor primero)")
 
 
-class ObtenerRankingCampanasOutput(BaseModel):
+@dataclass(slots=True)
+class ObtenerRankingCampanasOutput:
     """Salida con ranking de campañas"""
     datos_json: str
 
+
+class ObtenerMetricasCampanasBatchInput(BaseModel):
+    """Métricas básicas de varias campañas en una sola petición (Batch API)"""
+    campana_ids: List[str] = Field(description="IDs de las campañas")
+    date_preset: str = Field(default="last_7d", description="Período")
+    date_start: str = Field(default=None, description="Fecha inicio (YYYY-MM-DD)")
+    date_end: str = Field(default=None, description="Fecha fin (YYYY-MM-DD)")
+
+
+@dataclass(slots=True)
+class ObtenerMetricasCampanasBatchOutput:
+    """Salida con métricas por campaña"""
+    datos_json: str
+
+# ========== CAMPOS DE INSIGHTS ==========
+
+# Listas de campos a nivel de módulo: no se reconstruyen en cada llamada
+# (list y no tuple: el SDK de Meta espera list; no se modifican nunca).
+# Cada herramienta pide solo lo que lee: ctr/cpm/cpc se piden únicamente
+# donde se usan tal cual vienen de Meta; el resto los calcula de los totales.
+_INSIGHT_FIELDS_TOTALS = [
+    AdsInsights.Field.spend,
+    AdsInsights.Field.impressions,
+    AdsInsights.Field.clicks,
+    AdsInsights.Field.actions,
+]
+
+_INSIGHT_FIELDS_BASIC = _INSIGHT_FIELDS_TOTALS + [
+    AdsInsights.Field.ctr,
+    AdsInsights.Field.cpm,
+    AdsInsights.Field.cpc,
+]
+
+_INSIGHT_FIELDS_FULL = _INSIGHT_FIELDS_TOTALS + [AdsInsights.Field.conversion_values]
+
+_INSIGHT_FIELDS_CAMPAIGN_TOTALS = [
+    AdsInsights.Field.campaign_id,
+    AdsInsights.Field.campaign_name,
+] + _INSIGHT_FIELDS_TOTALS
+
+# Filtro en Meta: las filas sin gasto no viajan por la red
+_FILTER_CON_GASTO = {'field': 'spend', 'operator': 'GREATER_THAN', 'value': 0}
+
+_INSIGHT_FIELDS_CAMPAIGN = [
+    AdsInsights.Field.campaign_id,
+    AdsInsights.Field.campaign_name,
+] + _INSIGHT_FIELDS_BASIC
+
+_INSIGHT_FIELDS_ADSET = [
+    AdsInsights.Field.adset_id,
+    AdsInsights.Field.adset_name,
+] + _INSIGHT_FIELDS_BASIC
+
+_INSIGHT_FIELDS_AD = [
+    AdsInsights.Field.ad_id,
+    AdsInsights.Field.ad_name,
+] + _INSIGHT_FIELDS_TOTALS + [
+    AdsInsights.Field.ctr,
+    AdsInsights.Field.cpm,
+]
+
+_INSIGHT_FIELDS_AD_TOTALS = [
+    AdsInsights.Field.ad_id,
+    AdsInsights.Field.ad_name,
+] + _INSIGHT_FIELDS_TOTALS
+
+_INSIGHT_FIELDS_AD_DETAIL = [
+    AdsInsights.Field.ad_id,
+    AdsInsights.Field.ad_name,
+    AdsInsights.Field.campaign_id,
+    AdsInsights.Field.campaign_name,
+] + _INSIGHT_FIELDS_TOTALS + [
+    AdsInsights.Field.ctr,
+    AdsInsights.Field.cpm,
+]
+
+_INSIGHT_FIELDS_DESTINO = [
+    AdsInsights.Field.adset_id,
+    AdsInsights.Field.adset_name,
+] + _INSIGHT_FIELDS_TOTALS
+
+_INSIGHT_FIELDS_FUNNEL = [
+    AdsInsights.Field.campaign_id,
+    AdsInsights.Field.campaign_name,
+    AdsInsights.Field.spend,
+    AdsInsights.Field.actions,
+]
+
+
 # ========== MAPEO DE DATE PRESETS ==========
 
 DATE_PRESET_MAP = {
@@ -288,6 +415,39 @@ def normalize_date_preset(date_preset: str) -> str:
     logger.warning(f"⚠️ date_preset inválido: '{date_preset}'. Usando 'last_7d'")
     return "last_7d"
 
+
+@lru_cache(maxsize=64)
+def _resolve_period(periodo: str, today_ord: int, custom_range: tuple = None) -> tuple:
+    """
+    Resuelve un período a ('preset', date_preset) o ('range', since, until).
+    
+    today_ord (date.today().toordinal()) forma parte de la clave: los rangos
+    relativos a hoy se recalculan al cambiar de día y, dentro del mismo día,
+    el mismo período da siempre los mismos params (misma clave en la caché
+    de insights).
+    """
+    if periodo == 'custom' and custom_range and all(custom_range):
+        return ('range', custom_range[0], custom_range[1])
+    
+    if periodo in ('this_week', 'esta semana'):
+        hoy = date.fromordinal(today_ord)
+        lunes = hoy - timedelta(days=hoy.weekday())
+        return ('range', lunes.isoformat(), hoy.isoformat())
+    
+    return ('preset', normalize_date_preset(periodo))
+
+
+def _period_params(periodo: str, fecha_inicio: str = None, fecha_fin: str = None, level: str = 'campaign') -> dict:
+    """params de insights para un período (ver _resolve_period)"""
+    resolved = _resolve_period(
+        periodo,
+        date.today().toordinal(),
+        (fecha_inicio, fecha_fin) if periodo == 'custom' else None
+    )
+    if resolved[0] == 'range':
+        return {'level': level, 'time_range': {'since': resolved[1], 'until': resolved[2]}}
+    return {'level': level, 'date_preset': resolved[1]}
+
 def categorize_conversion(action_type: str) -> str:
     """
     Categoriza un action_type en su tipo de conversión del funnel.
@@ -379,6 +539,118 @@ def calculate_conversion_rate(conversions_from: int, conversions_to: int) -> flo
         return 0.0
     return round((conversions_to / conversions_from) * 100, 2)
 
+
+# ========== AGREGACIÓN VECTORIZADA ==========
+
+def _ratio(num: np.ndarray, den: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """num / den * scale por fila, 0 donde den == 0"""
+    out = np.zeros(len(num), dtype=np.float64)
+    np.divide(num * scale, den, out=out, where=den > 0)
+    return out
+
+
+def _round2(arr: np.ndarray) -> list:
+    """Redondeo a 2 decimales de toda la columna → lista de floats nativos"""
+    return np.round(arr, 2).tolist()
+
+
+# ========== DESTINOS POR ADSET ==========
+
+# (cuenta, período) → {adset_id: destino}, renovado en cada consulta por destino
+# sin filtro. Solo con el mapa del MISMO período el filtro por destino se hace en
+# Meta (adset.id IN ...): en otro período habría adsets que no están en el mapa.
+# Caduca como los insights de ese período (insights_ttl)
+_ADSET_DESTINOS = TTLCache(maxsize=64)
+
+
+@lru_cache(maxsize=4096)
+def _adset_destination(adset_name: str) -> str:
+    """extract_destination memoizado: los nombres de adset se repiten entre consultas"""
+    return extract_destination(adset_name)
+
+
+def _adset_destinos_key(account_id: str, params: dict) -> tuple:
+    """Clave del mapa adset→destino: cuenta + período pedido"""
+    periodo = {k: params[k] for k in ('date_preset', 'time_range') if k in params}
+    return account_id, dumps_json(periodo, sort_keys=True)
+
+
+def _adset_ids_destino(key: tuple, destino: str) -> list:
+    """adset_ids conocidos del destino (vacío si no hay mapa vigente para ese período)"""
+    destinos = _ADSET_DESTINOS.get(key) or {}
+    return [adset_id for adset_id, destination in destinos.items() if destination == destino]
+
+
+# ========== INFORMES ASÍNCRONOS ==========
+
+# Los informes de insights con muchas filas (level=campaign/adset sobre la
+# cuenta) se lanzan como AdReportRun (is_async=True): Meta los genera en segundo
+# plano y no hay timeout de la petición síncrona. Las lecturas de un solo objeto
+# (una campaña, totales de cuenta) van por cached_get_insights: una sola petición
+INSIGHTS_JOB_DONE = "Job Completed"
+INSIGHTS_JOB_FAILED = ("Job Failed", "Job Skipped")
+INSIGHTS_POLL_INITIAL = 0.5
+INSIGHTS_POLL_MAX = 4.0
+# Por debajo del AGENT_TIMEOUT (30s) con el que el orquestador espera a cada agente
+INSIGHTS_JOB_TIMEOUT = 25
+# Sondeos fallidos seguidos de un mismo informe antes de abandonarlo
+INSIGHTS_POLL_MAX_FAILURES = 3
+INSIGHTS_RESULT_LIMIT = 500
+
+
+def _start_insights_job(obj, fields: list, params: dict) -> AdReportRun:
+    """Lanza un informe asíncrono sobre obj (Campaign, AdAccount...)"""
+    return obj.get_insights(fields=fields, params=params, is_async=True)
+
+
+def _poll_insights_job(job: AdReportRun) -> Optional[str]:
+    """async_status del informe; None si la consulta de estado falla"""
+    try:
+        job.api_get(fields=[AdReportRun.Field.async_status])
+    except FacebookRequestError as e:
+        logger.warning(f"⚠️ No se pudo consultar el informe {job.get_id()}: {e}")
+        return None
+    return job[AdReportRun.Field.async_status]
+
+
+def _wait_insights_job(job: AdReportRun) -> list:
+    """
+    Espera a que termine el informe (sondeo con backoff exponencial) y
+    devuelve sus filas.
+    """
+    failures = 0
+    delay = INSIGHTS_POLL_INITIAL
+    deadline = time.monotonic() + INSIGHTS_JOB_TIMEOUT
+    
+    while True:
+        status = _poll_insights_job(job)
+        if status is None:
+            failures += 1
+            if failures >= INSIGHTS_POLL_MAX_FAILURES:
+                raise RuntimeError(
+                    f"Informe de insights {job.get_id()}: "
+                    f"{failures} consultas de estado fallidas seguidas"
+                )
+        else:
+            failures = 0
+            if status == INSIGHTS_JOB_DONE:
+                return list(job.get_result(params={'limit': INSIGHTS_RESULT_LIMIT}))
+            if status in INSIGHTS_JOB_FAILED:
+                raise RuntimeError(f"Informe de insights {job.get_id()}: {status}")
+        
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Informe de insights sin terminar tras {INSIGHTS_JOB_TIMEOUT}s")
+        
+        time.sleep(delay)
+        delay = min(delay * 2, INSIGHTS_POLL_MAX)
+
+
+@ttl_cache()
+def _run_async_insight(obj, fields: list, params: dict) -> list:
+    """get_insights vía informe asíncrono: lanza, espera y devuelve las filas (cacheado)"""
+    return _wait_insights_job(_start_insights_job(obj, fields, params))
+
+
 # ========== FUNCIONES ==========
 
 def obtener_metricas_campana_func(input: ObtenerMetricasCampanaInput) -> ObtenerMetricasCampanaOutput:
@@ -407,69 +679,41 @@ def obtener_metricas_campana_func(input: ObtenerMetricasCampanaInput) -> Obtener
             params['date_preset'] = date_preset_normalized
             periodo_str = date_preset_normalized
         
-        fields = [
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-            AdsInsights.Field.conversions,
-            AdsInsights.Field.conversion_values,
-        ]
+        fields = _INSIGHT_FIELDS_FULL
         
-        insights = campaign.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(campaign, fields, params)
         
         if not insights:
             return ObtenerMetricasCampanaOutput(
-                datos_json=json.dumps({
+                datos_json=dumps_json({
                     "error": f"No hay datos para campaña {input.campana_id} en {periodo_str}"
                 })
             )
         
-        # Agregar métricas tradicionales
-        total_spend = 0.0
-        total_impressions = 0
-        total_clicks = 0
-        valor_conversion_total = 0.0
-        
-        # 🆕 Nuevas métricas del funnel
-        funnel_conversions = {
-            "subscriber": 0,
-            "mql": 0,
-            "sql": 0,
-            "customer": 0,
-            "engagement": 0,
-            "other": 0,
-            "total": 0,
-            "detail": {}
-        }
+        # Agregar métricas tradicionales + acciones por action_type
+        agg = aggregate(insights, track_by_type=True)
+        total_spend = agg.spend
+        total_impressions = agg.impressions
+        total_clicks = agg.clicks
         
-        for insight in insights:
-            total_spend += float(insight.get('spend', 0))
-            total_impressions += int(insight.get('impressions', 0))
-            total_clicks += int(insight.get('clicks', 0))
-            
-            # 🆕 Extraer conversiones por tipo
-            conversions_by_type = extract_conversion_metrics(insight)
-            
-            for key in ["subscriber", "mql", "sql", "customer", "engagement", "other", "total"]:
-                funnel_conversions[key] += conversions_by_type[key]
-            
-            for action_type, value in conversions_by_type["detail"].items():
-                funnel_conversions["detail"][action_type] = funnel_conversions["detail"].get(action_type, 0) + value
-            
-            # Valor de conversiones
-            for cv in insight.get('conversion_values', []):
-                valor_conversion_total += float(cv.get('value', 0))
+        valor_conversion_total = sum(
+            float(cv.get('value', 0))
+            for insight in insights
+            for cv in insight.get('conversion_values', [])
+        )
+        
+        # 🆕 Nuevas métricas del funnel (categorías sobre las acciones ya sumadas)
+        funnel_conversions = dict.fromkeys(
+            ["subscriber", "mql", "sql", "customer", "engagement", "other", "total"], 0
+        )
+        for action_type, value in agg.conversions_by_type.items():
+            funnel_conversions[categorize_conversion(action_type)] += value
+            funnel_conversions["total"] += value
+        funnel_conversions["detail"] = agg.conversions_by_type
         
-        # Calcular métricas derivadas
+        # Calcular métricas derivadas (el CPA de esta herramienta usa todas las acciones)
         total_conversiones = funnel_conversions["total"]
-        ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-        cpc = (total_spend / total_clicks) if total_clicks > 0 else 0
+        ctr, cpm, cpc = agg.ctr, agg.cpm, agg.cpc
         cpa = (total_spend / total_conversiones) if total_conversiones > 0 else 0
         ratio_conversion = (total_conversiones / total_clicks * 100) if total_clicks > 0 else 0
         
@@ -536,11 +780,11 @@ def obtener_metricas_campana_func(input: ObtenerMetricasCampanaInput) -> Obtener
             f"SQL: {funnel_conversions['sql']}, Customers: {funnel_conversions['customer']})"
         )
         
-        return ObtenerMetricasCampanaOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerMetricasCampanaOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas: {e}")
-        return ObtenerMetricasCampanaOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerMetricasCampanaOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def obtener_anuncios_por_rendimiento_func(input: ObtenerAnunciosPorRendimientoInput) -> ObtenerAnunciosPorRendimientoOutput:
@@ -564,69 +808,20 @@ def obtener_anuncios_por_rendimiento_func(input: ObtenerAnunciosPorRendimientoIn
             params['time_range'] = {'since': input.date_start, 'until': input.date_end}
         else:
             params['date_preset'] = date_preset_normalized
+        params['filtering'] = [_FILTER_CON_GASTO]
         
-        fields = [
-            AdsInsights.Field.ad_id,
-            AdsInsights.Field.ad_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_AD
         
-        insights = campaign.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(campaign, fields, params)
         
         if not insights:
             # Corrección: Eliminación de comillas
             return ObtenerAnunciosPorRendimientoOutput(
-                datos_json=json.dumps({
+                datos_json=dumps_json({
                     "error": f"No hay datos de anuncios para campaña {input.campana_id}"
                 })
             )
         
-        anuncios = []
-        for insight in insights:
-            # 🆕 Extraer conversiones por tipo
-            conversions_by_type = extract_conversion_metrics(insight)
-            spend = float(insight.get('spend', 0))
-            clicks = int(insight.get('clicks', 0))
-            total_conversions = conversions_by_type["total"]
-            
-            cpc = (spend / clicks) if clicks > 0 else 0
-            cpa_total = (spend / total_conversions) if total_conversions > 0 else float('inf')
-            
-            # CPAs por tipo de conversión (infinito si no hay conversiones)
-            cpa_subscriber = (spend / conversions_by_type["subscriber"]) if conversions_by_type["subscriber"] > 0 else float('inf')
-            cpa_mql = (spend / conversions_by_type["mql"]) if conversions_by_type["mql"] > 0 else float('inf')
-            cpa_sql = (spend / conversions_by_type["sql"]) if conversions_by_type["sql"] > 0 else float('inf')
-            cpa_customer = (spend / conversions_by_type["customer"]) if conversions_by_type["customer"] > 0 else float('inf')
-
-            anuncios.append({
-                "ad_id": insight.get('ad_id'),
-                "ad_name": insight.get('ad_name'),
-                "spend_eur": round(spend, 2),
-                "impressions": int(insight.get('impressions', 0)),
-                "clicks": clicks,
-                "ctr": round(float(insight.get('ctr', 0)), 2),
-                "cpm": round(float(insight.get('cpm', 0)), 2),
-                "cpc": round(cpc, 2),
-                # 🆕 Conversiones por tipo
-                "conversiones_subscriber": conversions_by_type["subscriber"],
-                "conversiones_mql": conversions_by_type["mql"],
-                "conversiones_sql": conversions_by_type["sql"],
-                "conversiones_customer": conversions_by_type["customer"],
-                "conversiones_total": total_conversions,
-                # 🆕 CPAs por tipo
-                "cpa_subscriber": round(cpa_subscriber, 2) if cpa_subscriber != float('inf') else None,
-                "cpa_mql": round(cpa_mql, 2) if cpa_mql != float('inf') else None,
-                "cpa_sql": round(cpa_sql, 2) if cpa_sql != float('inf') else None,
-                "cpa_customer": round(cpa_customer, 2) if cpa_customer != float('inf') else None,
-                "cpa_total": round(cpa_total, 2) if cpa_total != float('inf') else None,
-            })
-        
         # 🔥 LÓGICA DE ORDENAMIENTO FLEXIBLE (actualizada con nuevos tipos)
         metrica_key_map = {
             "clicks": ("clicks", True),
@@ -647,25 +842,71 @@ def obtener_anuncios_por_rendimiento_func(input: ObtenerAnunciosPorRendimientoIn
             input.ordenar_por.lower(), ("clicks", True) # Default a clicks descendente
         )
 
-        anuncios.sort(key=lambda x: x.get(sort_key, 0) or 0, reverse=reverse_order)
+        total_anuncios = 0
+
+        def _filas():
+            nonlocal total_anuncios
+            for insight in insights:
+                total_anuncios += 1
+                # 🆕 Extraer conversiones por tipo
+                conversions_by_type = extract_conversion_metrics(insight)
+                spend = float(insight.get('spend', 0))
+                clicks = int(insight.get('clicks', 0))
+                total_conversions = conversions_by_type["total"]
+            
+                cpc = (spend / clicks) if clicks > 0 else 0
+                cpa_total = (spend / total_conversions) if total_conversions > 0 else float('inf')
+            
+                # CPAs por tipo de conversión (infinito si no hay conversiones)
+                cpa_subscriber = (spend / conversions_by_type["subscriber"]) if conversions_by_type["subscriber"] > 0 else float('inf')
+                cpa_mql = (spend / conversions_by_type["mql"]) if conversions_by_type["mql"] > 0 else float('inf')
+                cpa_sql = (spend / conversions_by_type["sql"]) if conversions_by_type["sql"] > 0 else float('inf')
+                cpa_customer = (spend / conversions_by_type["customer"]) if conversions_by_type["customer"] > 0 else float('inf')
+
+                yield {
+                    "ad_id": insight.get('ad_id'),
+                    "ad_name": insight.get('ad_name'),
+                    "spend_eur": round(spend, 2),
+                    "impressions": int(insight.get('impressions', 0)),
+                    "clicks": clicks,
+                    "ctr": round(float(insight.get('ctr', 0)), 2),
+                    "cpm": round(float(insight.get('cpm', 0)), 2),
+                    "cpc": round(cpc, 2),
+                    # 🆕 Conversiones por tipo
+                    "conversiones_subscriber": conversions_by_type["subscriber"],
+                    "conversiones_mql": conversions_by_type["mql"],
+                    "conversiones_sql": conversions_by_type["sql"],
+                    "conversiones_customer": conversions_by_type["customer"],
+                    "conversiones_total": total_conversions,
+                    # 🆕 CPAs por tipo
+                    "cpa_subscriber": round(cpa_subscriber, 2) if cpa_subscriber != float('inf') else None,
+                    "cpa_mql": round(cpa_mql, 2) if cpa_mql != float('inf') else None,
+                    "cpa_sql": round(cpa_sql, 2) if cpa_sql != float('inf') else None,
+                    "cpa_customer": round(cpa_customer, 2) if cpa_customer != float('inf') else None,
+                    "cpa_total": round(cpa_total, 2) if cpa_total != float('inf') else None,
+                }
+        
+        # TOP-N con un heap acotado: O(N log k), sin ordenar todas las filas
+        seleccionar = heapq.nlargest if reverse_order else heapq.nsmallest
+        top_anuncios = seleccionar(input.limite, _filas(), key=lambda x: x.get(sort_key, 0) or 0)
         
         output = {
             "campaign_id": input.campana_id,
             "periodo": date_preset_normalized,
             "ordenar_por": input.ordenar_por,
-            "total_anuncios": len(anuncios),
-            "top_anuncios": anuncios[:input.limite]
+            "total_anuncios": total_anuncios,
+            "top_anuncios": top_anuncios
         }
         
         logger.info(f"✅ TOP {input.limite} anuncios por {input.ordenar_por} de campaña {input.campana_id}")
 
         # Corrección: Eliminación de comillas
-        return ObtenerAnunciosPorRendimientoOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerAnunciosPorRendimientoOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo anuncios por rendimiento: {e}")
         # Corrección: Eliminación de comillas
-        return ObtenerAnunciosPorRendimientoOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerAnunciosPorRendimientoOutput(datos_json=dumps_json({"error": str(e)}))
 
 def comparar_periodos_func(input: CompararPeriodosInput) -> CompararPeriodosOutput:
     """
@@ -677,91 +918,40 @@ def comparar_periodos_func(input: CompararPeriodosInput) -> CompararPeriodosOutp
         Métricas de ambos períodos + deltas calculados
     """
     try:
-        # Función auxiliar para obtener métricas de un período
-        def obtener_metricas_periodo(campana_id, periodo, fecha_inicio, fecha_fin):
-            params = {'level': 'campaign'}
-            
-            periodo_normalized = normalize_date_preset(periodo) if periodo != 'custom' else 'custom'
-
-            if periodo == 'custom' and fecha_inicio and fecha_fin:
-                params['time_range'] = {'since': fecha_inicio, 'until': fecha_fin}
-            elif periodo_normalized == 'custom':
-                # Si el usuario dijo "this_week" o similar, calcular fechas
-                hoy = datetime.now()
-                if periodo in ['this_week', 'esta semana']:
-                    lunes = hoy - timedelta(days=hoy.weekday())
-                    params['time_range'] = {
-                        'since': lunes.strftime('%Y-%m-%d'),
-                        'until': hoy.strftime('%Y-%m-%d')
-                    }
-                else:
-                    params['date_preset'] = periodo_normalized
-            else:
-                params['date_preset'] = periodo_normalized
-            
-            fields = [
-                AdsInsights.Field.spend,
-                AdsInsights.Field.impressions,
-                AdsInsights.Field.clicks,
-                AdsInsights.Field.ctr,
-                AdsInsights.Field.cpm,
-                AdsInsights.Field.cpc,
-                AdsInsights.Field.actions,
-            ]
-            
-            if campana_id != "None":
-                campaign = Campaign(campana_id)
-                insights = campaign.get_insights(fields=fields, params=params)
-            else:
-                # Todas las campañas
-                account = get_account()
-                insights = account.get_insights(fields=fields, params=params)
-            
-            # Agregar métricas
-            total_spend = 0.0
-            total_impressions = 0
-            total_clicks = 0
-            total_conversiones = 0
-            
-            for insight in insights:
-                total_spend += float(insight.get('spend', 0))
-                total_impressions += int(insight.get('impressions', 0))
-                total_clicks += int(insight.get('clicks', 0))
-                
-                for action in insight.get('actions', []):
-                    if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
-                        total_conversiones += int(action.get('value', 0))
-            
-            ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-            cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-            cpc = (total_spend / total_clicks) if total_clicks > 0 else 0
-            cpa = (total_spend / total_conversiones) if total_conversiones > 0 else 0
-            
+        # Función auxiliar para agregar las métricas de un período
+        def agregar_metricas(insights):
+            agg = aggregate(insights)
             return {
-                "spend": round(total_spend, 2),
-                "impressions": total_impressions,
-                "clicks": total_clicks,
-                "ctr": round(ctr, 2),
-                "cpm": round(cpm, 2),
-                "cpc": round(cpc, 2),
-                "conversiones": total_conversiones,
-                "cpa": round(cpa, 2)
+                "spend": round(agg.spend, 2),
+                "impressions": agg.impressions,
+                "clicks": agg.clicks,
+                "ctr": round(agg.ctr, 2),
+                "cpm": round(agg.cpm, 2),
+                "cpc": round(agg.cpc, 2),
+                "conversiones": agg.conversions,
+                "cpa": round(agg.cpa, 2)
             }
         
-        # Obtener métricas de ambos períodos
-        metricas_1 = obtener_metricas_periodo(
-            input.campana_id,
-            input.periodo_1,
-            input.fecha_inicio_1,
-            input.fecha_fin_1
-        )
+        fields = _INSIGHT_FIELDS_TOTALS
         
-        metricas_2 = obtener_metricas_periodo(
-            input.campana_id,
-            input.periodo_2,
-            input.fecha_inicio_2,
-            input.fecha_fin_2
-        )
+        # Una campaña concreta o todas las campañas de la cuenta
+        objetivo = Campaign(input.campana_id) if input.campana_id != "None" else get_account()
+        
+        params_list = [
+            _period_params(input.periodo_1, input.fecha_inicio_1, input.fecha_fin_1),
+            _period_params(input.periodo_2, input.fecha_inicio_2, input.fecha_fin_2),
+        ]
+        
+        # Un solo objeto por período: lectura síncrona, los dos períodos en paralelo
+        with ThreadPoolExecutor(max_workers=len(params_list)) as pool:
+            insights_1, insights_2 = pool.map(
+                lambda params: cached_get_insights(objetivo, fields, params),
+                params_list
+            )
+        
+        # Obtener métricas de ambos períodos
+        metricas_1 = agregar_metricas(insights_1)
+        metricas_2 = agregar_metricas(insights_2)
         
         # Calcular deltas
         def calcular_delta(val1, val2):
@@ -812,11 +1002,11 @@ def comparar_periodos_func(input: CompararPeriodosInput) -> CompararPeriodosOutp
         }
         
         logger.info(f"✅ Comparación de períodos completada")
-        return CompararPeriodosOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return CompararPeriodosOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error comparando períodos: {e}")
-        return CompararPeriodosOutput(datos_json=json.dumps({"error": str(e)}))
+        return CompararPeriodosOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def obtener_metricas_globales_func(input: ObtenerMetricasGlobalesInput) -> ObtenerMetricasGlobalesOutput:
@@ -835,69 +1025,55 @@ def obtener_metricas_globales_func(input: ObtenerMetricasGlobalesInput) -> Obten
             'date_preset': date_preset_normalized,
             'level': 'campaign',
             'filtering': [
-                {'field': 'campaign.effective_status', 'operator': 'IN', 'value': ['ACTIVE', 'PAUSED']}
+                {'field': 'campaign.effective_status', 'operator': 'IN', 'value': ['ACTIVE', 'PAUSED']},
+                _FILTER_CON_GASTO
             ],
             'limit': 200
         }
         
-        fields = [
-            AdsInsights.Field.campaign_id,
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_CAMPAIGN_TOTALS
         
-        insights = account.get_insights(fields=fields, params=params)
+        insights = _run_async_insight(account, fields, params)
         
-        # Agregar métricas
-        total_spend = 0.0
-        total_impressions = 0
-        total_clicks = 0
-        total_conversiones = 0
-        campanas_analizadas = 0
-        campanas_detalle = []
+        # Agregar métricas: solo campañas con gasto (máscara sobre las columnas)
+        spend_arr, imps_arr, clicks_arr, conv_arr = to_columns(insights)
+        con_gasto = spend_arr > 0
         
-        for insight in insights:
-            spend = float(insight.get('spend', 0))
-            clicks = int(insight.get('clicks', 0))
-            impressions = int(insight.get('impressions', 0))
-            
-            conversiones = 0
-            for action in insight.get('actions', []):
-                if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
-                    conversiones += int(action.get('value', 0))
-            
-            if spend > 0:
-                total_spend += spend
-                total_clicks += clicks
-                total_impressions += impressions
-                total_conversiones += conversiones
-                campanas_analizadas += 1
-                
-                cpa = (spend / conversiones) if conversiones > 0 else 0
-                
-                campanas_detalle.append({
-                    "id": insight.get('campaign_id'),
-                    "nombre": insight.get('campaign_name'),
-                    "spend": round(spend, 2),
-                    "clicks": clicks,
-                    "conversiones": conversiones,
-                    "cpa": round(cpa, 2)
-                })
+        agg = aggregate_columns(
+            spend_arr[con_gasto], imps_arr[con_gasto], clicks_arr[con_gasto], conv_arr[con_gasto]
+        )
+        total_spend = agg.spend
+        total_impressions = agg.impressions
+        total_clicks = agg.clicks
+        total_conversiones = agg.conversions
+        campanas_analizadas = int(con_gasto.sum())
+        
+        # Detalle por campaña: CPA y redondeos vectorizados sobre las columnas
+        filas = np.flatnonzero(con_gasto)
+        spend_sel, conv_sel = spend_arr[filas], conv_arr[filas]
+        campanas_detalle = [
+            {
+                "id": insights[idx].get('campaign_id'),
+                "nombre": insights[idx].get('campaign_name'),
+                "spend": spend,
+                "clicks": clicks,
+                "conversiones": conversiones,
+                "cpa": cpa
+            }
+            for idx, spend, clicks, conversiones, cpa in zip(
+                filas.tolist(),
+                _round2(spend_sel),
+                clicks_arr[filas].tolist(),
+                conv_sel.tolist(),
+                _round2(_ratio(spend_sel, conv_sel))
+            )
+        ]
         
         # Métricas globales
-        avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        avg_cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-        avg_cpc = (total_spend / total_clicks) if total_clicks > 0 else 0
-        avg_cpa = (total_spend / total_conversiones) if total_conversiones > 0 else 0
+        avg_ctr, avg_cpm, avg_cpc, avg_cpa = agg.ctr, agg.cpm, agg.cpc, agg.cpa
         
-        # Ordenar campañas por gasto
-        campanas_detalle.sort(key=lambda x: x['spend'], reverse=True)
+        # TOP 10 campañas por gasto
+        top_campanas = heapq.nlargest(10, campanas_detalle, key=itemgetter('spend'))
         
         output = {
             "periodo": date_preset_normalized,
@@ -912,15 +1088,15 @@ def obtener_metricas_globales_func(input: ObtenerMetricasGlobalesInput) -> Obten
                 "conversiones_total": total_conversiones,
                 "cpa_promedio": round(avg_cpa, 2)
             },
-            "top_campanas": campanas_detalle[:10]
+            "top_campanas": top_campanas
         }
         
         logger.info(f"✅ Métricas globales: {campanas_analizadas} campañas, {total_spend}€")
-        return ObtenerMetricasGlobalesOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerMetricasGlobalesOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas globales: {e}")
-        return ObtenerMetricasGlobalesOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerMetricasGlobalesOutput(datos_json=dumps_json({"error": str(e)}))
     
 
 def obtener_metricas_por_destino_func(
@@ -951,76 +1127,79 @@ def obtener_metricas_por_destino_func(
             params['date_preset'] = date_preset_normalized  
             periodo_str = date_preset_normalized
         
-        fields = [
-            AdsInsights.Field.adset_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.actions,
-        ]
+        # Con un destino pedido y el mapa adset→destino de este período, Meta filtra las filas
+        destinos_key = _adset_destinos_key(account.get_id(), params)
+        adset_ids = _adset_ids_destino(destinos_key, input.destino) if input.destino else []
+        if adset_ids:
+            params['filtering'] = [{'field': 'adset.id', 'operator': 'IN', 'value': adset_ids}]
         
-        insights = account.get_insights(fields=fields, params=params)
+        fields = _INSIGHT_FIELDS_DESTINO
         
-        # Procesar y clasificar por destino
-        items = []
-        for insight in insights:
-            adset_name = insight.get('adset_name', '')
-            destination = extract_destination(adset_name)
-            
-            # Filtrar si se especificó un destino
-            if input.destino and destination != input.destino:
-                continue
-            
-            spend = float(insight.get('spend', 0))
-            clicks = int(insight.get('clicks', 0))
-            impressions = int(insight.get('impressions', 0))
-            
-            # Extraer conversiones
-            conversions = 0
-            for action in insight.get('actions', []):
-                if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
-                    conversions += int(action.get('value', 0))
-            
-            items.append({
-                "adset_name": adset_name,
-                "destination": destination,
-                "spend": spend,
-                "clicks": clicks,
-                "impressions": impressions,
-                "conversions": conversions
-            })
+        insights = _run_async_insight(account, fields, params)
+        
+        if not input.destino:
+            _ADSET_DESTINOS.set(destinos_key, {
+                insight.get('adset_id'): _adset_destination(insight.get('adset_name', ''))
+                for insight in insights
+            }, ttl=insights_ttl(params))
         
-        # Agregar por destino
-        aggregated = aggregate_by_destination(
-            items,
-            metrics=["spend", "clicks", "impressions", "conversions"]
+        # Procesar y clasificar por destino (métricas por fila ya en columnas)
+        spend_arr, imps_arr, clicks_arr, conv_arr = to_columns(insights)
+        
+        # Destino de cada fila como código entero (orden de primera aparición)
+        codigos = {}
+        dest_idx = np.fromiter(
+            (codigos.setdefault(_adset_destination(insight.get('adset_name', '')), len(codigos))
+             for insight in insights),
+            dtype=np.int64,
+            count=len(insights)
         )
+        destinos = list(codigos)
         
-        # Calcular métricas derivadas
-        results = []
-        for destination, metrics in aggregated.items():
-            total_spend = metrics['spend']
-            total_clicks = metrics['clicks']
-            total_impressions = metrics['impressions']
-            total_conversions = metrics['conversions']
-            
-            ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-            cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-            cpc = (total_spend / total_clicks) if total_clicks > 0 else 0
-            cpa = (total_spend / total_conversions) if total_conversions > 0 else 0
-            
-            results.append({
+        # Filtrar si se especificó un destino
+        if input.destino:
+            sel = dest_idx == codigos.get(input.destino, -1)
+            dest_idx, spend_arr, imps_arr, clicks_arr, conv_arr = (
+                dest_idx[sel], spend_arr[sel], imps_arr[sel], clicks_arr[sel], conv_arr[sel]
+            )
+        
+        # Agregar por destino: sumas por grupo directamente sobre las columnas
+        n_dest = len(destinos)
+        d_count = np.bincount(dest_idx, minlength=n_dest)
+        presentes = np.flatnonzero(d_count)
+        destinos = [destinos[i] for i in presentes.tolist()]
+        d_count = d_count[presentes]
+        d_spend = np.bincount(dest_idx, weights=spend_arr, minlength=n_dest)[presentes]
+        d_imps = np.bincount(dest_idx, weights=imps_arr, minlength=n_dest)[presentes].astype(np.int64)
+        d_clicks = np.bincount(dest_idx, weights=clicks_arr, minlength=n_dest)[presentes].astype(np.int64)
+        d_conv = np.bincount(dest_idx, weights=conv_arr, minlength=n_dest)[presentes].astype(np.int64)
+        
+        results = [
+            {
                 "destination": destination,
-                "spend_eur": round(total_spend, 2),
-                "impressions": total_impressions,
-                "clicks": total_clicks,
-                "conversions": total_conversions,
-                "ctr_percentage": round(ctr, 2),
-                "cpm_eur": round(cpm, 2),
-                "cpc_eur": round(cpc, 2),
-                "cpa_eur": round(cpa, 2),
-                "adsets_count": metrics['count']
-            })
+                "spend_eur": spend,
+                "impressions": impressions,
+                "clicks": clicks,
+                "conversions": conversions,
+                "ctr_percentage": ctr,
+                "cpm_eur": cpm,
+                "cpc_eur": cpc,
+                "cpa_eur": cpa,
+                "adsets_count": adsets_count
+            }
+            for destination, adsets_count, spend, impressions, clicks, conversions, ctr, cpm, cpc, cpa in zip(
+                destinos,
+                d_count.tolist(),
+                _round2(d_spend),
+                d_imps.tolist(),
+                d_clicks.tolist(),
+                d_conv.tolist(),
+                _round2(_ratio(d_clicks, d_imps, 100.0)),
+                _round2(_ratio(d_spend, d_imps, 1000.0)),
+                _round2(_ratio(d_spend, d_clicks)),
+                _round2(_ratio(d_spend, d_conv))
+            )
+        ]
         
         # Ordenar por gasto (mayor a menor)
         results.sort(key=lambda x: x['spend_eur'], reverse=True)
@@ -1032,11 +1211,11 @@ def obtener_metricas_por_destino_func(
         }
         
         logger.info(f"✅ Métricas por destino: {len(results)} destinos analizados")
-        return ObtenerMetricasPorDestinoOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerMetricasPorDestinoOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas por destino: {e}")
-        return ObtenerMetricasPorDestinoOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerMetricasPorDestinoOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def obtener_cpa_global_func(
@@ -1060,35 +1239,17 @@ def obtener_cpa_global_func(
             'level': 'account'
         }
         
-        fields = [
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_TOTALS
         
-        insights = account.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(account, fields, params)
         
-        # Agregar métricas
-        total_spend = 0.0
-        total_impressions = 0
-        total_clicks = 0
-        total_conversions = 0
-        
-        for insight in insights:
-            total_spend += float(insight.get('spend', 0))
-            total_impressions += int(insight.get('impressions', 0))
-            total_clicks += int(insight.get('clicks', 0))
-            
-            for action in insight.get('actions', []):
-                if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
-                    total_conversions += int(action.get('value', 0))
-        
-        # Calcular métricas
-        ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-        cpm = (total_spend / total_impressions * 1000) if total_impressions > 0 else 0
-        cpc = (total_spend / total_clicks) if total_clicks > 0 else 0
-        cpa = (total_spend / total_conversions) if total_conversions > 0 else 0
+        # Agregar métricas y derivadas (kernel compartido)
+        agg = aggregate(insights)
+        total_spend = agg.spend
+        total_impressions = agg.impressions
+        total_clicks = agg.clicks
+        total_conversions = agg.conversions
+        ctr, cpm, cpc, cpa = agg.ctr, agg.cpm, agg.cpc, agg.cpa
         
         output = {
             "period": date_preset_normalized,
@@ -1105,11 +1266,11 @@ def obtener_cpa_global_func(
         }
         
         logger.info(f"✅ CPA global: {cpa:.2f}€")
-        return ObtenerCPAGlobalOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerCPAGlobalOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo CPA global: {e}")
-        return ObtenerCPAGlobalOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerCPAGlobalOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def obtener_metricas_adset_func(
@@ -1133,19 +1294,9 @@ def obtener_metricas_adset_func(
             'level': 'adset'
         }
         
-        fields = [
-            AdsInsights.Field.adset_id,
-            AdsInsights.Field.adset_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_ADSET
         
-        insights = campaign.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(campaign, fields, params)
         
         adsets = []
         for insight in insights:
@@ -1157,7 +1308,7 @@ def obtener_metricas_adset_func(
             
             conversions = 0
             for action in insight.get('actions', []):
-                if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
+                if action.get('action_type') in CONVERSION_ACTIONS:
                     conversions += int(action.get('value', 0))
             
             cpa = (spend / conversions) if conversions > 0 else 0
@@ -1187,11 +1338,11 @@ def obtener_metricas_adset_func(
         }
         
         logger.info(f"✅ Métricas de {len(adsets)} adsets obtenidas")
-        return ObtenerMetricasAdsetOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerMetricasAdsetOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas de adsets: {e}")
-        return ObtenerMetricasAdsetOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerMetricasAdsetOutput(datos_json=dumps_json({"error": str(e)}))
 
 
 def comparar_destinos_func(
@@ -1233,11 +1384,11 @@ def comparar_destinos_func(
         }
         
         logger.info(f"✅ Comparación de {len(filtered)} destinos completada")
-        return CompararDestinosOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return CompararDestinosOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error comparando destinos: {e}")
-        return CompararDestinosOutput(datos_json=json.dumps({"error": str(e)}))
+        return CompararDestinosOutput(datos_json=dumps_json({"error": str(e)}))
 
 # Corrección: Tipo de entrada y salida de Anuncio (Ad)
 def obtener_metricas_anuncio_func(input: ObtenerMetricasAnuncioInput) -> ObtenerMetricasAnuncioOutput:
@@ -1273,28 +1424,13 @@ def obtener_metricas_anuncio_func(input: ObtenerMetricasAnuncioInput) -> Obtener
             periodo_str = date_preset_normalized
 
         # Campos de insights
-        fields = [
-            AdsInsights.Field.ad_id,
-            AdsInsights.Field.ad_name,
-            AdsInsights.Field.adset_id,
-            AdsInsights.Field.adset_name,
-            AdsInsights.Field.campaign_id,
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-            AdsInsights.Field.conversions,
-        ]
+        fields = _INSIGHT_FIELDS_AD_DETAIL
         
-        insights = ad.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(ad, fields, params)
         
         if not insights:
              return ObtenerMetricasAnuncioOutput(
-                datos_json=json.dumps({
+                datos_json=dumps_json({
                     "error": f"No hay datos para anuncio {input.anuncio_id} en {periodo_str}"
                 })
             )
@@ -1346,11 +1482,11 @@ def obtener_metricas_anuncio_func(input: ObtenerMetricasAnuncioInput) -> Obtener
         }
         
         logger.info(f"✅ Métricas del anuncio {input.anuncio_id}: {spend}€, {total_conversiones} conversiones")
-        return ObtenerMetricasAnuncioOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerMetricasAnuncioOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas del anuncio: {e}")
-        return ObtenerMetricasAnuncioOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerMetricasAnuncioOutput(datos_json=dumps_json({"error": str(e)}))
     
 def comparar_anuncios_func(input: CompararAnunciosInput) -> CompararAnunciosOutput:
     """
@@ -1376,19 +1512,9 @@ def comparar_anuncios_func(input: CompararAnunciosInput) -> CompararAnunciosOutp
                 'level': 'ad'
             }
             
-            fields = [
-                AdsInsights.Field.ad_id,
-                AdsInsights.Field.ad_name,
-                AdsInsights.Field.spend,
-                AdsInsights.Field.impressions,
-                AdsInsights.Field.clicks,
-                AdsInsights.Field.ctr,
-                AdsInsights.Field.cpm,
-                AdsInsights.Field.cpc,
-                AdsInsights.Field.actions,
-            ]
+            fields = _INSIGHT_FIELDS_AD_TOTALS
             
-            insights = campaign.get_insights(fields=fields, params=params)
+            insights = cached_get_insights(campaign, fields, params)
             
             anuncios = {}
             for insight in insights:
@@ -1400,7 +1526,7 @@ def comparar_anuncios_func(input: CompararAnunciosInput) -> CompararAnunciosOutp
                 # Calcular conversiones
                 conversiones = 0
                 for action in insight.get('actions', []):
-                    if action.get('action_type') in ['purchase', 'lead', 'complete_registration']:
+                    if action.get('action_type') in CONVERSION_ACTIONS:
                         conversiones += int(action.get('value', 0))
                 
                 ctr = (clicks / impressions * 100) if impressions > 0 else 0
@@ -1424,8 +1550,11 @@ def comparar_anuncios_func(input: CompararAnunciosInput) -> CompararAnunciosOutp
             return anuncios
         
         # Obtener anuncios de ambos períodos
-        anuncios_actual = obtener_anuncios_periodo(input.periodo_actual)
-        anuncios_anterior = obtener_anuncios_periodo(input.periodo_anterior)
+        # (en paralelo: cada período es una llamada independiente a Meta)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futuro_actual = pool.submit(obtener_anuncios_periodo, input.periodo_actual)
+            futuro_anterior = pool.submit(obtener_anuncios_periodo, input.periodo_anterior)
+            anuncios_actual, anuncios_anterior = futuro_actual.result(), futuro_anterior.result()
         
         # Comparar anuncios
         comparacion = []
@@ -1499,11 +1628,11 @@ def comparar_anuncios_func(input: CompararAnunciosInput) -> CompararAnunciosOutp
         }
         
         logger.info(f"✅ Comparación de {len(comparacion)} anuncios completada")
-        return CompararAnunciosOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return CompararAnunciosOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error comparando anuncios: {e}")
-        return CompararAnunciosOutput(datos_json=json.dumps({"error": str(e)}))
+        return CompararAnunciosOutput(datos_json=dumps_json({"error": str(e)}))
     
 
 def comparar_anuncios_globales_func(input: CompararAnunciosGlobalesInput) -> CompararAnunciosGlobalesOutput:
@@ -1577,11 +1706,11 @@ def comparar_anuncios_globales_func(input: CompararAnunciosGlobalesInput) -> Com
         }
         
         logger.info(f"✅ Análisis global: {len(resultados_por_campana)} campañas con anuncios empeorados")
-        return CompararAnunciosGlobalesOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return CompararAnunciosGlobalesOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error en comparación global: {e}")
-        return CompararAnunciosGlobalesOutput(datos_json=json.dumps({"error": str(e)}))
+        return CompararAnunciosGlobalesOutput(datos_json=dumps_json({"error": str(e)}))
 
 # 🆕 NUEVA FUNCIÓN: Análisis completo del funnel de conversiones
 def obtener_funnel_conversiones_func(input: ObtenerFunnelConversionesInput) -> ObtenerFunnelConversionesOutput:
@@ -1609,24 +1738,19 @@ def obtener_funnel_conversiones_func(input: ObtenerFunnelConversionesInput) -> O
             params['date_preset'] = date_preset_normalized
             periodo_str = date_preset_normalized
         
-        fields = [
-            AdsInsights.Field.campaign_id,
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_FUNNEL
         
         # Obtener insights
         if input.campana_id:
             campaign = Campaign(input.campana_id)
-            insights = campaign.get_insights(fields=fields, params=params)
+            insights = cached_get_insights(campaign, fields, params)
         else:
-            account = get_account(settings.FB_ACT_ID)
-            insights = account.get_insights(fields=fields, params=params)
+            account = get_account()
+            insights = cached_get_insights(account, fields, params)
 
         if not insights:
             return ObtenerFunnelConversionesOutput(
-                datos_json=json.dumps({
+                datos_json=dumps_json({
                     "error": f"No hay datos para {input.campana_id or 'el nivel de cuenta'} en {periodo_str}"
                 })
             )
@@ -1693,11 +1817,11 @@ def obtener_funnel_conversiones_func(input: ObtenerFunnelConversionesInput) -> O
             f"SQL:{funnel_totals['sql']} → Customers:{funnel_totals['customer']}"
         )
         
-        return ObtenerFunnelConversionesOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerFunnelConversionesOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo funnel de conversiones: {e}")
-        return ObtenerFunnelConversionesOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerFunnelConversionesOutput(datos_json=dumps_json({"error": str(e)}))
 
 def obtener_ranking_campanas_func(input: ObtenerRankingCampanasInput) -> ObtenerRankingCampanasOutput:
     """
@@ -1730,23 +1854,14 @@ def obtener_ranking_campanas_func(input: ObtenerRankingCampanasInput) -> Obtener
         
         # Filtrar solo campañas activas
         params['filtering'] = [
-            {'field': 'campaign.effective_status', 'operator': 'IN', 'value': ['ACTIVE']}
+            {'field': 'campaign.effective_status', 'operator': 'IN', 'value': ['ACTIVE']},
+            _FILTER_CON_GASTO
         ]
         params['limit'] = 200
         
-        fields = [
-            AdsInsights.Field.campaign_id,
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-        ]
+        fields = _INSIGHT_FIELDS_CAMPAIGN
         
-        insights = account.get_insights(fields=fields, params=params)
+        insights = cached_get_insights(account, fields, params)
         
         campanas = []
         for insight in insights:
@@ -1794,7 +1909,7 @@ def obtener_ranking_campanas_func(input: ObtenerRankingCampanasInput) -> Obtener
         
         if not campanas:
             return ObtenerRankingCampanasOutput(
-                datos_json=json.dumps({
+                datos_json=dumps_json({
                     "error": "No se encontraron campañas activas con gasto en el período especificado"
                 })
             )
@@ -1838,7 +1953,8 @@ def obtener_ranking_campanas_func(input: ObtenerRankingCampanasInput) -> Obtener
                 return float('inf') if not reverse_order else float('-inf')
             return val
         
-        campanas_ordenadas = sorted(campanas, key=safe_sort_key, reverse=reverse_order)[:input.limite]
+        seleccionar = heapq.nlargest if reverse_order else heapq.nsmallest
+        campanas_ordenadas = seleccionar(input.limite, campanas, key=safe_sort_key)
         
         # Agregar ranking
         for idx, campana in enumerate(campanas_ordenadas, 1):
@@ -1858,8 +1974,133 @@ def obtener_ranking_campanas_func(input: ObtenerRankingCampanasInput) -> Obtener
             f"(ordenado por {input.ordenar_por}, {output['orden']})"
         )
         
-        return ObtenerRankingCampanasOutput(datos_json=json.dumps(output, ensure_ascii=False))
+        return ObtenerRankingCampanasOutput(datos_json=dumps_json(output))
     
     except Exception as e:
         logger.error(f"❌ Error obteniendo ranking de campañas: {e}")
-        return ObtenerRankingCampanasOutput(datos_json=json.dumps({"error": str(e)}))
+        return ObtenerRankingCampanasOutput(datos_json=dumps_json({"error": str(e)}))
+
+
+# ========== MÉTRICAS DE VARIAS CAMPAÑAS (BATCH API) ==========
+
+# Máximo de peticiones por lote de la Batch API de Meta
+BATCH_SIZE = 50
+
+
+def _insights_campanas_lote(campaign_ids: list, fields: list, params: dict, filas: dict) -> None:
+    """Insights de hasta BATCH_SIZE campañas en una sola petición HTTP; vuelca en filas"""
+    batch = FacebookAdsApi.get_default_api().new_batch()
+    
+    def on_success(campaign_id):
+        def callback(response):
+            filas[campaign_id] = response.json().get('data', [])
+        return callback
+    
+    def on_failure(campaign_id):
+        def callback(response):
+            logger.warning(f"⚠️ Sin insights para campaña {campaign_id}: {response.error()}")
+        return callback
+    
+    for campaign_id in campaign_ids:
+        Campaign(campaign_id).get_insights(
+            fields=fields,
+            params=params,
+            batch=batch,
+            success=on_success(campaign_id),
+            failure=on_failure(campaign_id)
+        )
+    batch.execute()
+
+
+def obtener_metricas_campanas_batch_func(
+    input: ObtenerMetricasCampanasBatchInput
+) -> ObtenerMetricasCampanasBatchOutput:
+    """
+    Métricas básicas (gasto, clicks, CTR, CPC, CPM, conversiones, CPA) de
+    varias campañas. Las que no están en caché se piden juntas con la Batch
+    API (una petición HTTP por cada BATCH_SIZE campañas) en lugar de llamar
+    N veces a obtener_metricas_campana_func.
+    
+    Returns:
+        Métricas por campaña, en el orden de campana_ids
+    """
+    try:
+        date_preset_normalized = normalize_date_preset(input.date_preset)
+        
+        params = {'level': 'campaign', 'filtering': [_FILTER_CON_GASTO]}
+        if input.date_start and input.date_end:
+            params['time_range'] = {'since': input.date_start, 'until': input.date_end}
+            periodo_str = f"{input.date_start} a {input.date_end}"
+        else:
+            params['date_preset'] = date_preset_normalized
+            periodo_str = date_preset_normalized
+        
+        fields = _INSIGHT_FIELDS_CAMPAIGN_TOTALS
+        campaign_ids = list(dict.fromkeys(input.campana_ids))
+        
+        # Caché primero; el resto, por lotes
+        filas = {}
+        pendientes = []
+        for campaign_id in campaign_ids:
+            cached = get_cached_insights(Campaign(campaign_id), fields, params)
+            if cached is None:
+                pendientes.append(campaign_id)
+            else:
+                filas[campaign_id] = cached
+        
+        for start in range(0, len(pendientes), BATCH_SIZE):
+            lote = pendientes[start:start + BATCH_SIZE]
+            _insights_campanas_lote(lote, fields, params, filas)
+            for campaign_id in lote:
+                if campaign_id in filas:
+                    store_insights(Campaign(campaign_id), fields, params, filas[campaign_id])
+        
+        # Una fila por campaña (level=campaign); sin gasto → sin fila
+        con_datos = [campaign_id for campaign_id in campaign_ids if filas.get(campaign_id)]
+        rows = [filas[campaign_id][0] for campaign_id in con_datos]
+        spend_arr, imps_arr, clicks_arr, conv_arr = to_columns(rows)
+        
+        campanas = [
+            {
+                "campaign_id": campaign_id,
+                "campaign_name": row.get('campaign_name'),
+                "spend_eur": spend,
+                "impressions": impressions,
+                "clicks": clicks,
+                "conversiones": conversiones,
+                "ctr": ctr,
+                "cpc": cpc,
+                "cpm": cpm,
+                "cpa": cpa
+            }
+            for campaign_id, row, spend, impressions, clicks, conversiones, ctr, cpc, cpm, cpa in zip(
+                con_datos,
+                rows,
+                _round2(spend_arr),
+                imps_arr.tolist(),
+                clicks_arr.tolist(),
+                conv_arr.tolist(),
+                _round2(_ratio(clicks_arr, imps_arr, 100.0)),
+                _round2(_ratio(spend_arr, clicks_arr)),
+                _round2(_ratio(spend_arr, imps_arr, 1000.0)),
+                _round2(_ratio(spend_arr, conv_arr))
+            )
+        ]
+        
+        output = {
+            "periodo": periodo_str,
+            "campanas_solicitadas": len(campaign_ids),
+            "campanas_con_datos": len(campanas),
+            "sin_datos": [campaign_id for campaign_id in campaign_ids if not filas.get(campaign_id)],
+            "campanas": campanas
+        }
+        
+        logger.info(
+            f"✅ Métricas de {len(campanas)}/{len(campaign_ids)} campañas "
+            f"({len(pendientes)} pedidas a Meta en lote)"
+        )
+        return ObtenerMetricasCampanasBatchOutput(datos_json=dumps_json(output))
+    
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo métricas en lote: {e}")
+        return ObtenerMetricasCampanasBatchOutput(datos_json=dumps_json({"error": str(e)}))
@@ -3,7 +3,6 @@ Utils Package
 Exports para utilidades y helpers
 """
 
-from .meta_api import get_account, initialize_meta_api
 from .helpers import safe_int_from_insight, safe_float_from_insight, format_currency
 from .destination_classifier import (
     extract_destination,
@@ -25,4 +24,16 @@ __all__ = [
     "classify_destinations_in_list",
     "aggregate_by_destination",
     "get_top_destinations",
-]
\ No newline at end of file
+]
+
+
+# El SDK de Meta se importa al primer uso: las utilidades puras (cache,
+# helpers, insight_aggregator...) se pueden importar sin facebook_business
+_LAZY = {"get_account", "initialize_meta_api"}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        from . import meta_api
+        return getattr(meta_api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
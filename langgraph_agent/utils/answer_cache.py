@@ -0,0 +1,56 @@
+"""
+Caché de respuestas finales en SQLite
+Guarda la respuesta completa de un agente por (campaña, día, tipo de consulta)
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Tabla answer_cache(key, content, ts) con expiración por antigüedad.
+
+    Example:
+        >>> cache = AnswerCache(":memory:", ttl=3600)
+        >>> cache.set("123|2025-01-01|general", "Recomendaciones...")
+        >>> cache.get("123|2025-01-01|general")
+        'Recomendaciones...'
+    """
+
+    def __init__(self, path: str, ttl: int = 86400):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache "
+            "(key TEXT PRIMARY KEY, content TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Contenido guardado o None si no existe / expiró"""
+        min_ts = int(time.time()) - self.ttl
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM answer_cache WHERE key = ? AND ts >= ?",
+                (key, min_ts)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, content: str) -> None:
+        """Guarda (o reemplaza) una respuesta"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answer_cache (key, content, ts) VALUES (?, ?, ?)",
+                    (key, content, int(time.time()))
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ No se pudo guardar en answer_cache: {e}")
@@ -0,0 +1,190 @@
+"""
+Checkpointers en memoria para los agentes LangGraph
+Variantes de MemorySaver pensadas para muchos threads concurrentes
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+
+# ========== SHARDED SAVER ==========
+
+class ShardedSaver(BaseCheckpointSaver):
+    """
+    Reparte los threads entre N MemorySaver independientes según el thread_id.
+
+    Conversaciones distintas escriben en shards distintos y no compiten por
+    las mismas estructuras; un mismo thread siempre cae en el mismo shard.
+    """
+
+    def __init__(self, shards: int = 8):
+        super().__init__()
+        self._savers = [MemorySaver() for _ in range(shards)]
+
+    def _saver(self, config: Optional[RunnableConfig]) -> MemorySaver:
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        return self._savers[hash(str(thread_id)) % len(self._savers)]
+
+    def _saver_for_thread(self, thread_id: str) -> MemorySaver:
+        return self._saver({"configurable": {"thread_id": thread_id}})
+
+    # ---------- Sync ----------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._saver(config).get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config is not None:
+            yield from self._saver(config).list(config, filter=filter, before=before, limit=limit)
+            return
+
+        # Sin thread concreto: recorrer todos los shards
+        remaining = limit
+        for saver in self._savers:
+            for item in saver.list(None, filter=filter, before=before, limit=remaining):
+                yield item
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self._saver(config).put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._saver(config).put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._saver_for_thread(thread_id).delete_thread(thread_id)
+
+    # ---------- Async ----------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._saver(config).aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._saver(config).aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self._saver(config).aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._saver_for_thread(thread_id).adelete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        return self._savers[0].get_next_version(current, channel)
+
+
+# ========== LRU SAVER ==========
+
+class LRUMemorySaver(MemorySaver):
+    """
+    MemorySaver acotado: conserva como máximo `maxsize` threads y descarta
+    el usado hace más tiempo (checkpoints, writes y blobs incluidos).
+
+    Los métodos async de MemorySaver delegan en los sync, así que basta
+    con registrar el uso en get_tuple/put/put_writes.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__()
+        self._max = maxsize
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    def _touch(self, config: RunnableConfig) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        evicted = []
+        
+        with self._lru_lock:
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self._max:
+                evicted.append(self._threads.popitem(last=False)[0])
+        
+        for old_thread_id in evicted:
+            super().delete_thread(old_thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        result = super().get_tuple(config)
+        if result is not None:
+            self._touch(config)
+        return result
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self._touch(config)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._touch(config)
+        super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lru_lock:
+            self._threads.pop(thread_id, None)
+        super().delete_thread(thread_id)
@@ -3,8 +3,16 @@ Funciones Helper Generales
 Utilidades comunes para procesamiento de datos
 """
 
+import json
 import logging
-from typing import Any, Optional, Dict
+import re
+import unicodedata
+from typing import Any, Optional, Dict, FrozenSet, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa json de la stdlib
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -357,6 +365,125 @@ def aggregate_metrics(items: list, metrics: list = None) -> Dict[str, Any]:
     return aggregated
 
 
+# ========== JSON ==========
+
+def dumps_json(obj: Any, sort_keys: bool = False) -> str:
+    """
+    Serializa a JSON (UTF-8, sin escapar tildes) usando orjson si está disponible.
+    Equivale a json.dumps(obj, ensure_ascii=False); admite escalares de numpy.
+    
+    Example:
+        >>> dumps_json({"destino": "Málaga"})
+        '{"destino":"Málaga"}'
+    """
+    if orjson is not None:
+        option = (
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        )
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    
+    return json.dumps(
+        obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"),
+        default=_json_default
+    )
+
+
+def _json_default(obj: Any) -> Any:
+    """Escalares de numpy (tienen .item()) → tipos nativos para json de la stdlib"""
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def serialize_messages(messages: Optional[list]) -> str:
+    """
+    Serialización compacta de un historial de chat: solo turnos de usuario y
+    asistente como [[tipo, contenido], ...] (sin metadatos de LangChain).
+    
+    Example:
+        >>> serialize_messages([HumanMessage("hola"), AIMessage("¿De qué campaña?")])
+        '[["human","hola"],["ai","¿De qué campaña?"]]'
+    """
+    return dumps_json([
+        [msg.type, msg.content]
+        for msg in messages or ()
+        if getattr(msg, "type", None) in ("human", "ai")
+    ])
+
+
+# ========== TOOL CALLS ==========
+
+def unpack_tool_call(tool_call: Any) -> Tuple[str, dict, str]:
+    """
+    (name, args, id) de una tool_call, sea objeto o dict (LangChain entrega dicts).
+    
+    Example:
+        >>> unpack_tool_call({"name": "ListarCampanasInput", "args": {}, "id": "c1"})
+        ('ListarCampanasInput', {}, 'c1')
+    """
+    if isinstance(tool_call, dict):
+        return tool_call["name"], tool_call.get("args") or {}, tool_call.get("id") or "unknown"
+    return tool_call.name, tool_call.args or {}, tool_call.id or "unknown"
+
+
+# ========== TEXTO ==========
+
+# Palabras vacías que no cambian la intención de una consulta
+_STOPWORDS = frozenset({
+    "a", "al", "con", "de", "del", "el", "en", "es", "esta", "este", "esto",
+    "la", "las", "lo", "los", "me", "mi", "mis", "para", "por", "que", "se",
+    "su", "sus", "un", "una", "unos", "unas", "y", "o", "favor", "porfa",
+})
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto libre: minúsculas y sin tildes.
+    
+    Example:
+        >>> normalize_text("¿Qué optimizo en Baqueira?")
+        '¿que optimizo en baqueira?'
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_query(text: str) -> str:
+    """
+    Forma canónica de una consulta para usarla como clave de caché:
+    sin tildes, sin signos de puntuación y con espacios colapsados.
+    
+    Example:
+        >>> normalize_query("  ¿Qué presupuesto tiene Baqueira? ")
+        'que presupuesto tiene baqueira'
+    """
+    return " ".join(_WORD_RE.findall(normalize_text(text)))
+
+
+def query_tokens(text: str) -> FrozenSet[str]:
+    """
+    Conjunto de palabras significativas de una consulta (sin tildes ni stopwords).
+    Dos consultas con el mismo conjunto se consideran equivalentes.
+    
+    Example:
+        >>> sorted(query_tokens("Dame recomendaciones para Baqueira"))
+        ['baqueira', 'dame', 'recomendaciones']
+    """
+    return frozenset(
+        w for w in _WORD_RE.findall(normalize_text(text)) if w not in _STOPWORDS
+    )
+
+
+def jaccard_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Similitud de Jaccard entre dos conjuntos de tokens (0-1)"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
 # ========== TESTING ==========
 
 if __name__ == "__main__":
@@ -404,4 +531,26 @@ if __name__ == "__main__":
     assert result["count"] == 2
     print("   ✅ Aggregators OK")
     
+    # Test JSON
+    print("\n5. Testing JSON...")
+    assert json.loads(dumps_json({"b": 1, "a": "Málaga"}, sort_keys=True)) == {"a": "Málaga", "b": 1}
+    assert "Málaga" in dumps_json({"destino": "Málaga"})
+    from types import SimpleNamespace
+    historial = [
+        SimpleNamespace(type="human", content="hola"),
+        SimpleNamespace(type="tool", content="{}"),
+        SimpleNamespace(type="ai", content="¿De qué campaña?"),
+    ]
+    assert json.loads(serialize_messages(historial)) == [["human", "hola"], ["ai", "¿De qué campaña?"]]
+    assert serialize_messages(None) == "[]"
+    print("   ✅ JSON OK")
+    
+    # Test texto
+    print("\n6. Testing texto...")
+    assert normalize_text("Análisis de CAMPAÑAS") == "analisis de campanas"
+    assert normalize_query("  ¿Qué presupuesto tiene Baqueira? ") == "que presupuesto tiene baqueira"
+    assert query_tokens("Dame recomendaciones para Baqueira") == query_tokens("dame recomendaciones de baqueira")
+    assert jaccard_similarity(frozenset({"a", "b"}), frozenset({"a", "c"})) == 1 / 3
+    print("   ✅ Texto OK")
+    
     print("\n✅ Todos los tests pasaron\n")
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Agregación de insights de Meta
+Un único kernel para todas las herramientas: filas → columnas numpy →
+totales (gasto, impresiones, clicks, conversiones) y métricas derivadas
+"""
+
+import logging
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba es opcional: se usa la versión numpy
+    numba = None
+
+logger = logging.getLogger(__name__)
+
+
+# ========== CODIFICACIÓN DE ACTION TYPES ==========
+
+# action_type → id pequeño (0 = no es un evento de conversión)
+ACTION_TYPE_IDS = {
+    action_type: idx
+    for idx, action_type in enumerate([
+        'subscribe', 'lead', 'complete_registration',
+        'marketing_qualified_lead', 'mql',
+        'sales_qualified_lead', 'sql',
+        'purchase', 'add_payment_info', 'initiate_checkout',
+    ], start=1)
+}
+
+
+def action_mask(action_types: Iterable[str]) -> int:
+    """Máscara de bits con los action_type que cuentan como conversión"""
+    mask = 0
+    for action_type in action_types:
+        if action_type not in ACTION_TYPE_IDS:
+            raise ValueError(f"action_type sin id asignado: {action_type}")
+        mask |= 1 << ACTION_TYPE_IDS[action_type]
+    return mask
+
+
+def pack_actions(insights) -> tuple:
+    """
+    Acciones de todas las filas en dos arrays planos + offsets por fila (CSR).
+
+    Returns:
+        (type_ids int8, values int64, row_offsets int64); las acciones de la
+        fila i son [row_offsets[i], row_offsets[i + 1])
+    """
+    type_ids, values, row_offsets = array('b'), array('q'), array('q', [0])
+    get_id = ACTION_TYPE_IDS.get
+
+    for insight in insights:
+        for action in insight.get('actions', []):
+            type_ids.append(get_id(action.get('action_type'), 0))
+            values.append(int(action.get('value', 0)))
+        row_offsets.append(len(values))
+
+    return (
+        np.frombuffer(type_ids, dtype=np.int8) if type_ids else np.zeros(0, dtype=np.int8),
+        np.frombuffer(values, dtype=np.int64) if values else np.zeros(0, dtype=np.int64),
+        np.frombuffer(row_offsets, dtype=np.int64),
+    )
+
+
+# ========== KERNEL ==========
+
+def _sum_conversions_numpy(type_ids, values, row_offsets, allowed_mask):
+    """Versión numpy: máscara + suma acumulada (las filas sin acciones dan 0)"""
+    allowed = ((allowed_mask >> type_ids.astype(np.int64)) & 1).astype(bool)
+    cumulative = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(np.where(allowed, values, 0))))
+    return cumulative[row_offsets[1:]] - cumulative[row_offsets[:-1]]
+
+
+def _sum_conversions_loop(type_ids, values, row_offsets, allowed_mask):
+    """Bucle por fila; solo se usa compilado con numba (en Python puro es lento)"""
+    n_rows = len(row_offsets) - 1
+    out = np.zeros(n_rows, dtype=np.int64)
+    for row in range(n_rows):
+        total = 0
+        for j in range(row_offsets[row], row_offsets[row + 1]):
+            if (allowed_mask >> type_ids[j]) & 1:
+                total += values[j]
+        out[row] = total
+    return out
+
+
+# Kernel numba, compilado en la primera llamada (no al importar) y sin
+# paralelismo: las filas de una petición son pocas para compensar los hilos
+_numba_kernel = None
+
+
+def sum_conversions(type_ids, values, row_offsets, allowed_mask):
+    """Conversiones por fila (numba si está instalado, numpy si no)"""
+    global _numba_kernel
+    if numba is None:
+        return _sum_conversions_numpy(type_ids, values, row_offsets, allowed_mask)
+    if _numba_kernel is None:
+        _numba_kernel = numba.njit(cache=True)(_sum_conversions_loop)
+        logger.debug("⚡ Kernel de conversiones compilado con numba")
+    return _numba_kernel(type_ids, values, row_offsets, allowed_mask)
+
+
+# ========== COLUMNAS ==========
+
+# action_type que cuentan como conversión en las métricas agregadas
+CONVERSION_ACTIONS = frozenset({'purchase', 'lead', 'complete_registration'})
+CONVERSION_MASK = action_mask(CONVERSION_ACTIONS)
+
+
+def _column(buffer: array, dtype) -> np.ndarray:
+    """array.array → ndarray sin copiar (vacío si no hay filas)"""
+    return np.frombuffer(buffer, dtype=dtype) if buffer else np.zeros(0, dtype=dtype)
+
+
+def to_columns(insights, conv_types=CONVERSION_ACTIONS) -> tuple:
+    """
+    Filas de insights → columnas (spend, impressions, clicks, conversiones).
+    
+    Una sola pasada en Python para parsear cada fila; las conversiones por
+    fila salen del kernel sum_conversions (numba si está instalado) y las
+    sumas y filtros posteriores son operaciones numpy sobre las columnas.
+    """
+    spend, imps, clicks = array('d'), array('q'), array('q')
+    
+    for insight in insights:
+        spend.append(float(insight.get('spend', 0)))
+        imps.append(int(insight.get('impressions', 0)))
+        clicks.append(int(insight.get('clicks', 0)))
+    
+    mask = CONVERSION_MASK if conv_types is CONVERSION_ACTIONS else action_mask(conv_types)
+    conv = sum_conversions(*pack_actions(insights), mask)
+    
+    return (
+        _column(spend, np.float64),
+        _column(imps, np.int64),
+        _column(clicks, np.int64),
+        conv,
+    )
+
+
+# ========== TOTALES ==========
+
+@dataclass(slots=True)
+class AggMetrics:
+    """Totales de un conjunto de filas y métricas derivadas (sin redondear)"""
+    spend: float
+    impressions: int
+    clicks: int
+    conversions: int
+    ctr: float
+    cpm: float
+    cpc: float
+    cpa: float
+    # action_type → valor sumado (solo con track_by_type=True)
+    conversions_by_type: dict = field(default_factory=dict)
+
+
+def _div(num: float, den: float, scale: float = 1.0) -> float:
+    return num * scale / den if den > 0 else 0.0
+
+
+def aggregate_columns(spend, impressions, clicks, conversions,
+                      conversions_by_type: Optional[dict] = None) -> AggMetrics:
+    """Totales y CTR/CPM/CPC/CPA a partir de columnas ya filtradas"""
+    total_spend = float(spend.sum())
+    total_impressions = int(impressions.sum())
+    total_clicks = int(clicks.sum())
+    total_conversions = int(conversions.sum())
+    
+    return AggMetrics(
+        spend=total_spend,
+        impressions=total_impressions,
+        clicks=total_clicks,
+        conversions=total_conversions,
+        ctr=_div(total_clicks, total_impressions, 100),
+        cpm=_div(total_spend, total_impressions, 1000),
+        cpc=_div(total_spend, total_clicks),
+        cpa=_div(total_spend, total_conversions),
+        conversions_by_type=conversions_by_type or {},
+    )
+
+
+def aggregate(insights, conv_types=CONVERSION_ACTIONS, track_by_type: bool = False) -> AggMetrics:
+    """
+    Agrega filas de insights. conversions cuenta solo conv_types; con
+    track_by_type además se suman todas las acciones por action_type.
+    
+    Example:
+        >>> agg = aggregate([{'spend': '10', 'impressions': '1000', 'clicks': '20',
+        ...                   'actions': [{'action_type': 'lead', 'value': '2'}]}])
+        >>> agg.cpa, agg.ctr
+        (5.0, 2.0)
+    """
+    if not isinstance(insights, list):
+        insights = list(insights)
+    
+    by_type = None
+    if track_by_type:
+        by_type = Counter()
+        for insight in insights:
+            for action in insight.get('actions', []):
+                by_type[action.get('action_type', '')] += int(action.get('value', 0))
+        by_type = dict(by_type)
+    
+    return aggregate_columns(*to_columns(insights, conv_types), conversions_by_type=by_type)
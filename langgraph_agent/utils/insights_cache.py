@@ -0,0 +1,108 @@
+"""
+Caché de insights de Meta
+Misma consulta (objeto, nivel, período, campos) → mismas filas sin repetir el round-trip
+"""
+
+import hashlib
+import json
+import logging
+from datetime import date, timedelta
+from functools import wraps
+from typing import Callable, Optional
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# ========== CONFIGURACIÓN ==========
+
+# Períodos que aún acumulan datos: caducan pronto
+INSIGHTS_TTL_RECENT = 900
+
+# Períodos cerrados hace días: Meta apenas los corrige, se guardan un día
+INSIGHTS_TTL_STABLE = 86400
+STABLE_AFTER_DAYS = 7
+STABLE_PRESETS = frozenset({"last_month", "last_quarter", "last_year"})
+
+_INSIGHTS_CACHE = TTLCache(maxsize=512)
+
+
+# ========== CLAVES Y TTL ==========
+
+def insights_key(obj, fields: list, params: dict) -> str:
+    """Firma de la consulta: id del objeto + params + campos (sin orden)"""
+    payload = json.dumps(
+        {"id": obj.get_id(), "params": params, "fields": sorted(fields)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def insights_ttl(params: dict) -> int:
+    """TTL según lo estable que sea el período pedido"""
+    if params.get("date_preset") in STABLE_PRESETS:
+        return INSIGHTS_TTL_STABLE
+
+    until = (params.get("time_range") or {}).get("until")
+    if until:
+        try:
+            if date.fromisoformat(until) <= date.today() - timedelta(days=STABLE_AFTER_DAYS):
+                return INSIGHTS_TTL_STABLE
+        except ValueError:
+            pass
+
+    return INSIGHTS_TTL_RECENT
+
+
+# ========== ACCESO ==========
+
+def get_cached_insights(obj, fields: list, params: dict) -> Optional[list]:
+    """Filas cacheadas de la consulta o None"""
+    return _INSIGHTS_CACHE.get(insights_key(obj, fields, params))
+
+
+def store_insights(obj, fields: list, params: dict, rows: list, ttl: Optional[int] = None) -> None:
+    """Guarda las filas de una consulta (TTL por defecto según el período)"""
+    _INSIGHTS_CACHE.set(
+        insights_key(obj, fields, params),
+        rows,
+        ttl=insights_ttl(params) if ttl is None else ttl
+    )
+
+
+def ttl_cache(ttl_seconds: Optional[int] = None) -> Callable:
+    """
+    Decorador para funciones fetch(obj, fields, params) -> filas.
+    Sin ttl_seconds, el TTL sale de insights_ttl(params).
+
+    Example:
+        >>> @ttl_cache()
+        ... def fetch(obj, fields, params):
+        ...     return list(obj.get_insights(fields=fields, params=params))
+    """
+    def decorator(fetch: Callable) -> Callable:
+        @wraps(fetch)
+        def wrapper(obj, fields: list, params: dict) -> list:
+            rows = get_cached_insights(obj, fields, params)
+            if rows is not None:
+                logger.debug(f"⚡ Insights desde caché: {obj.get_id()} {params.get('level')}")
+                return rows
+
+            rows = fetch(obj, fields, params)
+            store_insights(obj, fields, params, rows, ttl=ttl_seconds)
+            return rows
+        return wrapper
+    return decorator
+
+
+@ttl_cache()
+def cached_get_insights(obj, fields: list, params: dict) -> list:
+    """obj.get_insights(...) síncrono y materializado, cacheado por firma de consulta"""
+    return list(obj.get_insights(fields=fields, params=params))
+
+
+def clear_insights_cache() -> None:
+    """Vacía la caché (p.ej. tras cambios en campañas)"""
+    _INSIGHTS_CACHE.clear()
@@ -0,0 +1,42 @@
+"""
+Fábrica de modelos Gemini compartidos
+Un ChatGoogleGenerativeAI por configuración: todos los agentes reutilizan el
+mismo cliente y, con él, su pool de conexiones HTTP (keep-alive, sin TLS nuevo
+en cada llamada)
+"""
+
+import functools
+import os
+from typing import Optional
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+@functools.lru_cache(maxsize=16)
+def get_chat_model(
+    model: str = DEFAULT_MODEL,
+    temperature: float = 0.0,
+    max_output_tokens: Optional[int] = None,
+    thinking_budget: Optional[int] = None
+) -> ChatGoogleGenerativeAI:
+    """
+    Devuelve el modelo compartido para esa combinación de parámetros.
+    
+    max_output_tokens acota la generación (clasificadores con salida corta);
+    thinking_budget=0 desactiva el razonamiento interno de la familia 2.5,
+    cuyos tokens también cuentan contra max_output_tokens.
+    
+    Example:
+        >>> llm = get_chat_model()
+        >>> llm is get_chat_model()
+        True
+    """
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"),
+        max_output_tokens=max_output_tokens,
+        thinking_budget=thinking_budget
+    )
@@ -4,6 +4,8 @@ Gestión de autenticación y conexión
 """
 
 import logging
+from typing import Optional
+
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.adaccount import AdAccount
 from ..config.settings import settings
@@ -12,7 +14,9 @@ logger = logging.getLogger(__name__)
 
 # Variable global para cachear la instancia de API
 _meta_api_instance = None
-_ad_account_instance = None
+
+# AdAccount por ID de cuenta (el de settings por defecto)
+_ad_account_instances = {}
 
 
 def initialize_meta_api() -> FacebookAdsApi:
@@ -57,10 +61,10 @@ def initialize_meta_api() -> FacebookAdsApi:
         raise
 
 
-def get_account() -> AdAccount:
+def get_account(account_id: Optional[str] = None) -> AdAccount:
     """
-    Obtiene la instancia de AdAccount configurada.
-    Usa caché para evitar reinicializar.
+    Obtiene la instancia de AdAccount configurada (o la de account_id).
+    Usa caché por ID de cuenta para evitar reinicializar.
     
     Returns:
         AdAccount instance
@@ -69,10 +73,11 @@ def get_account() -> AdAccount:
         >>> account = get_account()
         >>> campaigns = account.get_campaigns()
     """
-    global _ad_account_instance
+    account_id = account_id or settings.META_AD_ACCOUNT_ID
     
-    if _ad_account_instance is not None:
-        return _ad_account_instance
+    account = _ad_account_instances.get(account_id)
+    if account is not None:
+        return account
     
     # Inicializar API si no está inicializada
     if _meta_api_instance is None:
@@ -80,11 +85,11 @@ def get_account() -> AdAccount:
     
     try:
         # Crear instancia de AdAccount
-        account = AdAccount(settings.META_AD_ACCOUNT_ID)
+        account = AdAccount(account_id)
         
-        _ad_account_instance = account
+        _ad_account_instances[account_id] = account
         
-        logger.info(f"✅ AdAccount instanciado: {settings.META_AD_ACCOUNT_ID}")
+        logger.info(f"✅ AdAccount instanciado: {account_id}")
         
         return account
     
@@ -97,10 +102,10 @@ def reset_api_connection():
     """
     Resetea la conexión a la API (útil para testing o reconexión).
     """
-    global _meta_api_instance, _ad_account_instance
+    global _meta_api_instance
     
     _meta_api_instance = None
-    _ad_account_instance = None
+    _ad_account_instances.clear()
     
     logger.info("🔄 Conexión Meta API reseteada")
 
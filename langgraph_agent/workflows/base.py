@@ -6,6 +6,7 @@ Workflows UNIFICADOS - Sin llamadas HTTP
 ✅ SequentialWorkflow: Usa agent_app directamente
 """
 
+import asyncio
 import json
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
@@ -59,6 +60,13 @@ class FastPathWorkflow:
                 metadata={"fallback": True}
             )
     
+    async def aexecute(self, query: str) -> WorkflowResult:
+        """
+        Versión async de execute.
+        Las herramientas locales son síncronas (SDK de Meta): van a un hilo.
+        """
+        return await asyncio.to_thread(self.execute, query)
+    
     def _listar_campanas(self) -> WorkflowResult:
         """Lista campañas usando función local"""
         try:
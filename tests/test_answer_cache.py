@@ -0,0 +1,40 @@
+# test_answer_cache.py
+# Caché de respuestas finales en SQLite
+
+from langgraph_agent.utils import answer_cache as answer_cache_module
+from langgraph_agent.utils.answer_cache import AnswerCache
+
+
+class FakeClock:
+    """Sustituye a time.time para controlar la expiración"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_answer_cache_get_set():
+    cache = AnswerCache(":memory:", ttl=3600)
+    assert cache.get("123|2025-01-01|que hago") is None
+
+    cache.set("123|2025-01-01|que hago", "Recomendaciones...")
+    assert cache.get("123|2025-01-01|que hago") == "Recomendaciones..."
+
+    cache.set("123|2025-01-01|que hago", "Otra respuesta")
+    assert cache.get("123|2025-01-01|que hago") == "Otra respuesta"
+
+
+def test_answer_cache_expiracion(monkeypatch):
+    clock = FakeClock(now=1_700_000_000)
+    monkeypatch.setattr(answer_cache_module.time, "time", clock)
+
+    cache = AnswerCache(":memory:", ttl=60)
+    cache.set("k", "v")
+
+    clock.now += 60
+    assert cache.get("k") == "v"
+
+    clock.now += 1
+    assert cache.get("k") is None
@@ -0,0 +1,77 @@
+# test_cache.py
+# Caché en memoria LRU + TTL
+
+from langgraph_agent.utils import cache as cache_module
+from langgraph_agent.utils.cache import TTLCache
+
+
+class FakeClock:
+    """Sustituye a time.monotonic para controlar la expiración"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_get_set():
+    cache = TTLCache(maxsize=4)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", "default") == "default"
+    assert "a" in cache and "b" not in cache
+
+
+def test_ttl_cache_guarda_valores_falsy():
+    cache = TTLCache(maxsize=4)
+    cache.set("cero", 0)
+    cache.set("vacio", "")
+    assert cache.get("cero", "x") == 0
+    assert cache.get("vacio", "x") == ""
+    assert "cero" in cache
+
+
+def test_ttl_cache_expulsa_el_menos_reciente():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" pasa a ser la más reciente
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expiracion(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=100)
+
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    clock.now += 100
+    assert cache.get("b") is None
+
+
+def test_ttl_cache_pop_discard_if_clear():
+    cache = TTLCache(maxsize=8)
+    for key in [("listar", 1), ("campaign", "1"), ("campaign", "2")]:
+        cache.set(key, True)
+
+    assert cache.pop(("listar", 1)) is True
+    assert cache.pop(("listar", 1), "no") == "no"
+
+    assert cache.discard_if(lambda key: key[1] == "1") == 1
+    assert ("campaign", "2") in cache
+
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,96 @@
+# test_insight_aggregator.py
+# Agregación de filas de insights (columnas numpy y totales)
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from langgraph_agent.utils.insight_aggregator import (
+    CONVERSION_MASK,
+    _sum_conversions_numpy,
+    action_mask,
+    aggregate,
+    pack_actions,
+    sum_conversions,
+    to_columns,
+)
+
+
+INSIGHTS = [
+    {
+        'spend': '10.5', 'impressions': '1000', 'clicks': '20',
+        'actions': [
+            {'action_type': 'lead', 'value': '2'},
+            {'action_type': 'link_click', 'value': '20'},
+        ],
+    },
+    {
+        'spend': '4.5', 'impressions': '500', 'clicks': '10',
+        'actions': [
+            {'action_type': 'purchase', 'value': '1'},
+            {'action_type': 'subscribe', 'value': '3'},
+        ],
+    },
+    # Fila sin acciones ni clicks
+    {'spend': '0', 'impressions': '100'},
+]
+
+
+def test_to_columns():
+    spend, impressions, clicks, conversions = to_columns(INSIGHTS)
+
+    assert spend.dtype == np.float64
+    assert spend.tolist() == [10.5, 4.5, 0.0]
+    assert impressions.tolist() == [1000, 500, 100]
+    assert clicks.tolist() == [20, 10, 0]
+    # Solo purchase/lead/complete_registration cuentan por defecto
+    assert conversions.tolist() == [2, 1, 0]
+
+
+def test_to_columns_con_tipos_de_conversion():
+    *_, conversions = to_columns(INSIGHTS, conv_types=frozenset({'subscribe', 'lead'}))
+    assert conversions.tolist() == [2, 3, 0]
+
+
+def test_to_columns_sin_filas():
+    columns = to_columns([])
+    assert all(len(column) == 0 for column in columns)
+
+
+def test_aggregate():
+    agg = aggregate(INSIGHTS)
+
+    assert agg.spend == pytest.approx(15.0)
+    assert agg.impressions == 1600
+    assert agg.clicks == 30
+    assert agg.conversions == 3
+    assert agg.ctr == pytest.approx(30 / 1600 * 100)
+    assert agg.cpm == pytest.approx(15.0 / 1600 * 1000)
+    assert agg.cpc == pytest.approx(0.5)
+    assert agg.cpa == pytest.approx(5.0)
+    assert agg.conversions_by_type == {}
+
+
+def test_aggregate_por_tipo_y_generador():
+    agg = aggregate(iter(INSIGHTS), track_by_type=True)
+    assert agg.conversions == 3
+    assert agg.conversions_by_type == {'lead': 2, 'link_click': 20, 'purchase': 1, 'subscribe': 3}
+
+
+def test_aggregate_sin_datos_no_divide_por_cero():
+    agg = aggregate([])
+    assert (agg.spend, agg.conversions) == (0.0, 0)
+    assert (agg.ctr, agg.cpm, agg.cpc, agg.cpa) == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_action_mask_rechaza_tipos_desconocidos():
+    with pytest.raises(ValueError):
+        action_mask(['link_click'])
+
+
+def test_sum_conversions_coincide_con_numpy():
+    # Con numba instalado compara el kernel compilado con la versión numpy
+    packed = pack_actions(INSIGHTS)
+    assert sum_conversions(*packed, CONVERSION_MASK).tolist() == (
+        _sum_conversions_numpy(*packed, CONVERSION_MASK).tolist()
+    )
@@ -0,0 +1,50 @@
+# test_performance_agent.py
+# Recorte del historial del checkpoint (reducer de mensajes)
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("facebook_business")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from langgraph_agent.agents.performance_agent import (
+    KEEP_RECENT_MESSAGES,
+    MAX_HISTORY_MESSAGES,
+    _append_and_trim,
+)
+
+
+def _turno(i: int) -> list:
+    """Un turno con herramienta: pregunta, tool_call, resultado y respuesta"""
+    return [
+        HumanMessage(content=f"pregunta {i}"),
+        AIMessage(content="", tool_calls=[{"name": "ListarCampanasInput", "args": {}, "id": f"c{i}"}]),
+        ToolMessage(content="[]", tool_call_id=f"c{i}"),
+        AIMessage(content=f"respuesta {i}"),
+    ]
+
+
+def test_append_and_trim_sin_recorte():
+    left, right = _turno(0), _turno(1)
+    assert _append_and_trim(left, right) == left + right
+
+
+def test_append_and_trim_empieza_en_human_message():
+    history = [msg for i in range(10) for msg in _turno(i)]
+    trimmed = _append_and_trim(history[:-4], history[-4:])
+
+    assert len(trimmed) <= KEEP_RECENT_MESSAGES
+    assert isinstance(trimmed[0], HumanMessage)
+    assert trimmed[-1] is history[-1]
+    # Ningún ToolMessage queda sin su AIMessage con tool_calls
+    ids = {tc["id"] for msg in trimmed if isinstance(msg, AIMessage) for tc in msg.tool_calls}
+    assert all(msg.tool_call_id in ids for msg in trimmed if isinstance(msg, ToolMessage))
+
+
+def test_append_and_trim_retrocede_hasta_el_ultimo_human_message():
+    # Un solo turno muy largo: el tramo reciente no contiene HumanMessage
+    history = [HumanMessage(content="pregunta")] + [
+        AIMessage(content=f"parte {i}") for i in range(MAX_HISTORY_MESSAGES)
+    ]
+    assert _append_and_trim(history, []) == history
@@ -0,0 +1,41 @@
+# test_performance_tools.py
+# Resolución de períodos a params de insights
+
+from datetime import date
+
+import pytest
+
+pytest.importorskip("facebook_business")
+
+from langgraph_agent.tools.performance.performance_tools import _resolve_period
+
+
+# Miércoles
+HOY = date(2025, 3, 12).toordinal()
+
+
+def test_resolve_period_preset_valido():
+    assert _resolve_period("last_7d", HOY) == ("preset", "last_7d")
+
+
+def test_resolve_period_alias_en_castellano():
+    assert _resolve_period("semana pasada", HOY) == ("preset", "last_7d")
+
+
+def test_resolve_period_invalido_usa_last_7d():
+    assert _resolve_period("cuando sea", HOY) == ("preset", "last_7d")
+
+
+@pytest.mark.parametrize("periodo", ["this_week", "esta semana"])
+def test_resolve_period_esta_semana(periodo):
+    # De lunes a hoy
+    assert _resolve_period(periodo, HOY) == ("range", "2025-03-10", "2025-03-12")
+
+
+def test_resolve_period_custom():
+    rango = ("2025-01-01", "2025-01-31")
+    assert _resolve_period("custom", HOY, rango) == ("range", "2025-01-01", "2025-01-31")
+
+
+def test_resolve_period_custom_incompleto():
+    assert _resolve_period("custom", HOY, ("2025-01-01", None)) == ("preset", "last_7d")
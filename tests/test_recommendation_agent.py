@@ -0,0 +1,59 @@
+# test_recommendation_agent.py
+# Caché exacta de respuestas del LLM de recomendaciones
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("facebook_business")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from langgraph_agent.agents import recommendation_agent as agent
+
+
+@pytest.fixture(autouse=True)
+def _caches_vacias():
+    agent._LLM_CACHE.clear()
+    agent._SEMANTIC_CACHE.clear()
+    yield
+    agent._LLM_CACHE.clear()
+    agent._SEMANTIC_CACHE.clear()
+
+
+def _tool_turn(args: dict) -> list:
+    return [
+        HumanMessage(content="recomendaciones para Baqueira"),
+        AIMessage(content="", tool_calls=[{"name": "ObtenerRecomendacionesInput", "args": args, "id": "c1"}]),
+        ToolMessage(content="{}", tool_call_id="c1"),
+    ]
+
+
+def test_llm_cache_key_determinista():
+    a = _tool_turn({"campana_id": "1", "tipo": "general"})
+    b = _tool_turn({"tipo": "general", "campana_id": "1"})
+    assert agent._llm_cache_key(a) == agent._llm_cache_key(b)
+
+
+def test_llm_cache_key_distingue_historial():
+    a = _tool_turn({"campana_id": "1"})
+    b = _tool_turn({"campana_id": "2"})
+    assert agent._llm_cache_key(a) != agent._llm_cache_key(b)
+    assert agent._llm_cache_key(a) != agent._llm_cache_key(a + [AIMessage(content="ok")])
+
+
+def test_call_recommendation_llm_reutiliza_la_respuesta(monkeypatch):
+    llamadas = []
+
+    def fake_invoke(llm, messages):
+        llamadas.append(messages)
+        return AIMessage(content="respuesta")
+
+    monkeypatch.setattr(agent, "_invoke_streaming", fake_invoke)
+    monkeypatch.setattr(agent, "_get_llm", lambda: None)
+
+    state = {"messages": _tool_turn({"campana_id": "1"})}
+    first = agent.call_recommendation_llm(state)["messages"][0]
+    second = agent.call_recommendation_llm(state)["messages"][0]
+
+    assert len(llamadas) == 1
+    assert second is first
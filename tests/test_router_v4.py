@@ -0,0 +1,62 @@
+# test_router_v4.py
+# Clasificador local y parser de la respuesta en línea del Router
+
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+
+from langgraph_agent.orchestration.router_v4 import _fast_classify, _parse_line
+
+
+@pytest.mark.parametrize("query, category, intent", [
+    ("¿qué anuncio ha empeorado?", "agentic", "ad_analysis"),
+    ("TOP 3 de anuncios de Costa Blanca", "agentic", "ad_analysis"),
+    ("gasto de Ibiza esta semana", "agentic", "metrics"),
+    ("gasto en Meta Ads de Ibiza", "agentic", "metrics"),
+    ("¿qué presupuesto tiene Baqueira?", "agentic", "config"),
+    ("compara Ibiza vs Baqueira", "agentic", "compare"),
+    ("dame recomendaciones para Baqueira", "agentic", "recommendation"),
+    ("analiza la campaña de Baqueira", "multi_agent", "report"),
+    ("lista mis campañas", "simple", "list"),
+])
+def test_fast_classify(query, category, intent):
+    route = _fast_classify(query)
+    assert route is not None
+    assert route.category == category
+    assert route.detected_intent == intent
+
+
+@pytest.mark.parametrize("query", [
+    "hola",
+    "Baqueira",
+    # Dos intenciones a la vez: decide el LLM
+    "gasto y presupuesto de Ibiza",
+])
+def test_fast_classify_sin_regla(query):
+    assert _fast_classify(query) is None
+
+
+def test_parse_line():
+    route = _parse_line("agentic|0.9|metrics|Pide el gasto")
+    assert route.category == "agentic"
+    assert route.confidence == pytest.approx(0.9)
+    assert route.detected_intent == "metrics"
+    assert route.reasoning == "Pide el gasto"
+
+
+def test_parse_line_normaliza_campos():
+    route = _parse_line(" SIMPLE | 1.5 | none | Listado | con barra\nlínea extra")
+    assert route.category == "simple"
+    assert route.confidence == 1.0
+    assert route.detected_intent is None
+    assert route.reasoning == "Listado | con barra"
+
+
+@pytest.mark.parametrize("line", [
+    "otra|0.9|metrics|x",
+    "agentic|0.9",
+    "agentic|alta|metrics|x",
+])
+def test_parse_line_formato_invalido(line):
+    with pytest.raises(ValueError):
+        _parse_line(line)
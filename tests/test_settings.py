@@ -0,0 +1,42 @@
+# test_settings.py
+# Normalización y detección de destinos
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from langgraph_agent.config.settings import destinos_en_texto, normalizar_destino
+
+
+@pytest.mark.parametrize("nombre, esperado", [
+    ("Baqueira", "baqueira"),
+    ("Costa de la Luz", "costaluz"),
+    ("  costa luz ", "costaluz"),
+    ("Cantábria", "cantabria"),
+])
+def test_normalizar_destino_alias(nombre, esperado):
+    assert normalizar_destino(nombre) == esperado
+
+
+def test_nombres_canonicos_son_alias():
+    # "costasol 2025" debe detectarse igual que "costa del sol 2025"
+    assert normalizar_destino("costasol") == "costasol"
+    assert destinos_en_texto("Costasol 2025") == ["costasol"]
+
+
+def test_normalizar_destino_no_colapsa_nombres_compuestos():
+    # Un adset o campaña que contiene un destino no es el destino
+    assert normalizar_destino("Ibiza Lookalike") == "ibiza lookalike"
+    assert normalizar_destino("Desconocido") == "desconocido"
+
+
+def test_destinos_en_texto():
+    assert destinos_en_texto("Compara Ibiza con la Costa del Sol") == ["ibiza", "costasol"]
+    assert destinos_en_texto("¿Cómo va Cantábria?") == ["cantabria"]
+    assert destinos_en_texto("lista mis campañas") == []
+
+
+def test_destinos_en_texto_palabras_completas():
+    # "ibizas" no es "ibiza"; el alias más largo gana ("costa de la luz")
+    assert destinos_en_texto("ibizas") == []
+    assert destinos_en_texto("costa de la luz 2025") == ["costaluz"]